@@ -0,0 +1,424 @@
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from classes import REPORT_FIELDS, Habit, Tracker
+from database_and_sql import create_schema, get_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+"""
+Local HTTP/JSON service over the habit store, for dashboards and scripts next to the interface.
+
+GET    /habits                          all habits with their last completion
+POST   /habits                          {"name": "Read", "frequency": "daily"} adds a habit
+GET    /habits/<name>                   one habit with its streaks and state
+DELETE /habits/<name>                   deletes a habit and its completions
+GET    /habits/<name>/completions       the completion dates of a habit
+POST   /habits/<name>/completions       completes a habit, {"added": false} if the period was already completed
+GET    /streaks?frequency=daily         all habits with their streaks and state, optionally of one frequency
+POST   /batch                           {"requests": [{"method": "POST", "path": "/habits/Read/completions"}, ...]}
+                                        runs several requests in one transaction, answers {"responses": [...]}
+
+- the event loop only parses and answers requests, SQLite work runs on a bounded pool of worker threads,
+  each with its own connection
+- connections are kept alive (HTTP/1.1) until the client closes them or stays idle for keep_alive seconds
+- identical GET requests that arrive while the same read is running share its result
+"""
+
+# Largest accepted request body in bytes
+MAX_BODY = 1024 * 1024
+
+# Largest number of requests in one batch
+MAX_BATCH = 100
+
+FREQUENCIES = ('daily', 'weekly')
+
+
+class ApiError(Exception):
+    """
+    A request that is answered with an error status and {"error": message}.
+
+    Attributes:
+        status (int): The HTTP status code.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def habit_row(habit_id, values):
+    """
+    Converts a row of the habit table into a JSON object.
+    """
+    return dict(zip(REPORT_FIELDS, values), id=habit_id)
+
+
+def list_habits(name, query, body):
+    """
+    GET /habits, all habits with their last completion.
+    """
+    return HTTPStatus.OK, {'habits': [
+        {'name': habit_name, 'frequency': frequency, 'created_at': created_at, 'last_completed_at': last_at}
+        for habit_name, frequency, created_at, last_at in Tracker.get_all_habits()
+    ]}
+
+
+def add_habit(name, query, body):
+    """
+    POST /habits, adds the habit {"name", "frequency"} of the body.
+    """
+    if not isinstance(body, dict) or not isinstance(body.get('name'), str) or not body['name'].strip():
+        raise ApiError(HTTPStatus.BAD_REQUEST, "body needs a habit name")
+    if body.get('frequency') not in FREQUENCIES:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "frequency must be daily or weekly")
+    habit = Habit(body['name'], body['frequency'])
+    try:
+        habit.add_new()
+    except sqlite3.IntegrityError:
+        raise ApiError(HTTPStatus.CONFLICT, f"habit {habit.name!r} already exists") from None
+    return HTTPStatus.CREATED, {'name': habit.name, 'frequency': habit.frequency, 'created_at': habit.created_at}
+
+
+def get_habit(name, query, body):
+    """
+    GET /habits/<name>, one habit as shown in the habit table.
+    """
+    row = Tracker.get_habit_row(name)
+    if row is None:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"unknown habit {name!r}")
+    return HTTPStatus.OK, habit_row(*row)
+
+
+def delete_habit(name, query, body):
+    """
+    DELETE /habits/<name>, deletes the habit with its completions.
+    """
+    if not Habit(name, None).delete():
+        raise ApiError(HTTPStatus.NOT_FOUND, f"unknown habit {name!r}")
+    return HTTPStatus.OK, {'deleted': name}
+
+
+def get_completions(name, query, body):
+    """
+    GET /habits/<name>/completions, the completion dates of the habit in order.
+    """
+    completions = [row[0] for row in Tracker.get_completion_days(name)]
+    if not completions and Tracker.get_habit_row(name) is None:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"unknown habit {name!r}")
+    return HTTPStatus.OK, {'name': name, 'completions': completions}
+
+
+def complete_habit(name, query, body):
+    """
+    POST /habits/<name>/completions, completes the habit unless its day or week is already completed.
+    """
+    added = Habit(name, None).add_completion()
+    if not added and Tracker.get_habit_row(name) is None:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"unknown habit {name!r}")
+    return (HTTPStatus.CREATED if added else HTTPStatus.OK), {'name': name, 'added': added}
+
+
+def get_streaks(name, query, body):
+    """
+    GET /streaks?frequency=, the habit table, all habits or those of one frequency.
+    """
+    frequency = query.get('frequency', [None])[0]
+    if frequency not in FREQUENCIES + (None,):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "frequency must be daily or weekly")
+    return HTTPStatus.OK, {'habits': [dict(zip(REPORT_FIELDS, values))
+                                      for values in Tracker.iter_habit_rows(frequency)]}
+
+
+# (method, path with the habit name replaced by {name}) -> handler(name, query, body) -> (status, payload)
+ROUTES = {
+    ('GET', 'habits'): list_habits,
+    ('POST', 'habits'): add_habit,
+    ('GET', 'habits/{name}'): get_habit,
+    ('DELETE', 'habits/{name}'): delete_habit,
+    ('GET', 'habits/{name}/completions'): get_completions,
+    ('POST', 'habits/{name}/completions'): complete_habit,
+    ('GET', 'streaks'): get_streaks,
+}
+
+
+def resolve(method, target):
+    """
+    Finds the handler of a request.
+
+    Args:
+        method (str): The HTTP method.
+        target (str): The request target, path and query string.
+
+    Returns:
+        tuple: (handler, habit name or None, parsed query string).
+    """
+    url = urlsplit(target)
+    parts = [unquote(part) for part in url.path.strip('/').split('/')]
+    name = None
+    if len(parts) >= 2 and parts[0] == 'habits':
+        name = parts[1]
+        parts[1] = '{name}'
+    path = '/'.join(parts)
+
+    handler = ROUTES.get((method, path))
+    if handler is None:
+        if any(route_path == path for _, route_path in ROUTES):
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not allowed on /{path}")
+        raise ApiError(HTTPStatus.NOT_FOUND, f"no such resource /{path}")
+    return handler, name, parse_qs(url.query)
+
+
+def handle(method, target, body):
+    """
+    Runs one request on the calling thread, errors become error responses.
+
+    Returns:
+        tuple: (status, payload).
+    """
+    try:
+        handler, name, query = resolve(method, target)
+        return handler(name, query, body)
+    except ApiError as error:
+        return error.status, {'error': str(error)}
+
+
+def handle_batch(body):
+    """
+    Runs the requests of a batch in order in one transaction, so their writes are committed together.
+
+    A failing request is answered with its error and the others still run, only an unexpected error
+    rolls back the whole batch.
+
+    Returns:
+        tuple: (status, payload) with one {"status", "body"} object per request.
+    """
+    requests = body.get('requests') if isinstance(body, dict) else None
+    if not isinstance(requests, list) or not all(isinstance(request, dict) for request in requests):
+        return HTTPStatus.BAD_REQUEST, {'error': "body needs a list of requests"}
+    if len(requests) > MAX_BATCH:
+        return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': f"at most {MAX_BATCH} requests per batch"}
+
+    responses = []
+    with transaction():
+        for request in requests:
+            status, payload = handle(str(request.get('method', 'GET')).upper(), str(request.get('path', '')),
+                                     request.get('body'))
+            responses.append({'status': int(status), 'body': payload})
+    return HTTPStatus.OK, {'responses': responses}
+
+
+class HabitServer:
+    """
+    Serves the habit store over HTTP/1.1 with JSON bodies on an asyncio event loop.
+
+    Attributes:
+        host (str): The address to listen on, local only by default.
+        port (int): The port to listen on, 0 picks a free port that is set once started.
+        workers (int): Threads running the SQLite work.
+        max_pending (int): Requests handed to the threads at once, further requests wait on the event loop.
+        keep_alive (float): Seconds an idle connection is kept open.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8080, workers=4, max_pending=64, keep_alive=5.0):
+
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_pending = max_pending
+        self.keep_alive = keep_alive
+        self.executor = None
+        self.server = None
+        self.slots = None
+        self.reads = {}  # (target, writes) -> future of a running GET
+        self.connections = set()  # tasks of the open connections
+        self.writes = 0  # finished writes, reads started before a write are not shared after it
+
+    async def start(self):
+        """
+        Starts listening, the port is known afterwards.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="habit-api")
+        self.slots = asyncio.Semaphore(self.max_pending)
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        """
+        Starts the server if needed and answers requests until cancelled.
+        """
+        if self.server is None:
+            await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """
+        Stops listening, closes the open connections and waits for the worker threads.
+        """
+        if self.server is not None:
+            self.server.close()
+            for task in self.connections:
+                task.cancel()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+            await self.server.wait_closed()
+            self.server = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    async def run_blocking(self, function, *args):
+        """
+        Runs a blocking function on the worker threads, at most max_pending at once.
+        """
+        async with self.slots:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def dispatch(self, method, target, body):
+        """
+        Answers one request.
+
+        Args:
+            method (str): The HTTP method.
+            target (str): The request target, path and query string.
+            body (object): The decoded JSON body, None without body.
+
+        Returns:
+            tuple: (status, payload).
+        """
+        if method == 'GET':
+            key = (target, self.writes)
+            future = self.reads.get(key)
+            if future is None:
+                future = self.reads[key] = asyncio.ensure_future(self.run_blocking(handle, method, target, body))
+                future.add_done_callback(lambda _: self.reads.pop(key, None))
+            return await asyncio.shield(future)
+
+        try:
+            if urlsplit(target).path.strip('/') == 'batch' and method == 'POST':
+                return await self.run_blocking(handle_batch, body)
+            return await self.run_blocking(handle, method, target, body)
+        finally:
+            self.writes += 1
+
+    async def handle_connection(self, reader, writer):
+        """
+        Reads requests from one connection and answers them in order until the connection is closed.
+        """
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.keep_alive)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+
+                keep_alive, status, payload = await self.read_request(request_line, reader)
+                data = json.dumps(payload, separators=(',', ':')).encode()
+                status = HTTPStatus(status)
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                    f"\r\n".encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass  # the client went away or sent a line that is too long
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    async def read_request(self, request_line, reader):
+        """
+        Reads the headers and body of a request and answers it.
+
+        Returns:
+            tuple: (keep the connection alive, status, payload).
+        """
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            return False, HTTPStatus.BAD_REQUEST, {'error': "malformed request line"}
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' and (version == 'HTTP/1.1' or connection == 'keep-alive')
+
+        if 'transfer-encoding' in headers:
+            return False, HTTPStatus.NOT_IMPLEMENTED, {'error': "chunked bodies are not supported"}
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            return False, HTTPStatus.BAD_REQUEST, {'error': "invalid Content-Length"}
+        if length > MAX_BODY:
+            return False, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': f"body larger than {MAX_BODY} bytes"}
+
+        body = None
+        if length:
+            data = await reader.readexactly(length)
+            try:
+                body = json.loads(data)
+            except ValueError:
+                return keep_alive, HTTPStatus.BAD_REQUEST, {'error': "body is not valid JSON"}
+
+        try:
+            status, payload = await self.dispatch(method.upper(), target, body)
+        except Exception:
+            logger.exception("request %s %s failed", method, target)
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "internal error"}
+        return keep_alive, status, payload
+
+
+def main(argv=None):
+    """
+    Runs the service until it is interrupted.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Habit Tracker HTTP/JSON service")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=4, help="threads running the database work")
+    parser.add_argument("--max-pending", type=int, default=64, help="requests handed to the threads at once")
+    parser.add_argument("--keep-alive", type=float, default=5.0, help="seconds an idle connection stays open")
+    args = parser.parse_args(argv)
+
+    create_schema(get_connection())
+    server = HabitServer(args.host, args.port, args.workers, args.max_pending, args.keep_alive)
+
+    async def serve():
+        await server.start()
+        print(f"Serving habits on http://{server.host}:{server.port}/")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
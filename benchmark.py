@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import database_and_sql
+import query_stats
+from classes import HabitPager, Tracker
+from data_generator import generate_database
+from database_and_sql import configure_db, get_connection, habit_page_query
+from streak_calculation import calculate_streak_days, calculate_streak_weeks
+from streak_sql import GET_STREAKS
+
+"""
+Benchmarks of the streak calculation, the queries, the Tracker methods and a headless habit table refresh.
+
+- every benchmark runs `repeat` times, the median is reported in seconds
+- results are saved as JSON, a run compared with a baseline fails if a benchmark got slower than the threshold
+
+python benchmark.py --sizes 100,1000,10000 --output results.json
+python benchmark.py --baseline results.json --threshold 0.25
+"""
+
+# Queries of database_and_sql with example parameters, {habit} is replaced by an existing habit name
+QUERIES = {
+    'GET_HABITS': (database_and_sql.GET_HABITS, ()),
+    'GET_HABITS_WITH_COMPLETIONS': (database_and_sql.GET_HABITS_WITH_COMPLETIONS, ()),
+    'GET_HABIT_STREAKS': (database_and_sql.GET_HABIT_STREAKS, ()),
+    'GET_COMPLETION_DAY_ORDINALS': (database_and_sql.GET_COMPLETION_DAY_ORDINALS, ()),
+    'GET_COMPLETIONS': (database_and_sql.GET_COMPLETIONS, ('{habit}',)),
+    'GET_MAX_COMPLETION_DATE': (database_and_sql.GET_MAX_COMPLETION_DATE, ('{habit}',)),
+    'GET_HABIT_ROW': (database_and_sql.GET_HABIT_ROW, ('{habit}',)),
+    'COUNT_HABITS': (database_and_sql.COUNT_HABITS, (None,)),
+    'GET_HABIT_PAGE_longest_streak': (habit_page_query('longest_streak', descending=True), {'limit': 100, 'offset': 0}),
+    'GET_HABIT_PAGE_weekly_created_at': (habit_page_query('created_at', descending=True, frequency=True),
+                                         {'frequency': 'weekly', 'limit': 100, 'offset': 0}),
+    'GET_STREAKS': (GET_STREAKS, ()),
+}
+
+# Rows of the habit table shown by a headless refresh
+VISIBLE_ROWS = 25
+
+
+def measure(function, repeat):
+    """
+    Runs a function several times.
+
+    Args:
+        function (callable): The function to time, called without arguments.
+        repeat (int): Number of runs.
+
+    Returns:
+        float: The median duration in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+def streak_benchmarks(days, repeat):
+    """
+    Times the scalar streak calculation on a history of the given length.
+
+    Args:
+        days (int): Number of completions.
+        repeat (int): Number of runs.
+
+    Returns:
+        dict: Benchmark name -> median seconds.
+    """
+    start = date(2020, 1, 1)
+    daily = [((start + timedelta(days=day)).isoformat(),) for day in range(days) if day % 11]
+    weekly = [((start + timedelta(weeks=week)).isoformat(),) for week in range(days) if week % 5]
+    return {
+        'calculate_streak_days': measure(lambda: calculate_streak_days(daily), repeat),
+        'calculate_streak_weeks': measure(lambda: calculate_streak_weeks(weekly), repeat),
+    }
+
+
+def database_benchmarks(repeat):
+    """
+    Times the queries, the Tracker methods and a headless refresh against the configured database.
+
+    Args:
+        repeat (int): Number of runs.
+
+    Returns:
+        dict: Benchmark name -> median seconds.
+    """
+    connection = get_connection()
+    habit = connection.execute("SELECT name FROM habits ORDER BY id LIMIT 1").fetchone()[0]
+    results = {}
+
+    for name, (query, params) in QUERIES.items():
+        if isinstance(params, tuple):
+            params = tuple(habit if param == '{habit}' else param for param in params)
+        results[f'query.{name}'] = measure(lambda: connection.execute(query, params).fetchall(), repeat)
+
+    results['Tracker.get_all_habits'] = measure(Tracker.get_all_habits, repeat)
+    results['Tracker.get_all_habit_streaks'] = measure(Tracker.get_all_habit_streaks, repeat)
+    results['Tracker.get_habit_rows'] = measure(Tracker.get_habit_rows, repeat)
+    results['Tracker.get_habit_row'] = measure(lambda: Tracker.get_habit_row(habit), repeat)
+    results['Tracker.get_completion_days'] = measure(lambda: Tracker.get_completion_days(habit), repeat)
+    results['Tracker.last_completion_date'] = measure(lambda: Tracker.last_completion_date(habit), repeat)
+    results['Tracker.compute_all_habit_streaks'] = measure(Tracker.compute_all_habit_streaks, repeat)
+    results['Tracker.get_all_habits_with_completions'] = measure(
+        lambda: list(Tracker.get_all_habits_with_completions()), repeat)
+    results['Tracker.get_habit_set'] = measure(lambda: Tracker.get_habit_set().streaks(), repeat)
+    year_ago = date.today() - timedelta(days=365)
+    results['Tracker.get_completion_rates'] = measure(
+        lambda: Tracker.get_completion_rates(year_ago, date.today(), 'week'), repeat)
+    results['Tracker.get_weekday_heatmap'] = measure(lambda: Tracker.get_weekday_heatmap(year_ago, date.today()), repeat)
+    results['load_habits'] = measure(load_habits_headless, repeat)
+    return results
+
+
+def load_habits_headless():
+    """
+    Runs the work of HabitTrackerApp.load_habits without a display: count the habits and read the visible rows.
+    """
+    pager = HabitPager(page_size=100)
+    pager.count()
+    pager.get_rows(0, VISIBLE_ROWS)
+
+
+def run(sizes, days, repeat, directory):
+    """
+    Generates a dataset for every size and runs all benchmarks on it.
+
+    Args:
+        sizes (list of int): Numbers of habits.
+        days (int): Days of history per habit.
+        repeat (int): Number of runs per benchmark.
+        directory (str): Directory for the generated databases.
+
+    Returns:
+        dict: Size label -> benchmark name -> median seconds.
+    """
+    settings = dict(database_and_sql.DB_SETTINGS)
+    results = {}
+    try:
+        for size in sizes:
+            path = os.path.join(directory, f'benchmark_{size}.db')
+            generate_database(path, size, days, seed=size, overwrite=True)
+            configure_db(path=path)
+
+            label = f'habits={size}'
+            results[label] = streak_benchmarks(days, repeat)
+            results[label].update(database_benchmarks(repeat))
+    finally:
+        configure_db(**settings)
+    return results
+
+
+def find_regressions(baseline, current, threshold):
+    """
+    Compares a run with a baseline run.
+
+    Args:
+        baseline (dict): Results of the baseline run, as returned by run.
+        current (dict): Results of the current run.
+        threshold (float): Allowed slowdown, 0.25 allows 25 % more time.
+
+    Returns:
+        list: Tuples (size label, benchmark name, baseline seconds, current seconds) of slower benchmarks.
+    """
+    regressions = []
+    for label, benchmarks in current.items():
+        for name, seconds in benchmarks.items():
+            reference = baseline.get(label, {}).get(name)
+            if reference is not None and seconds > reference * (1 + threshold):
+                regressions.append((label, name, reference, seconds))
+    return regressions
+
+
+def main(argv=None):
+    """
+    Runs the benchmarks, saves the results and compares them with a baseline.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv.
+
+    Returns:
+        int: Exit code, 1 if a benchmark regressed beyond the threshold.
+    """
+    parser = argparse.ArgumentParser(description="Habit Tracker benchmarks")
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma separated numbers of habits")
+    parser.add_argument("--days", type=int, default=365, help="days of history per habit")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark")
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown against the baseline")
+    parser.add_argument("--query-stats", help="file for the per statement statistics in Prometheus text format")
+    args = parser.parse_args(argv)
+
+    if args.query_stats:
+        query_stats.configure(enabled=True)
+        query_stats.reset()
+    with tempfile.TemporaryDirectory() as directory:
+        results = run([int(size) for size in args.sizes.split(",")], args.days, args.repeat, directory)
+
+    for label, benchmarks in results.items():
+        print(label)
+        for name, seconds in benchmarks.items():
+            print(f"  {name:<45} {seconds * 1000:10.3f} ms")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({
+                'meta': {'python': sys.version.split()[0], 'sqlite': database_and_sql.sqlite3.sqlite_version,
+                         'platform': platform.platform(), 'days': args.days, 'repeat': args.repeat},
+                'results': results,
+            }, file, indent=2)
+
+    if args.query_stats:
+        with open(args.query_stats, "w") as file:
+            file.write(query_stats.to_prometheus())
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(json.load(file)['results'], results, args.threshold)
+        for label, name, reference, seconds in regressions:
+            print(f"REGRESSION {label} {name}: {reference * 1000:.3f} ms -> {seconds * 1000:.3f} ms")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
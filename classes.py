@@ -1,7 +1,32 @@
-from database_and_sql import conn
-from datetime import datetime
+import time
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime
+
+from database_and_sql import bulk_load, get_connection, transaction
+from database_and_sql import ADD_HABIT, DELETE_HABIT, ADD_COMPLETION, ADD_COMPLETION_BY_ID, UPSERT_STREAK, \
+    GET_HABITS, GET_HABIT_IDS, GET_COMPLETIONS, GET_MAX_COMPLETION_DATE, GET_HABIT_STREAKS, GET_HABIT_ROW, \
+    GET_HABIT_COLUMNS, GET_COMPLETION_DAYS, GET_HABIT_STREAKS_BY_FREQUENCY, GET_WEEK_ROLLUPS, GET_HABIT_WEEK_ROLLUPS, \
+    GET_WEEKDAY_ROLLUPS, GET_HABIT_WEEKDAY_ROLLUPS, GET_MONTH_ROLLUPS, GET_HABIT_MONTH_ROLLUPS, GET_HABIT_CREATION_COUNTS, GET_HABIT_CREATION, rebuild_rollups, \
+    execute_query, habit_count_query, habit_page_query, iter_habits_with_completions, rebuild_streaks
+from streak_sql import GET_STREAKS
+from streak_calculation import determine_habit_state
+
+# Names of the column values of habit_row_values, used by the report and the HTTP service
+REPORT_FIELDS = ('tracked_since', 'name', 'frequency', 'current_streak', 'longest_streak', 'last_completion',
+                 'habit_state')
+
+
+def habit_row_values(habit_name, habit_frequency, created_at, last_at, current_streak, longest_streak):
+    """
+    Builds the column values of the habit table for one habit, with the state of the habit determined.
+
+    Returns:
+        tuple: (created_at, name, frequency, current_streak, longest_streak, last_completed_at, habit_state).
+    """
+    habit_state, current_streak = determine_habit_state(habit_frequency, last_at, current_streak)
+    return created_at, habit_name, habit_frequency, current_streak, longest_streak, last_at, habit_state
 
-from database_and_sql import GET_HABITS, GET_COMPLETIONS, GET_MAX_COMPLETION_DATE, execute_query
 
 class Habit:
     """
@@ -14,6 +39,8 @@ class Habit:
         completed_at (str): The most recent completion date.
     """
 
+    __slots__ = ('name', 'frequency', 'created_at', 'completed_at')
+
     def __init__(self, name, frequency, created_at=None, completed_at=None):
 
         self.name = name
@@ -24,32 +51,40 @@ class Habit:
     def add_new(self):
         """
         Adds a new habit to the database.
+        Joins the surrounding transaction block, if there is one.
         """
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO habits (name, frequency, created_at) VALUES (?, ?, ?)",
-                       (self.name, self.frequency, self.created_at))
-        conn.commit()
+        with transaction() as conn:
+            conn.execute(ADD_HABIT, (self.name, self.frequency, self.created_at))
 
     def add_completion(self):
         """
-        Adds a completion record for the habit.
-        """
-        self.completed_at = datetime.now().date().isoformat()
+        Adds a completion record for the habit and advances its stored streak in the same transaction.
+
+        The database allows one completion per day (daily) or ISO week (weekly), a habit that is already
+        completed for the current period is left unchanged, also when several clients complete it at once.
 
+        Returns:
+            bool: True if the completion was added, False if the period was already completed.
+        """
+        completed_at = datetime.now().date().isoformat()
 
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO completions (id, completed_at) VALUES "
-                       "((SELECT id FROM habits WHERE name = ?), ?)",
-                       (self.name, self.completed_at))
-        conn.commit()
+        with transaction() as conn:
+            added = conn.execute(ADD_COMPLETION, (self.name, completed_at)).rowcount > 0
+            if added:
+                conn.execute(UPSERT_STREAK, (self.name, completed_at))
+        if added:
+            self.completed_at = completed_at
+        return added
 
     def delete(self):
         """
-        Deletes the habit and its completions from the database.
+        Deletes the habit, its completions and its stored streak from the database.
+
+        Returns:
+            bool: True if the habit existed.
         """
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM habits WHERE name = ?", (self.name,))
-        conn.commit()
+        with transaction() as conn:
+            return conn.execute(DELETE_HABIT, (self.name,)).rowcount > 0
 
 class Tracker:
     """
@@ -66,6 +101,182 @@ class Tracker:
         """
         return execute_query(GET_HABITS, fetch=True)
 
+    @staticmethod
+    def get_all_habits_with_completions():
+        """
+        Retrieves all habits together with their ordered completion history using a single query.
+
+        The rows are streamed from one cursor and grouped per habit, so no query is issued per habit.
+
+        Yields:
+            tuple: (name, frequency, created_at, last_completed_at, completions) where completions is a
+                   list of tuples containing a single completion date, ordered by date.
+        """
+        for habit in iter_habits_with_completions(get_connection()):
+            yield habit[1:]
+
+    @staticmethod
+    def get_all_habit_streaks():
+        """
+        Retrieves all habits with their stored current and longest streak.
+
+        Returns:
+            list: List of tuples (name, frequency, created_at, last_completed_at, current_streak, longest_streak).
+        """
+        return execute_query(GET_HABIT_STREAKS, fetch=True)
+
+    @staticmethod
+    def get_habit_rows(frequency=None):
+        """
+        Retrieves the habits as shown in the habit table, with the state of each habit determined.
+
+        Args:
+            frequency (str): Only return habits of this frequency ("daily" or "weekly"), all habits if None.
+
+        Returns:
+            list: List of tuples (created_at, name, frequency, current_streak, longest_streak,
+                  last_completed_at, habit_state).
+        """
+        return list(Tracker.iter_habit_rows(frequency))
+
+    @staticmethod
+    def iter_habit_rows(frequency=None):
+        """
+        Streams the habits as shown in the habit table from one cursor, in name order.
+
+        Memory use does not grow with the number of habits, e.g. for reports over large databases.
+
+        Args:
+            frequency (str): Only return habits of this frequency ("daily" or "weekly"), all habits if None.
+
+        Yields:
+            tuple: (created_at, name, frequency, current_streak, longest_streak, last_completed_at, habit_state).
+        """
+        cursor = get_connection().execute(GET_HABIT_STREAKS_BY_FREQUENCY, (frequency or None,))
+        try:
+            for habit in cursor:
+                yield habit_row_values(*habit)
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def get_habit_row(habit_name):
+        """
+        Retrieves a single habit as shown in the habit table, reading only its stored streak.
+
+        Args:
+            habit_name (str): The name of the habit.
+
+        Returns:
+            tuple: (id, values) with the habit id and the column values of the habit table, None if not found.
+        """
+        result = execute_query(GET_HABIT_ROW, (habit_name,), fetch=True)
+        if not result:
+            return None
+        return result[0][0], habit_row_values(*result[0][1:])
+
+    @staticmethod
+    def compute_all_habit_streaks():
+        """
+        Computes the current and longest streak of all habits from their completions inside SQLite.
+
+        Returns:
+            list: List of tuples (name, frequency, created_at, last_completed_at, current_streak, longest_streak).
+        """
+        return execute_query(GET_STREAKS, fetch=True)
+
+    @staticmethod
+    def rebuild_streaks(check_only=False):
+        """
+        Recomputes the stored streaks from the completion history.
+
+        Args:
+            check_only (bool): Only report drifted habits without rewriting the stored streaks.
+
+        Returns:
+            list: Names of the habits whose stored streak differed from their completion history.
+        """
+        with transaction() as conn:
+            return rebuild_streaks(conn, check_only)
+
+    @staticmethod
+    def add_completions(completions, chunk_size=10000):
+        """
+        Records many completions at once, e.g. to backfill history, in a single transaction.
+
+        Habit names are resolved once, rows are inserted in chunks and a habit is only completed once
+        per day (daily) or ISO week (weekly). The rollup triggers are turned off during the inserts, at the end
+        the rollups and the stored streaks of the habits that got new completions are rebuilt from their whole
+        history, the cost grows with their completions, not with all.
+
+        Args:
+            completions (iterable): Pairs of (habit_name, completion date), the date as date, datetime or ISO string.
+            chunk_size (int): Number of rows sent to the database per batch.
+
+        Returns:
+            dict: Number of `inserted` rows, `rejected` rows per reason ('unknown_habit', 'invalid_date',
+                  'duplicate'), the elapsed `seconds` and the processed `rows_per_second`.
+        """
+        started = time.perf_counter()
+        rejected = {'unknown_habit': 0, 'invalid_date': 0, 'duplicate': 0}
+        inserted = 0
+        processed = 0
+        changed = set()  # ids of the habits in chunks that inserted rows
+
+        with transaction() as conn, bulk_load(conn):
+            habit_ids = {name: habit_id for name, habit_id, _ in conn.execute(GET_HABIT_IDS)}
+            batch = []
+
+            for habit_name, completed_at in completions:
+                processed += 1
+                habit_id = habit_ids.get(habit_name)
+                if habit_id is None:
+                    rejected['unknown_habit'] += 1
+                    continue
+                try:
+                    if isinstance(completed_at, datetime):
+                        completed_at = completed_at.date()
+                    elif not isinstance(completed_at, date):
+                        completed_at = datetime.fromisoformat(completed_at).date()
+                except (TypeError, ValueError):
+                    rejected['invalid_date'] += 1
+                    continue
+
+                batch.append((habit_id, completed_at.isoformat()))
+                if len(batch) >= chunk_size:
+                    inserted += Tracker._insert_completions(conn, batch, changed)
+                    batch = []
+
+            if batch:
+                inserted += Tracker._insert_completions(conn, batch, changed)
+
+            # rows for an already completed period were skipped by the unique index
+            rejected['duplicate'] = processed - inserted - rejected['unknown_habit'] - rejected['invalid_date']
+            if changed:
+                rebuild_rollups(conn, habit_ids=changed)
+                rebuild_streaks(conn, habit_ids=changed)
+
+        seconds = time.perf_counter() - started
+        return {
+            'inserted': inserted,
+            'rejected': rejected,
+            'seconds': seconds,
+            'rows_per_second': processed / seconds if seconds else 0.0,
+        }
+
+    @staticmethod
+    def _insert_completions(conn, batch, changed):
+        """
+        Inserts a chunk of completions and adds the habits of the chunk to changed if a row was inserted.
+
+        Returns:
+            int: Number of inserted rows.
+        """
+        inserted = conn.executemany(ADD_COMPLETION_BY_ID, batch).rowcount
+        if inserted:
+            changed.update(row[0] for row in batch)
+        return inserted
+
     @staticmethod
     def get_completion_days(habit_name):
         """
@@ -89,3 +300,474 @@ class Tracker:
         """
         result = execute_query(GET_MAX_COMPLETION_DATE, (habit_name,), fetch=True)
         return result[0][0] if result else None
+
+    @staticmethod
+    def get_completion_rates(start, end, period='week', habit_name=None):
+        """
+        Reports the share of possible completions that were made per week or month, read from the rollups.
+
+        A daily habit can be completed on every day from its creation until today, a weekly habit once in every
+        ISO week with such a day, also in the week it was created and in the current week. For weekly habits a
+        month counts the ISO weeks whose Thursday is in the month, completions included, so a habit completed
+        every week has a rate of 1.0 in every month. The work grows with the number of periods and habits, not
+        with the completions.
+
+        Args:
+            start (date or str): First day of the range, the whole week or month containing it is reported.
+            end (date or str): Last day of the range, the whole week or month containing it is reported.
+            period (str): 'week' (weeks start on Monday) or 'month'.
+            habit_name (str): Only this habit, all habits if None.
+
+        Returns:
+            list: Tuples (first day of the period in ISO format, completions, possible completions, rate),
+                  one per period in order, empty for an unknown habit.
+        """
+        if period not in ('week', 'month'):
+            raise ValueError(f"Unknown period: {period}")
+        habit = Tracker._analytics_habit(habit_name)
+        if habit is False:
+            return []
+
+        periods = _period_days(period, _day_ordinal(start), _day_ordinal(end))
+        if period == 'week':
+            query = GET_HABIT_WEEK_ROLLUPS if habit else GET_WEEK_ROLLUPS
+        else:
+            query = GET_HABIT_MONTH_ROLLUPS if habit else GET_MONTH_ROLLUPS
+        params = (periods[0][0], periods[-1][0]) + ((habit[0],) if habit else ())
+        counts = {row[0]: row[1] for row in get_connection().execute(query, params)}
+
+        if habit:
+            creations = [(habit[1], habit[2], 1)]
+        else:
+            creations = get_connection().execute(GET_HABIT_CREATION_COUNTS).fetchall()
+        possible = _possible_completions(creations, periods, date.today().toordinal())
+
+        rates = []
+        for (key, first_day, _), possible_completions in zip(periods, possible):
+            completions = counts.get(key, 0)
+            rates.append((date.fromordinal(first_day).isoformat(), completions, possible_completions,
+                          completions / possible_completions if possible_completions else 0.0))
+        return rates
+
+    @staticmethod
+    def get_weekday_heatmap(start, end, habit_name=None):
+        """
+        Counts the completions per week and weekday, read from the weekly rollups.
+
+        Args:
+            start (date or str): First day of the range, the whole week containing it is reported.
+            end (date or str): Last day of the range, the whole week containing it is reported.
+            habit_name (str): Only this habit, all habits if None.
+
+        Returns:
+            list: Tuples (Monday of the week in ISO format, tuple of 7 counts from Monday to Sunday),
+                  one per week in order, empty for an unknown habit.
+        """
+        habit = Tracker._analytics_habit(habit_name)
+        if habit is False:
+            return []
+
+        periods = _period_days('week', _day_ordinal(start), _day_ordinal(end))
+        query = GET_HABIT_WEEKDAY_ROLLUPS if habit else GET_WEEKDAY_ROLLUPS
+        params = (periods[0][0], periods[-1][0]) + ((habit[0],) if habit else ())
+        counts = {row[0]: tuple(row[1:]) for row in get_connection().execute(query, params)}
+        return [(date.fromordinal(first_day).isoformat(), counts.get(week, (0,) * 7))
+                for week, first_day, _ in periods]
+
+    @staticmethod
+    def rebuild_rollups():
+        """
+        Recomputes the weekly and monthly completion rollups from all completions in one transaction.
+        """
+        with transaction() as conn:
+            rebuild_rollups(conn)
+
+    @staticmethod
+    def _analytics_habit(habit_name):
+        """
+        Looks up the habit of an analytics query.
+
+        Returns:
+            tuple: (id, creation day ordinal, frequency), None for all habits, False for an unknown habit.
+        """
+        if habit_name is None:
+            return None
+        row = get_connection().execute(GET_HABIT_CREATION, (habit_name,)).fetchone()
+        return row or False
+
+    @staticmethod
+    def get_habit_set():
+        """
+        Loads all habits and their completion history into a columnar HabitSet.
+
+        Returns:
+            HabitSet: The habits ordered by id.
+        """
+        return HabitSet.load(get_connection())
+
+
+class HabitSet:
+    """
+    Holds many habits column by column in compact buffers, for reporting over large portfolios.
+
+    Habit i owns the completions days[offsets[i]:offsets[i + 1]], ordered by day. Dates are day ordinals
+    (date.toordinal()) and frequencies are indexes into frequency_names, so no object is kept per habit
+    or per completion apart from the names.
+
+    Attributes:
+        ids (array): Habit ids.
+        names (list of str): Habit names.
+        frequency_names (list of str): The distinct frequencies, 'daily' and 'weekly' first.
+        frequencies (array): Index into frequency_names per habit.
+        created_days (array): Creation day ordinal per habit.
+        days (array): Completion day ordinals of all habits, habit by habit.
+        offsets (array): Start of every habit in days followed by the total length.
+    """
+
+    __slots__ = ('ids', 'names', 'frequency_names', 'frequencies', 'created_days', 'days', 'offsets', '_streaks')
+
+    def __init__(self):
+
+        self.ids = array('q')
+        self.names = []
+        self.frequency_names = ['daily', 'weekly']
+        self.frequencies = array('b')
+        self.created_days = array('q')
+        self.days = array('q')
+        self.offsets = array('q', [0])
+        self._streaks = None
+
+    @classmethod
+    def load(cls, connection):
+        """
+        Reads all habits and completions from the database.
+
+        Args:
+            connection (sqlite3.Connection): The connection to read from.
+
+        Returns:
+            HabitSet: The habits ordered by id.
+        """
+        habit_set = cls()
+        position = {}
+        for habit_id, name, frequency, created_day in connection.execute(GET_HABIT_COLUMNS):
+            if frequency not in habit_set.frequency_names:
+                habit_set.frequency_names.append(frequency)
+            position[habit_id] = len(habit_set.ids)
+            habit_set.ids.append(habit_id)
+            habit_set.names.append(name)
+            habit_set.frequencies.append(habit_set.frequency_names.index(frequency))
+            habit_set.created_days.append(created_day or 0)
+
+        # completions arrive ordered by habit id, the offsets are filled whenever the habit changes
+        counts = array('q', bytes(8 * len(habit_set.ids)))
+        last_id = None
+        index = 0
+        for habit_id, day in connection.execute(GET_COMPLETION_DAYS):
+            if habit_id != last_id:
+                index = position[habit_id]
+                last_id = habit_id
+            habit_set.days.append(day)
+            counts[index] += 1
+
+        total = 0
+        for count in counts:
+            total += count
+            habit_set.offsets.append(total)
+        return habit_set
+
+    def __len__(self):
+        return len(self.ids)
+
+    def frequency(self, index):
+        """
+        Returns the frequency of a habit.
+
+        Args:
+            index (int): Position of the habit in the set.
+
+        Returns:
+            str: 'daily' or 'weekly'.
+        """
+        return self.frequency_names[self.frequencies[index]]
+
+    def completion_days(self, index):
+        """
+        Returns the completion days of a habit without copying them.
+
+        Args:
+            index (int): Position of the habit in the set.
+
+        Returns:
+            memoryview: The day ordinals of the habit, ordered.
+        """
+        return memoryview(self.days)[self.offsets[index]:self.offsets[index + 1]]
+
+    def streaks(self):
+        """
+        Calculates the current and longest streak of every habit, computed once per set.
+
+        Returns:
+            tuple: The current streaks and the longest streaks as lists of int, in set order.
+        """
+        if self._streaks is None:
+            # NumPy is only imported once a report needs it, importing this module stays cheap
+            from streak_batch import calculate_streaks_batch
+
+            frequencies = [self.frequency_names[code] for code in self.frequencies]
+            self._streaks = calculate_streaks_batch(self.days, self.offsets, frequencies)
+        return self._streaks
+
+    def row_values(self, index):
+        """
+        Builds the column values of the habit table for one habit, with the state of the habit determined.
+
+        Args:
+            index (int): Position of the habit in the set.
+
+        Returns:
+            tuple: (created_at, name, frequency, current_streak, longest_streak, last_completed_at, habit_state).
+        """
+        current_streaks, longest_streaks = self.streaks()
+        created_at, last_at = self._dates(index)
+        return habit_row_values(self.names[index], self.frequency(index), created_at, last_at,
+                                current_streaks[index], longest_streaks[index])
+
+    def habit(self, index):
+        """
+        Creates a Habit for one habit of the set.
+
+        Args:
+            index (int): Position of the habit in the set.
+
+        Returns:
+            Habit: The habit with its creation and last completion date.
+        """
+        created_at, last_at = self._dates(index)
+        return Habit(self.names[index], self.frequency(index), created_at, last_at)
+
+    def _dates(self, index):
+        """
+        Returns the creation and last completion date of a habit in ISO format, None if missing.
+        """
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        last_at = date.fromordinal(self.days[stop - 1]).isoformat() if stop > start else None
+        created_at = date.fromordinal(self.created_days[index]).isoformat() if self.created_days[index] else None
+        return created_at, last_at
+
+
+class HabitPager:
+    """
+    Reads the habit table page by page, sorted and filtered in the database, for the virtual habit list.
+
+    Pages are read with keyset pagination starting after the last row of the previous page, jumps to a page
+    whose start is not known yet use LIMIT/OFFSET. Only the most recently used pages are kept in memory.
+
+    Attributes:
+        frequency (str): Only habits of this frequency ("daily" or "weekly"), all habits if None.
+        sort_by (str): The sort key, see database_and_sql.HABIT_SORT_KEYS.
+        prefix (str): Only habits whose name starts with this text, all habits if empty.
+        descending (bool): Sort in descending order.
+        page_size (int): Number of rows per page.
+        cache_pages (int): Number of pages kept in memory.
+    """
+
+    def __init__(self, frequency=None, sort_by='name', descending=False, page_size=100, cache_pages=4, prefix=''):
+
+        self.frequency = frequency
+        self.sort_by = sort_by
+        self.descending = descending
+        self.prefix = prefix or ''
+        self.page_size = page_size
+        self.cache_pages = cache_pages
+        self.pages = OrderedDict()
+        self.page_starts = {0: None}  # page number -> (sort key, id) of the last row before the page
+        self.day = date.today()  # habit states of the cached pages are valid for this day
+
+    def count(self):
+        """
+        Counts the habits matching the frequency filter.
+
+        Returns:
+            int: Number of habits.
+        """
+        query = habit_count_query(bool(self.frequency), bool(self.prefix))
+        return execute_query(query, self._filter_params(), fetch=True)[0][0]
+
+    def get_rows(self, start, stop):
+        """
+        Retrieves the rows between two positions of the sorted habit table.
+
+        Args:
+            start (int): Position of the first row.
+            stop (int): Position after the last row.
+
+        Returns:
+            list: List of tuples (id, values) where values are the column values of the habit table.
+        """
+        rows = []
+        for number in range(start // self.page_size, (max(stop, start + 1) - 1) // self.page_size + 1):
+            page = self.get_page(number)
+            first = number * self.page_size
+            rows.extend(page[max(start - first, 0):stop - first])
+            if len(page) < self.page_size:
+                break
+        return rows
+
+    def get_page(self, number):
+        """
+        Retrieves one page of rows, from memory if it was read recently.
+
+        Args:
+            number (int): The page number, starting at 0.
+
+        Returns:
+            list: List of tuples (id, values) of the page.
+        """
+        if self.day != date.today():
+            self.day = date.today()
+            self.pages.clear()
+        if number in self.pages:
+            self.pages.move_to_end(number)
+            return self.pages[number]
+
+        start = self.page_starts.get(number)
+        params = self._filter_params()
+        params['limit'] = self.page_size
+        if number == 0 or start is not None:
+            params['after_key'], params['after_id'] = start or (None, None)
+            params['offset'] = 0
+        else:
+            params['offset'] = number * self.page_size
+        query = habit_page_query(self.sort_by, self.descending, keyset=start is not None,
+                                 frequency=bool(self.frequency), prefix=bool(self.prefix))
+
+        result = execute_query(query, params, fetch=True)
+        if result:
+            self.page_starts[number + 1] = result[-1][:2]
+
+        page = [(row[1], habit_row_values(*row[2:])) for row in result]
+
+        self.pages[number] = page
+        if len(self.pages) > self.cache_pages:
+            self.pages.popitem(last=False)
+        return page
+
+    def replace_row(self, habit_id, values):
+        """
+        Updates the cached copy of a changed habit, the habit keeps its position until the pages are read again.
+
+        Args:
+            habit_id (int): The id of the habit.
+            values (tuple): The new column values of the habit.
+        """
+        for page in self.pages.values():
+            for i, (row_id, _) in enumerate(page):
+                if row_id == habit_id:
+                    page[i] = (habit_id, values)
+
+    def _filter_params(self):
+        """
+        Returns the named parameters of the frequency and name filters.
+        """
+        # no name sorts after the prefix followed by the largest code point
+        return {'frequency': self.frequency, 'prefix': self.prefix, 'prefix_end': self.prefix + '\U0010ffff'}
+
+    def invalidate(self):
+        """
+        Forgets all cached pages and page starts after habits were added or deleted.
+        """
+        self.pages.clear()
+        self.page_starts = {0: None}
+
+
+def _day_ordinal(value):
+    """
+    Converts a date, datetime or ISO string into a day ordinal.
+    """
+    if isinstance(value, datetime):
+        value = value.date()
+    elif not isinstance(value, date):
+        value = datetime.fromisoformat(value).date()
+    return value.toordinal()
+
+
+def _period_days(period, first_day, last_day):
+    """
+    Lists the weeks or months covering a range of day ordinals.
+
+    Returns:
+        list: Tuples (rollup key, first day ordinal, last day ordinal), at least one period.
+    """
+    last_day = max(last_day, first_day)
+    if period == 'week':
+        return [(week, week * 7 + 1, week * 7 + 7) for week in range((first_day - 1) // 7, (last_day - 1) // 7 + 1)]
+
+    first, last = date.fromordinal(first_day), date.fromordinal(last_day)
+    periods = []
+    for month in range(first.year * 12 + first.month - 1, last.year * 12 + last.month):
+        following = month + 1
+        periods.append((month, date(month // 12, month % 12 + 1, 1).toordinal(),
+                        date(following // 12, following % 12 + 1, 1).toordinal() - 1))
+    return periods
+
+
+def _possible_completions(creations, periods, today):
+    """
+    Counts the completions that were possible per period. A habit is active from its creation day until today,
+    a daily habit can be completed on every active day and a weekly habit once in every ISO week from the week
+    it was created in until the current week. An ISO week belongs to the month of its Thursday, like the
+    completions in the month rollups of weekly habits, so a month counts every week once.
+
+    Args:
+        creations (iterable): Tuples (creation day ordinal, frequency, number of habits), by creation day.
+        periods (list): Tuples (rollup key, first day ordinal, last day ordinal) in order.
+        today (int): Day ordinal of today.
+
+    Returns:
+        list: The possible completions per period, as int.
+    """
+    # daily habits count days, weekly habits ISO weeks, both as (first unit of the habit, number of habits)
+    groups = ([], [])
+    for created_day, frequency, count in creations:
+        weekly = frequency == 'weekly'
+        groups[weekly].append((_first_unit(weekly, created_day or 0), count))
+
+    possible = []
+    active = [0, 0]  # daily and weekly habits active since the start of the current period
+    positions = [0, 0]
+    for _, first_day, last_day in periods:
+        total = 0
+        for weekly, group in enumerate(groups):
+            first, last = _period_units(weekly, first_day, last_day, today)
+            while positions[weekly] < len(group) and group[positions[weekly]][0] <= first:
+                active[weekly] += group[positions[weekly]][1]
+                positions[weekly] += 1
+            if last < first:
+                continue
+            total += active[weekly] * (last - first + 1)
+            # habits created during the period count from their first unit
+            for first_unit, count in group[positions[weekly]:]:
+                if first_unit > last:
+                    break
+                total += count * (last - first_unit + 1)
+        possible.append(total)
+    return possible
+
+
+def _first_unit(weekly, created_day):
+    """
+    Returns the first day, or the ISO week, in which a habit created on a day ordinal can be completed.
+    """
+    # day ordinal 1 is a Monday, see _period_days
+    return (created_day - 1) // 7 if weekly else created_day
+
+
+def _period_units(weekly, first_day, last_day, today):
+    """
+    Returns the first and last day, or ISO week, of a period up to today, the last is before the first if none.
+    """
+    if weekly:
+        # the weeks whose Thursday (day 7 * week + 4) lies in the period
+        return -((4 - first_day) // 7), min((last_day - 4) // 7, (today - 1) // 7)
+    return first_day, min(last_day, today)
@@ -0,0 +1,218 @@
+#cli.py
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+from database_and_sql import create_schema, get_connection
+from classes import REPORT_FIELDS, Tracker
+from data_generator import PATTERNS, generate_database
+from parallel_report import iter_streak_report
+import transfer
+
+
+def rebuild_streaks(args):
+    """
+    Recomputes the stored streaks from the completion history and reports habits that had drifted.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments, `check` only reports drift without rewriting.
+
+    Returns:
+        int: Exit code, 1 if drift was found in check mode, else 0.
+    """
+    drifted = Tracker.rebuild_streaks(check_only=args.check)
+    for habit_name in drifted:
+        print(f"drift: {habit_name}")
+
+    if args.check:
+        print(f"{len(drifted)} habit(s) with drifted streaks")
+        return 1 if drifted else 0
+    print(f"Streaks rebuilt, {len(drifted)} habit(s) corrected")
+    return 0
+
+
+def rebuild_rollups(args):
+    """
+    Recomputes the weekly and monthly completion rollups from all completions.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments of the `rebuild-rollups` command.
+
+    Returns:
+        int: Exit code, always 0.
+    """
+    Tracker.rebuild_rollups()
+    print("Completion rollups rebuilt")
+    return 0
+
+
+def generate(args):
+    """
+    Writes a synthetic dataset into a fresh database file, e.g. for load tests and benchmarks.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments of the `generate` command.
+
+    Returns:
+        int: Exit code, always 0.
+    """
+    result = generate_database(args.path, args.habits, args.days, pattern=args.pattern,
+                               probability=args.probability, weekday=args.weekday, half_life=args.half_life,
+                               seed=args.seed, overwrite=args.overwrite)
+    print(f"{result['habits']} habits and {result['completions']} completions written to {args.path} "
+          f"in {result['seconds']:.1f}s")
+    return 0
+
+
+def report(args):
+    """
+    Writes the habit table, with the state of every habit, as JSON Lines or CSV without starting the interface.
+
+    Rows are streamed from the database and written one by one, memory use does not depend on the number of habits.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments, `frequency` filters the habits, `format` and `output`
+                                   select the output, `recompute` computes the streaks from the completions
+                                   with `workers` processes instead of reading the stored streaks.
+
+    Returns:
+        int: Exit code, 0 or 1 if the reader of standard output went away early.
+    """
+    output = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if args.recompute:
+            rows = (values for _, values in iter_streak_report(workers=args.workers, frequency=args.frequency))
+        else:
+            rows = Tracker.iter_habit_rows(args.frequency)
+        if args.format == "csv":
+            writer = csv.writer(output, lineterminator="\n")
+            writer.writerow(REPORT_FIELDS)
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                output.write(json.dumps(dict(zip(REPORT_FIELDS, row))) + "\n")
+        output.flush()
+    except BrokenPipeError:
+        # e.g. piped into head, silence the flush of the closed pipe at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+def show_progress(lines):
+    """
+    Reports the number of processed lines of an export or import on standard error.
+    """
+    print(f"\r{lines} lines", end="", file=sys.stderr, flush=True)
+
+
+def export_history(args):
+    """
+    Writes all habits and completions to a history file.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments of the `export` command.
+
+    Returns:
+        int: Exit code, always 0.
+    """
+    result = transfer.export_history(args.path, args.chunk_size, show_progress, args.overwrite)
+    print(f"\n{result['habits']} habits and {result['completions']} completions exported to {args.path} "
+          f"in {result['seconds']:.1f}s")
+    return 0
+
+
+def import_history(args):
+    """
+    Adds the habits and completions of a history file, continuing an interrupted import of the same file.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments of the `import` command.
+
+    Returns:
+        int: Exit code, always 0.
+    """
+    result = transfer.import_history(args.path, args.chunk_size, not args.restart, show_progress)
+    resumed = f", resumed after line {result['resumed_from']}" if result['resumed_from'] else ""
+    print(f"\n{result['habits']} habits and {result['completions']} completions imported, "
+          f"{result['skipped']} skipped in {result['seconds']:.1f}s{resumed}")
+    return 0
+
+
+def build_parser():
+    """
+    Creates the argument parser with one sub command per maintenance task.
+
+    Returns:
+        argparse.ArgumentParser: The configured parser.
+    """
+    parser = argparse.ArgumentParser(description="Habit Tracker maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-streaks", help="recompute stored streaks from completions")
+    rebuild.add_argument("--check", action="store_true", help="only report drift, do not rewrite")
+    rebuild.set_defaults(handler=rebuild_streaks)
+
+    rollups = commands.add_parser("rebuild-rollups", help="recompute the weekly and monthly completion rollups")
+    rollups.set_defaults(handler=rebuild_rollups)
+
+    reporter = commands.add_parser("report", help="write the habit states as JSON Lines or CSV")
+    reporter.add_argument("--frequency", choices=("daily", "weekly"), help="only habits of this frequency")
+    reporter.add_argument("--format", choices=("jsonl", "csv"), default="jsonl", help="output format")
+    reporter.add_argument("--output", help="file to write, defaults to standard output")
+    reporter.add_argument("--recompute", action="store_true",
+                          help="compute the streaks from all completions in parallel, rows in habit id order")
+    reporter.add_argument("--workers", type=int, help="worker processes for --recompute, defaults to the CPU count")
+    reporter.set_defaults(handler=report)
+
+    exporter = commands.add_parser("export", help="write all habits and completions to a history file")
+    exporter.add_argument("path", help="file to write, gzip compressed if it ends in .gz")
+    exporter.add_argument("--chunk-size", type=int, default=10000, help="rows read per chunk")
+    exporter.add_argument("--overwrite", action="store_true", help="replace an existing file")
+    exporter.set_defaults(handler=export_history)
+
+    importer = commands.add_parser("import", help="add the habits and completions of a history file")
+    importer.add_argument("path", help="history file written by export")
+    importer.add_argument("--chunk-size", type=int, default=10000, help="records committed per chunk")
+    importer.add_argument("--restart", action="store_true", help="read the file from the start, not resuming")
+    importer.set_defaults(handler=import_history)
+
+    generator = commands.add_parser("generate", help="write a synthetic dataset into a fresh database")
+    generator.add_argument("path", help="database file to create")
+    generator.add_argument("--habits", type=int, default=1000, help="number of habits")
+    generator.add_argument("--days", type=int, default=365, help="days of history per habit")
+    generator.add_argument("--pattern", choices=PATTERNS + ('mixed',), default='mixed', help="completion pattern")
+    generator.add_argument("--probability", type=float, default=0.5, help="completion probability")
+    generator.add_argument("--weekday", type=int, default=0, help="weekday of weekly habits, 0 is Monday")
+    generator.add_argument("--half-life", type=float, default=30, help="days until a decaying habit halves")
+    generator.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    generator.add_argument("--overwrite", action="store_true", help="replace an existing file")
+    generator.set_defaults(handler=generate, needs_db=False)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs the command given on the command line.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv.
+
+    Returns:
+        int: The exit code of the command.
+    """
+    args = build_parser().parse_args(argv)
+    if getattr(args, "needs_db", True):
+        create_schema(get_connection())
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,153 @@
+import math
+import os
+import random
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+from database_and_sql import ADD_HABIT_WITH_ID, ADD_COMPLETION_BY_ID, bulk_load, connect, create_schema, \
+    rebuild_rollups, rebuild_streaks
+
+"""
+Completion patterns of generated habits.
+
+always   : completed every day, daily frequency
+random   : completed with the given probability each day, daily frequency
+weekly   : completed on the given weekday, skipped with 1 - probability, weekly frequency
+decaying : completion probability halves every half_life days, daily frequency
+mixed    : the habits cycle through the patterns above
+"""
+PATTERNS = ('always', 'random', 'weekly', 'decaying')
+
+
+def generate_habits(habit_count, start, pattern='mixed'):
+    """
+    Generates the habits of a synthetic dataset.
+
+    Args:
+        habit_count (int): Number of habits.
+        start (date): The creation date of all habits.
+        pattern (str): One of PATTERNS or 'mixed'.
+
+    Yields:
+        tuple: (id, name, frequency, created_at, pattern) for every habit.
+    """
+    for habit_id in range(1, habit_count + 1):
+        habit_pattern = PATTERNS[(habit_id - 1) % len(PATTERNS)] if pattern == 'mixed' else pattern
+        frequency = 'weekly' if habit_pattern == 'weekly' else 'daily'
+        yield habit_id, f"{habit_pattern}_{habit_id:07}", frequency, start.isoformat(), habit_pattern
+
+
+def generate_completions(habits, days, start, probability=0.5, weekday=0, half_life=30, seed=0):
+    """
+    Generates the completions of the given habits day by day, without holding them in memory.
+
+    Args:
+        habits (iterable): Habits as yielded by generate_habits.
+        days (int): Number of days of history per habit.
+        start (date): The first day of the history.
+        probability (float): Completion probability of the 'random', 'weekly' and 'decaying' patterns.
+        weekday (int): Day of the week of the 'weekly' pattern, 0 is Monday.
+        half_life (float): Days after which the 'decaying' probability has halved.
+        seed (int): Seed of the random generator, the same seed gives the same dataset.
+
+    Yields:
+        tuple: (habit id, completed_at) rows for ADD_COMPLETION_BY_ID.
+    """
+    rng = random.Random(seed)
+    calendar = [(start + timedelta(days=day)) for day in range(days)]
+    iso_days = [day.isoformat() for day in calendar]
+    decay = [probability * math.pow(0.5, day / half_life) for day in range(days)]
+
+    for habit_id, _, _, _, pattern in habits:
+        for day in range(days):
+            if pattern == 'always':
+                completed = True
+            elif pattern == 'random':
+                completed = rng.random() < probability
+            elif pattern == 'weekly':
+                completed = calendar[day].weekday() == weekday and rng.random() < probability
+            elif pattern == 'decaying':
+                completed = rng.random() < decay[day]
+            else:
+                raise ValueError(f"Unknown completion pattern: {pattern}")
+
+            if completed:
+                yield habit_id, iso_days[day]
+
+
+def generate_database(path, habit_count, days, pattern='mixed', probability=0.5, weekday=0, half_life=30,
+                      start=None, seed=0, chunk_size=50000, overwrite=False):
+    """
+    Writes a synthetic dataset of habit_count habits with days of history into a fresh database.
+
+    Rows are streamed into chunked inserts, so the dataset is never materialised in memory.
+
+    Args:
+        path (str): The database file to create.
+        habit_count (int): Number of habits.
+        days (int): Number of days of history per habit.
+        pattern (str): One of PATTERNS or 'mixed'.
+        probability (float): Completion probability of the 'random', 'weekly' and 'decaying' patterns.
+        weekday (int): Day of the week of the 'weekly' pattern, 0 is Monday.
+        half_life (float): Days after which the 'decaying' probability has halved.
+        start (date): The first day of the history, defaults to `days` days before today.
+        seed (int): Seed of the random generator.
+        chunk_size (int): Number of rows per insert batch.
+        overwrite (bool): Replace an existing database file.
+
+    Returns:
+        dict: Number of `habits` and `completions` written and the elapsed `seconds`.
+    """
+    if pattern != 'mixed' and pattern not in PATTERNS:
+        raise ValueError(f"Unknown completion pattern: {pattern}")
+    if os.path.exists(path):
+        if not overwrite:
+            raise FileExistsError(f"{path} already exists")
+        os.remove(path)
+
+    started = time.perf_counter()
+    start = start or date.today() - timedelta(days=days)
+    connection = connect(path)
+    connection.execute("PRAGMA synchronous = OFF")  # a fresh file, nothing to lose if generation fails
+    create_schema(connection)
+
+    try:
+        with connection:
+            habits = ((habit_id, name, frequency, created_at)
+                      for habit_id, name, frequency, created_at, _ in generate_habits(habit_count, start, pattern))
+            _insert_chunked(connection, ADD_HABIT_WITH_ID, habits, chunk_size)
+
+            completions = generate_completions(generate_habits(habit_count, start, pattern), days, start,
+                                               probability, weekday, half_life, seed)
+            with bulk_load(connection):
+                completion_count = _insert_chunked(connection, ADD_COMPLETION_BY_ID, completions, chunk_size)
+                rebuild_rollups(connection)
+
+            rebuild_streaks(connection)
+    finally:
+        connection.close()
+
+    return {'habits': habit_count, 'completions': completion_count, 'seconds': time.perf_counter() - started}
+
+
+def _insert_chunked(connection, query, rows, chunk_size):
+    """
+    Inserts rows from an iterator in batches of chunk_size.
+
+    Args:
+        connection (sqlite3.Connection): The connection to write to.
+        query (str): The insert statement.
+        rows (iterator): Parameter tuples of the statement.
+        chunk_size (int): Number of rows per batch.
+
+    Returns:
+        int: Number of inserted rows.
+    """
+    inserted = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return inserted
+        inserted += connection.executemany(query, chunk).rowcount
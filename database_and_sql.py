@@ -1,20 +1,39 @@
+import json
+import os
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+from datetime import date, datetime, timedelta
+from itertools import groupby
 import random
 
+from query_stats import InstrumentedConnection
+from streak_calculation import calculate_streak_ordinals
+
 ####################
 #db connection var
 ####################
 
-conn = sqlite3.connect('habits.db') # Connect to habits.db - creates habits.db if not exists
-conn.execute("PRAGMA foreign_keys = ON;")# enable foreign key constraints
+"""
+Settings for every connection opened by get_connection.
 
-###################
-#sample data var
-###################
+path          : database file, created if it does not exist - can be set with the HABITS_DB environment variable
+journal_mode  : WAL lets readers and one writer work at the same time
+busy_timeout  : milliseconds a connection waits for a lock before raising `database is locked`
+synchronous   : NORMAL is safe with WAL and only syncs at checkpoints
+cache_size    : page cache per connection, negative values are KiB
+"""
+DB_SETTINGS = {
+    'path': os.environ.get('HABITS_DB', 'habits.db'),
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'cache_size': -8000,
+}
 
-today = datetime.now().date()
-start = today - timedelta(weeks=4)  # Default start date is 4 weeks ago for sample habits
+_local = threading.local()  # holds the connection of each thread
+_settings_version = 0  # bumped by configure_db so threads reopen their connection
 
 ###################
 #SQL´s as var
@@ -25,144 +44,1096 @@ ADD_HABIT = """
     VALUES (?, ?, ?)
 """
 
+# Used by generated datasets that choose the habit ids
+ADD_HABIT_WITH_ID = """
+    INSERT INTO habits (id, name, frequency, created_at)
+    VALUES (?, ?, ?, ?)
+"""
+
+# Used by imports, habits that already exist keep their frequency and creation date
+ADD_HABIT_IF_MISSING = """
+    INSERT OR IGNORE INTO habits (name, frequency, created_at)
+    VALUES (?, ?, ?)
+"""
+
 DELETE_HABIT = """
     DELETE FROM habits
     WHERE name = ?
 """
 
+# Completion dates are stored as day ordinals as returned by date.toordinal(), julianday('0001-01-01') is 1721425.5
+DAY_ORDINAL = "CAST(julianday({date}) - 1721424.5 AS INTEGER)"
+ORDINAL_DATE = "date({day} + 1721424.5)"
+
+# Period a completion counts for: the day ordinal for daily habits, the ISO week ordinal for weekly habits,
+# day ordinal 1 (0001-01-01) is a Monday, so (day - 1) / 7 numbers the ISO weeks
+COMPLETION_PERIOD = """
+    CASE {frequency}
+        WHEN 'weekly' THEN ({day} - 1) / 7
+        ELSE {day}
+    END
+"""
+
+# The unique (id, period) index allows one completion per habit and day or ISO week, a second completion
+# of the same period changes no row. WHERE true keeps ON CONFLICT from being read as a join constraint.
 ADD_COMPLETION = """
-    INSERT INTO completions (id, completed_at)
-    VALUES (
-        (SELECT id FROM habits WHERE name = ?), ?
+    INSERT INTO completions (id, day, period)
+    SELECT id, day, """ + COMPLETION_PERIOD.format(frequency="frequency", day="day") + """
+    FROM (
+        SELECT id, frequency, """ + DAY_ORDINAL.format(date="?2") + """ AS day
+        FROM habits
+        WHERE name = ?1
+    )
+    WHERE true
+    ON CONFLICT (id, period) DO NOTHING
+"""
+
+# Used by bulk inserts with resolved habit ids, completions already recorded for the period are skipped.
+# The period is derived from the stored frequency of the habit, like ADD_COMPLETION does.
+ADD_COMPLETION_BY_ID = """
+    INSERT OR IGNORE INTO completions (id, day, period)
+    SELECT id, day, """ + COMPLETION_PERIOD.format(frequency="frequency", day="day") + """
+    FROM (
+        SELECT id, frequency, """ + DAY_ORDINAL.format(date="?2") + """ AS day
+        FROM habits
+        WHERE id = ?1
     )
 """
 
+GET_HABIT_IDS = """
+    SELECT name, id, frequency
+    FROM habits
+"""
+
+GET_HABIT_ID = """
+    SELECT id, frequency
+    FROM habits
+    WHERE name = ?
+"""
+
 GET_HABITS = """
     SELECT
         h.name,
         h.frequency,
         h.created_at,
-        MAX(c.completed_at) AS last_completed_at
+        (SELECT """ + ORDINAL_DATE.format(day="MAX(c.day)") + """ FROM completions c WHERE c.id = h.id) AS last_completed_at
     FROM habits h
-    LEFT JOIN completions c ON c.id = h.id
-    GROUP BY h.name, h.frequency, h.created_at
+    ORDER BY h.name
 """
 
 GET_COMPLETIONS = """
-    SELECT completed_at
+    SELECT """ + ORDINAL_DATE.format(day="day") + """ AS completed_at
     FROM completions
     WHERE id = (
         SELECT id FROM habits WHERE name = ?
     )
+    ORDER BY day
+"""
+
+GET_HABITS_WITH_COMPLETIONS = """
+    SELECT
+        h.id,
+        h.name,
+        h.frequency,
+        h.created_at,
+        """ + ORDINAL_DATE.format(day="c.day") + """ AS completed_at
+    FROM habits h
+    LEFT JOIN completions c ON c.id = h.id
+    ORDER BY h.id, c.day
+"""
+
+GET_COMPLETION_DAY_ORDINALS = """
+    SELECT
+        h.id,
+        h.name,
+        h.frequency,
+        c.day AS day_ordinal
+    FROM habits h
+    LEFT JOIN completions c ON c.id = h.id
+    ORDER BY h.id, c.day
+"""
+
+GET_HABIT_COMPLETION_DAY_ORDINALS = """
+    SELECT
+        h.id,
+        h.name,
+        h.frequency,
+        c.day AS day_ordinal
+    FROM habits h
+    LEFT JOIN completions c ON c.id = h.id
+    WHERE h.id = ?
+    ORDER BY c.day
+"""
+
+# Columns of the in-memory HabitSet, habits and completions are read separately so no habit column repeats per row
+GET_HABIT_COLUMNS = """
+    SELECT id, name, frequency, """ + DAY_ORDINAL.format(date="created_at") + """ AS created_day
+    FROM habits
+    ORDER BY id
+"""
+
+GET_COMPLETION_DAYS = """
+    SELECT id, day
+    FROM completions
+    ORDER BY id, day
+"""
+
+# Full history for exports, in habit id and day order
+EXPORT_HABITS = """
+    SELECT name, frequency, created_at
+    FROM habits
+    ORDER BY id
+"""
+
+EXPORT_COMPLETIONS = """
+    SELECT h.name, """ + ORDINAL_DATE.format(day="c.day") + """
+    FROM completions c
+    JOIN habits h ON h.id = c.id
+    ORDER BY c.id, c.day
+"""
+
+# Lines of an import file already committed, to resume an interrupted import
+GET_IMPORT_CHECKPOINT = """
+    SELECT lines
+    FROM imports
+    WHERE source = ?1 AND size = ?2
+"""
+
+SET_IMPORT_CHECKPOINT = """
+    INSERT OR REPLACE INTO imports (source, size, lines)
+    VALUES (?1, ?2, ?3)
+"""
+
+DELETE_IMPORT_CHECKPOINT = """
+    DELETE FROM imports
+    WHERE source = ?
+"""
+
+# Habits and completion days of one id range (?1 to ?2) for the parallel streak report, ?3 filters the frequency
+GET_SHARD_HABITS = """
+    SELECT id, name, frequency, created_at
+    FROM habits
+    WHERE id BETWEEN ?1 AND ?2
+      AND (?3 IS NULL OR frequency = ?3)
+    ORDER BY id
+"""
+
+# Completion days of the habits of GET_SHARD_HABITS, the frequency filter runs before the completions are read
+GET_SHARD_COMPLETION_DAYS = """
+    SELECT h.id, c.day
+    FROM habits h
+    JOIN completions c ON c.id = h.id
+    WHERE h.id BETWEEN ?1 AND ?2
+      AND (?3 IS NULL OR h.frequency = ?3)
+    ORDER BY h.id, c.day
+"""
+
+# First id of every shard of ?1 habits, in id order
+GET_SHARD_START_IDS = """
+    SELECT id
+    FROM (
+        SELECT id, ROW_NUMBER() OVER (ORDER BY id) - 1 AS position
+        FROM habits
+        WHERE ?2 IS NULL OR frequency = ?2
+    )
+    WHERE position % ?1 = 0
+"""
+
+# Rollups: completions per habit and week (weeks start on Monday, week = (day - 1) / 7, the ISO weeks of
+# COMPLETION_PERIOD) with a bit per completed weekday (bit 0 Monday), and per habit and month (year * 12 + month - 1)
+ROLLUP_WEEK = "({day} - 1) / 7"
+ROLLUP_WEEKDAY_BIT = "(1 << (({day} - 1) % 7))"
+ROLLUP_MONTH = """(CAST(strftime('%Y', {day} + 1721424.5) AS INTEGER) * 12
+                   + CAST(strftime('%m', {day} + 1721424.5) AS INTEGER) - 1)"""
+
+# Day whose month a completion counts for: the day itself for daily habits, the Thursday of its ISO week for weekly
+# habits, so every ISO week belongs to exactly one month like it belongs to the ISO year of its Thursday
+ROLLUP_MONTH_DAY = "(CASE {frequency} WHEN 'weekly' THEN ({day} - 1) / 7 * 7 + 4 ELSE {day} END)"
+
+# Habits whose rollups are rebuilt, ? is a JSON array of habit ids
+ROLLUP_HABITS = "c.id IN (SELECT value FROM json_each(?))"
+
+# Weekday counts of a range of weeks, one column per weekday from Monday
+WEEKDAY_SUMS = ", ".join(f"SUM((weekdays >> {weekday}) & 1)" for weekday in range(7))
+
+# ?1 / ?2 first and last week, all habits or the habit ?3
+GET_WEEK_ROLLUPS = """
+    SELECT week, SUM(completions)
+    FROM completion_weeks
+    WHERE week BETWEEN ?1 AND ?2
+    GROUP BY week
+    ORDER BY week
+"""
+
+GET_HABIT_WEEK_ROLLUPS = """
+    SELECT week, completions
+    FROM completion_weeks
+    WHERE id = ?3 AND week BETWEEN ?1 AND ?2
+    ORDER BY week
+"""
+
+GET_WEEKDAY_ROLLUPS = """
+    SELECT week, """ + WEEKDAY_SUMS + """
+    FROM completion_weeks
+    WHERE week BETWEEN ?1 AND ?2
+    GROUP BY week
+    ORDER BY week
+"""
+
+GET_HABIT_WEEKDAY_ROLLUPS = """
+    SELECT week, """ + WEEKDAY_SUMS + """
+    FROM completion_weeks
+    WHERE id = ?3 AND week BETWEEN ?1 AND ?2
+    GROUP BY week
+    ORDER BY week
+"""
+
+# ?1 / ?2 first and last month, all habits or the habit ?3
+GET_MONTH_ROLLUPS = """
+    SELECT month, SUM(completions)
+    FROM completion_months
+    WHERE month BETWEEN ?1 AND ?2
+    GROUP BY month
+    ORDER BY month
+"""
+
+GET_HABIT_MONTH_ROLLUPS = """
+    SELECT month, completions
+    FROM completion_months
+    WHERE id = ?3 AND month BETWEEN ?1 AND ?2
+    ORDER BY month
+"""
+
+# Number of habits per creation day and frequency, to know how many completions were possible in a period
+GET_HABIT_CREATION_COUNTS = """
+    SELECT """ + DAY_ORDINAL.format(date="created_at") + """ AS created_day, frequency, COUNT(*)
+    FROM habits
+    GROUP BY created_day, frequency
+    ORDER BY created_day
+"""
+
+GET_HABIT_CREATION = """
+    SELECT id, """ + DAY_ORDINAL.format(date="created_at") + """, frequency
+    FROM habits
+    WHERE name = ?
+"""
+
+# Continues the stored run if the new completion is at most one period after the last one,
+# the same rule calculate_streak_days / calculate_streak_weeks apply to consecutive completions
+STREAK_CONTINUES = """
+    julianday(excluded.last_completed_at) - julianday(streaks.last_completed_at) <= (
+        SELECT CASE frequency WHEN 'weekly' THEN 7 ELSE 1 END FROM habits WHERE habits.id = streaks.id
+    )
+"""
+
+UPSERT_STREAK = """
+    INSERT INTO streaks (id, current_streak, longest_streak, last_completed_at, run_start)
+    SELECT id, 1, 1, ?2, ?2
+    FROM habits
+    WHERE name = ?1
+    ON CONFLICT (id) DO UPDATE SET
+        current_streak = CASE WHEN """ + STREAK_CONTINUES + """ THEN streaks.current_streak + 1 ELSE 1 END,
+        longest_streak = MAX(streaks.longest_streak,
+                             CASE WHEN """ + STREAK_CONTINUES + """ THEN streaks.current_streak + 1 ELSE 1 END),
+        run_start = CASE WHEN """ + STREAK_CONTINUES + """ THEN streaks.run_start ELSE excluded.run_start END,
+        last_completed_at = excluded.last_completed_at
+    WHERE streaks.last_completed_at IS NULL OR excluded.last_completed_at > streaks.last_completed_at
+"""
+
+GET_HABIT_STREAKS = """
+    SELECT
+        h.name,
+        h.frequency,
+        h.created_at,
+        s.last_completed_at,
+        COALESCE(s.current_streak, 0) AS current_streak,
+        COALESCE(s.longest_streak, 0) AS longest_streak
+    FROM habits h
+    LEFT JOIN streaks s ON s.id = h.id
+    ORDER BY h.name
+"""
+
+# Same rows filtered by frequency (?1, NULL for all habits), streamed in name order from the unique name index
+GET_HABIT_STREAKS_BY_FREQUENCY = """
+    SELECT
+        h.name,
+        h.frequency,
+        h.created_at,
+        s.last_completed_at,
+        COALESCE(s.current_streak, 0) AS current_streak,
+        COALESCE(s.longest_streak, 0) AS longest_streak
+    FROM habits h
+    LEFT JOIN streaks s ON s.id = h.id
+    WHERE ?1 IS NULL OR h.frequency = ?1
+    ORDER BY h.name
+"""
+
+GET_HABIT_ROW = """
+    SELECT
+        h.id,
+        h.name,
+        h.frequency,
+        h.created_at,
+        s.last_completed_at,
+        s.current_streak,
+        s.longest_streak
+    FROM habits h
+    JOIN streaks s ON s.id = h.id
+    WHERE h.name = ?
+"""
+
+GET_STREAK_STATES = """
+    SELECT id, current_streak, longest_streak, last_completed_at, run_start
+    FROM streaks
+"""
+
+GET_STREAK_STATE = """
+    SELECT id, current_streak, longest_streak, last_completed_at, run_start
+    FROM streaks
+    WHERE id = ?
+"""
+
+SET_STREAK_STATE = """
+    INSERT OR REPLACE INTO streaks (id, current_streak, longest_streak, last_completed_at, run_start)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# Sort keys of the habit table: (sort expression, tie breaker), each backed by an index
+HABIT_SORT_KEYS = {
+    'name': ("h.name", "h.id"),
+    'created_at': ("h.created_at", "h.id"),
+    'longest_streak': ("s.longest_streak", "s.id"),
+    'last_completion': ("COALESCE(s.last_completed_at, '')", "s.id"),
+}
+
+# Filters of the habit table, only the used ones are added so SQLite can pick the index of the filter.
+# The name prefix is a range on the name, :prefix_end is the prefix followed by the largest character.
+# {index} is '+' to keep SQLite from using the frequency indexes, see habit_filters.
+HABIT_FILTERS = {
+    'frequency': "{index}h.frequency = :frequency",
+    'prefix': "h.name >= :prefix AND h.name < :prefix_end",
+}
+
+COUNT_HABITS = """
+    SELECT COUNT(*)
+    FROM habits
+    WHERE (?1 IS NULL OR frequency = ?1)
+"""
+
+COUNT_HABIT_PAGE = """
+    SELECT COUNT(*)
+    FROM habits h
+    WHERE {filters}
+"""
+
+# :after_key / :after_id sort key and id of the last row of the previous page
+GET_HABIT_PAGE = """
+    SELECT
+        {sort_key} AS sort_key,
+        {tie_breaker} AS id,
+        h.name,
+        h.frequency,
+        h.created_at,
+        s.last_completed_at,
+        s.current_streak,
+        s.longest_streak
+    FROM habits h
+    JOIN streaks s ON s.id = h.id
+    WHERE {filters}
+      {keyset}
+    ORDER BY {sort_key} {direction}, {tie_breaker} {direction}
+    LIMIT :limit OFFSET :offset
+"""
+
+# The range on the sort key alone lets SQLite seek in the index, the row value breaks ties by id
+HABIT_PAGE_KEYSET = """
+      AND {sort_key} {operator}= :after_key
+      AND ({sort_key}, {tie_breaker}) {operator} (:after_key, :after_id)
 """
 
 GET_MAX_COMPLETION_DATE = """
-    SELECT MAX(completed_at)
+    SELECT """ + ORDINAL_DATE.format(day="MAX(day)") + """
     FROM completions
     WHERE id = (
         SELECT id FROM habits WHERE name = ?
     )
 """
 
-##########################################################################################################
-#start sample data construction
-##########################################################################################################
+###################
+#schema as var
+###################
+
+CREATE_HABITS_TABLE = """
+    CREATE TABLE IF NOT EXISTS habits (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE,
+        frequency TEXT,
+        created_at TEXT NOT NULL
+    )
 """
-Creates the sample habits starting 4 weeks ago.
 
-- used to populate the habits.db with sample data
+# Layout of unversioned files, MIGRATIONS upgrades it to the current layout
+CREATE_COMPLETIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS completions (
+        id INTEGER,
+        completed_at TEXT NOT NULL,
 
-habit_1 : random completion for the first 10 days only, daily frequency
-habit_2 : completion for all days, daily frequency
-habit_3 : random completion for all days, daily frequency
-habit_4 : random completion for each Monday, weekly frequency
-habit_5 : completion for each Monday, weekly frequency
+        FOREIGN KEY (id) REFERENCES habits (id) ON DELETE CASCADE
+    )
+"""
+
+CREATE_STREAKS_TABLE = """
+    CREATE TABLE IF NOT EXISTS streaks (
+        id INTEGER PRIMARY KEY,
+        current_streak INTEGER NOT NULL DEFAULT 0,
+        longest_streak INTEGER NOT NULL DEFAULT 0,
+        last_completed_at TEXT,
+        run_start TEXT,
 
+        FOREIGN KEY (id) REFERENCES habits (id) ON DELETE CASCADE
+    )
 """
-# List of sample habits for habits in habits.db
-single_habits = [
-    ['habit_1', 'daily', start.isoformat()],
-    ['habit_2', 'daily', start.isoformat()],
-    ['habit_3', 'daily', start.isoformat()],
-    ['habit_4', 'weekly', start.isoformat()],
-    ['habit_5', 'weekly', start.isoformat()],
+
+CREATE_COMPLETION_WEEKS_TABLE = """
+    CREATE TABLE IF NOT EXISTS completion_weeks (
+        id INTEGER NOT NULL,
+        week INTEGER NOT NULL,
+        completions INTEGER NOT NULL,
+        weekdays INTEGER NOT NULL,
+
+        PRIMARY KEY (id, week),
+        FOREIGN KEY (id) REFERENCES habits (id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+"""
+
+CREATE_COMPLETION_MONTHS_TABLE = """
+    CREATE TABLE IF NOT EXISTS completion_months (
+        id INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        completions INTEGER NOT NULL,
+
+        PRIMARY KEY (id, month),
+        FOREIGN KEY (id) REFERENCES habits (id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+"""
+
+# A row in bulk_load turns the rollup triggers off for the write transaction that holds it, see bulk_load()
+CREATE_BULK_LOAD_TABLE = """
+    CREATE TABLE IF NOT EXISTS bulk_load (
+        id INTEGER PRIMARY KEY
+    )
+"""
+
+# Every written or deleted completion updates the rollups in the same transaction, bulk writes rebuild them instead
+ROLLUP_MONTH_OF_NEW = ROLLUP_MONTH.format(day=ROLLUP_MONTH_DAY.format(frequency="frequency", day="new.day"))
+ROLLUP_MONTH_OF_OLD = ROLLUP_MONTH.format(day=ROLLUP_MONTH_DAY.format(
+    frequency="(SELECT frequency FROM habits WHERE id = old.id)", day="old.day"))
+
+CREATE_ROLLUP_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS add_completion_rollups AFTER INSERT ON completions
+       WHEN NOT EXISTS (SELECT 1 FROM bulk_load)
+       BEGIN
+           INSERT INTO completion_weeks (id, week, completions, weekdays)
+           VALUES (new.id, """ + ROLLUP_WEEK.format(day="new.day") + """, 1, """ + ROLLUP_WEEKDAY_BIT.format(day="new.day") + """)
+           ON CONFLICT (id, week) DO UPDATE SET
+               completions = completions + 1,
+               weekdays = weekdays | excluded.weekdays;
+           INSERT INTO completion_months (id, month, completions)
+           SELECT new.id, """ + ROLLUP_MONTH_OF_NEW + """, 1
+           FROM habits
+           WHERE id = new.id
+           ON CONFLICT (id, month) DO UPDATE SET completions = completions + 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS delete_completion_rollups AFTER DELETE ON completions
+       WHEN NOT EXISTS (SELECT 1 FROM bulk_load)
+       BEGIN
+           UPDATE completion_weeks
+           SET completions = completions - 1,
+               weekdays = weekdays & ~""" + ROLLUP_WEEKDAY_BIT.format(day="old.day") + """
+           WHERE id = old.id AND week = """ + ROLLUP_WEEK.format(day="old.day") + """;
+           DELETE FROM completion_weeks
+           WHERE id = old.id AND week = """ + ROLLUP_WEEK.format(day="old.day") + """ AND completions <= 0;
+           UPDATE completion_months
+           SET completions = completions - 1
+           WHERE id = old.id AND month = """ + ROLLUP_MONTH_OF_OLD + """;
+           DELETE FROM completion_months
+           WHERE id = old.id AND month = """ + ROLLUP_MONTH_OF_OLD + """ AND completions <= 0;
+       END""",
 ]
 
-# Generate completion records for completions in habits.db
-completion_samples = []
-for i in range((today - start).days):
-    completion_date = start + timedelta(days=i)
-    week_num = completion_date.isocalendar()[1]
+# Bulk rebuild of the rollups, {habits} is 'true' for all habits or ROLLUP_HABITS
+REBUILD_WEEK_ROLLUPS = """
+    INSERT INTO completion_weeks (id, week, completions, weekdays)
+    SELECT c.id, """ + ROLLUP_WEEK.format(day="c.day") + """ AS week, COUNT(*), SUM(""" + ROLLUP_WEEKDAY_BIT.format(day="c.day") + """)
+    FROM completions c
+    WHERE {habits}
+    GROUP BY c.id, week
+"""
+
+REBUILD_MONTH_ROLLUPS = """
+    INSERT INTO completion_months (id, month, completions)
+    SELECT c.id, """ + ROLLUP_MONTH.format(day=ROLLUP_MONTH_DAY.format(frequency="h.frequency", day="c.day")) + """ AS month,
+           COUNT(*)
+    FROM completions c
+    JOIN habits h ON h.id = c.id
+    WHERE {habits}
+    GROUP BY c.id, month
+"""
+
+"""
+Schema upgrades, keyed by the version they lead to.
+
+- the version of a database file is stored in `PRAGMA user_version`, files created before versioning are version 0
+- every upgrade runs in its own transaction, so an interrupted upgrade leaves the file at the previous version
+
+version 1 : `period` column with one completion per habit and period, composite (id, completed_at) index
+version 2 : `streaks` table holding the current run, longest run, last completion and run start per habit
+version 3 : a `streaks` row for every habit, kept by a trigger, and indexes for sorting the habit table by streak
+version 4 : completion dates and periods stored as integer day / ISO week ordinals instead of ISO text
+version 5 : `imports` table with the progress of unfinished imports
+version 6 : indexes for filtering the habit table by frequency and sorting it by name or creation date
+version 7 : `completion_weeks` and `completion_months` rollups kept by triggers
+version 8 : `bulk_load` flag that turns the rollup triggers off, weekly completions count for the month of
+            the Thursday of their ISO week
+
+an upgrade step is either a SQL statement or a function called with the connection
+"""
+MIGRATIONS = {
+    1: [
+        "ALTER TABLE completions ADD COLUMN period TEXT",
+        """UPDATE completions
+           SET period = (SELECT CASE h.frequency
+                                    WHEN 'weekly' THEN date(completions.completed_at, 'weekday 0', '-6 days')
+                                    ELSE date(completions.completed_at)
+                                END
+                         FROM habits h WHERE h.id = completions.id)""",
+        # keep the first completion of every habit and period
+        """DELETE FROM completions
+           WHERE rowid NOT IN (SELECT MIN(rowid) FROM completions GROUP BY id, period)""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_completions_period ON completions (id, period)",
+        "CREATE INDEX IF NOT EXISTS idx_completions_habit_date ON completions (id, completed_at)",
+    ],
+    2: [
+        CREATE_STREAKS_TABLE,
+    ],
+    3: [
+        # recreated, the version 2 table had no row for habits without completions
+        "DROP TABLE IF EXISTS streaks",
+        CREATE_STREAKS_TABLE,
+        """CREATE TRIGGER IF NOT EXISTS add_habit_streak AFTER INSERT ON habits
+           BEGIN
+               INSERT INTO streaks (id) VALUES (new.id);
+           END""",
+        "CREATE INDEX IF NOT EXISTS idx_streaks_longest ON streaks (longest_streak)",
+        "CREATE INDEX IF NOT EXISTS idx_streaks_last_completion ON streaks (COALESCE(last_completed_at, ''))",
+    ],
+    4: [
+        """CREATE TABLE completions_v4 (
+               id INTEGER,
+               day INTEGER NOT NULL,
+               period INTEGER NOT NULL,
+
+               FOREIGN KEY (id) REFERENCES habits (id) ON DELETE CASCADE
+           )""",
+        # rows without a valid date never counted for a period or a streak
+        """INSERT OR IGNORE INTO completions_v4 (id, day, period)
+           SELECT id, day, """ + COMPLETION_PERIOD.format(frequency="frequency", day="day") + """
+           FROM (
+               SELECT c.id, h.frequency, """ + DAY_ORDINAL.format(date="c.completed_at") + """ AS day
+               FROM completions c
+               JOIN habits h ON h.id = c.id
+           )
+           WHERE day IS NOT NULL
+           ORDER BY id, day""",
+        "DROP TABLE completions",
+        "ALTER TABLE completions_v4 RENAME TO completions",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_completions_period ON completions (id, period)",
+        "CREATE INDEX IF NOT EXISTS idx_completions_habit_day ON completions (id, day)",
+        lambda connection: rebuild_streaks(connection),
+    ],
+    5: [
+        """CREATE TABLE IF NOT EXISTS imports (
+               source TEXT PRIMARY KEY,
+               size INTEGER NOT NULL,
+               lines INTEGER NOT NULL
+           )""",
+    ],
+    6: [
+        # frequency filters with name search or name order, and sorting by creation date
+        "CREATE INDEX IF NOT EXISTS idx_habits_frequency_name ON habits (frequency, name)",
+        "CREATE INDEX IF NOT EXISTS idx_habits_frequency_created ON habits (frequency, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_habits_created ON habits (created_at)",
+    ],
+    7: [
+        CREATE_COMPLETION_WEEKS_TABLE,
+        CREATE_COMPLETION_MONTHS_TABLE,
+        # ranges over all habits read the periods in order without touching every habit
+        "CREATE INDEX IF NOT EXISTS idx_completion_weeks_week ON completion_weeks (week, completions, weekdays)",
+        "CREATE INDEX IF NOT EXISTS idx_completion_months_month ON completion_months (month, completions)",
+        *CREATE_ROLLUP_TRIGGERS,
+        lambda connection: rebuild_rollups(connection),
+    ],
+    8: [
+        # bulk writes turn the triggers off, the ISO weeks of weekly habits count for the month of their Thursday
+        CREATE_BULK_LOAD_TABLE,
+        "DROP TRIGGER IF EXISTS add_completion_rollups",
+        "DROP TRIGGER IF EXISTS delete_completion_rollups",
+        *CREATE_ROLLUP_TRIGGERS,
+        lambda connection: rebuild_rollups(connection),
+    ],
+}
+
+SCHEMA_VERSION = max(MIGRATIONS)
+
+def build_sample_data(today=None):
+    """
+    Creates the sample habits starting 4 weeks ago.
+
+    - used to populate the habits.db with sample data, only called when sample data is requested
+
+    habit_1 : random completion for the first 10 days only, daily frequency
+    habit_2 : completion for all days, daily frequency
+    habit_3 : random completion for all days, daily frequency
+    habit_4 : random completion for each Monday, weekly frequency
+    habit_5 : completion for each Monday, weekly frequency
+
+    Args:
+        today (date): The reference date, defaults to the current date.
+
+    Returns:
+        tuple: The sample habits as [name, frequency, created_at] and the completions as [name, completed_at].
+    """
+    today = today or datetime.now().date()
+    start = today - timedelta(weeks=4)  # Default start date is 4 weeks ago for sample habits
+
+    # List of sample habits for habits in habits.db
+    single_habits = [
+        ['habit_1', 'daily', start.isoformat()],
+        ['habit_2', 'daily', start.isoformat()],
+        ['habit_3', 'daily', start.isoformat()],
+        ['habit_4', 'weekly', start.isoformat()],
+        ['habit_5', 'weekly', start.isoformat()],
+    ]
+
+    # Generate completion records for completions in habits.db
+    completion_samples = []
+    for i in range((today - start).days):
+        completion_date = start + timedelta(days=i)
+
+        if random.choice([True, False]) and i < 10:
+            completion_samples.append(['habit_1', completion_date.isoformat()])
+        completion_samples.append(['habit_2', completion_date.isoformat()])
+        if random.choice([True, False]):
+            completion_samples.append(['habit_3', completion_date.isoformat()])
+        if completion_date.weekday() == 0 and random.choice([True, False]):
+            completion_samples.append(['habit_4', completion_date.isoformat()])
+        if completion_date.weekday() == 0:
+            completion_samples.append(['habit_5', completion_date.isoformat()])
+
+    return single_habits, completion_samples
+
+
+def configure_db(**settings):
+    """
+    Changes the connection settings, connections opened afterwards use the new settings.
+
+    Every thread reopens its connection on the next call of get_connection.
+
+    Args:
+        **settings: Values for the keys of DB_SETTINGS.
+    """
+    global _settings_version
+
+    unknown = set(settings) - set(DB_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown database settings: {', '.join(sorted(unknown))}")
+
+    DB_SETTINGS.update(settings)
+    _settings_version += 1
+    close_connection()
+
+
+def connect(path=None, read_only=False):
+    """
+    Opens a new connection with foreign keys enabled and the pragmas from DB_SETTINGS applied.
+
+    Statements on the connection are recorded by query_stats while the instrumentation is enabled.
+
+    Args:
+        path (str): The database file, defaults to DB_SETTINGS['path'].
+        read_only (bool): Open an existing file for reading only, e.g. for report workers.
+
+    Returns:
+        sqlite3.Connection: The new connection.
+    """
+    path = path or DB_SETTINGS['path']
+    if read_only:
+        path = f"file:{quote(os.path.abspath(path))}?mode=ro"
+    connection = sqlite3.connect(path, timeout=DB_SETTINGS['busy_timeout'] / 1000, uri=read_only,
+                                 factory=InstrumentedConnection)
+    connection.execute("PRAGMA foreign_keys = ON")  # enable foreign key constraints
+    connection.execute(f"PRAGMA busy_timeout = {int(DB_SETTINGS['busy_timeout'])}")
+    connection.execute(f"PRAGMA cache_size = {int(DB_SETTINGS['cache_size'])}")
+    if read_only:
+        # the journal mode belongs to the file and cannot be changed without writing
+        connection.execute("PRAGMA query_only = ON")
+        return connection
+    for pragma in ('journal_mode', 'synchronous'):
+        value = str(DB_SETTINGS[pragma])
+        if not value.isalpha():
+            raise ValueError(f"Invalid value for {pragma}: {value}")
+        connection.execute(f"PRAGMA {pragma} = {value}")
+    return connection
+
+
+def get_connection():
+    """
+    Returns the connection of the calling thread, opening it on first use.
+
+    Every thread gets its own connection, so worker threads can read and write while the interface
+    keeps its own connection. Note that a ':memory:' path gives every thread its own separate database.
+
+    Returns:
+        sqlite3.Connection: The connection of the calling thread.
+    """
+    connection = getattr(_local, 'connection', None)
+    if connection is not None and _local.settings_version != _settings_version:
+        close_connection()
+        connection = None
+
+    if connection is None:
+        connection = connect()
+        _local.connection = connection
+        _local.settings_version = _settings_version
+    return connection
+
+
+def close_connection():
+    """
+    Closes the connection of the calling thread if it has one.
+    """
+    connection = getattr(_local, 'connection', None)
+    if connection is not None:
+        connection.close()
+        _local.connection = None
+
+
+@contextmanager
+def transaction():
+    """
+    Groups all statements executed inside the block into one transaction (unit of work).
+
+    The outermost block commits when it ends and rolls back if an exception is raised, nested blocks
+    join the outermost one. Habit methods and execute_query called inside the block do not commit.
+
+    Yields:
+        sqlite3.Connection: The connection of the calling thread.
+    """
+    connection = get_connection()
+    depth = getattr(_local, 'transaction_depth', 0)
+    _local.transaction_depth = depth + 1
+    try:
+        yield connection
+        if depth == 0:
+            connection.commit()
+    except BaseException:
+        if depth == 0:
+            connection.rollback()
+        raise
+    finally:
+        _local.transaction_depth = depth
+
+
+def in_transaction():
+    """
+    Tells whether the calling thread is inside a transaction block.
+
+    Returns:
+        bool: True inside a `with transaction():` block.
+    """
+    return getattr(_local, 'transaction_depth', 0) > 0
+
+
+def habit_filters(frequency=False, prefix=False, frequency_index=True):
+    """
+    Builds the WHERE condition of the habit table from the used filters.
+
+    Args:
+        frequency (bool): Filter by :frequency.
+        prefix (bool): Filter by the name range :prefix / :prefix_end.
+        frequency_index (bool): Let SQLite read the frequency through its index. Sorting by a streak column
+                                walks the streak index instead and skips other frequencies, about every
+                                second habit, so a page stops after its LIMIT rows instead of sorting all habits.
+
+    Returns:
+        str: The condition, 'true' without filters.
+    """
+    used = [HABIT_FILTERS[name] for name, active in (('frequency', frequency), ('prefix', prefix)) if active]
+    return " AND ".join(used).format(index='' if frequency_index else '+') or "true"
+
+
+def habit_page_query(sort_by='name', descending=False, keyset=False, frequency=False, prefix=False):
+    """
+    Builds the query for one page of the habit table sorted in the database.
+
+    Args:
+        sort_by (str): A key of HABIT_SORT_KEYS.
+        descending (bool): Sort in descending order.
+        keyset (bool): Continue after :after_key / :after_id instead of starting at the beginning.
+        frequency (bool): Only habits of the frequency :frequency.
+        prefix (bool): Only habits whose name starts with :prefix.
+
+    Returns:
+        str: The query with named parameters, always :limit and :offset.
+    """
+    if sort_by not in HABIT_SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {sort_by}")
+
+    sort_key, tie_breaker = HABIT_SORT_KEYS[sort_by]
+    query_keyset = HABIT_PAGE_KEYSET.format(sort_key=sort_key, tie_breaker=tie_breaker,
+                                            operator='<' if descending else '>') if keyset else ""
+    return GET_HABIT_PAGE.format(sort_key=sort_key, tie_breaker=tie_breaker, keyset=query_keyset,
+                                 filters=habit_filters(frequency, prefix, frequency_index=tie_breaker == "h.id"),
+                                 direction='DESC' if descending else 'ASC')
+
+
+def habit_count_query(frequency=False, prefix=False):
+    """
+    Builds the query counting the habits that match the used filters, see habit_filters.
 
-    if random.choice([True, False]) and i < 10:
-        completion_samples.append(['habit_1', completion_date.isoformat()])
-    completion_samples.append(['habit_2', completion_date.isoformat()])
-    if random.choice([True, False]):
-        completion_samples.append(['habit_3', completion_date.isoformat()])
-    if completion_date.weekday() == 0 and random.choice([True, False]):
-        completion_samples.append(['habit_4', completion_date.isoformat()])
-    if completion_date.weekday() == 0:
-        completion_samples.append(['habit_5', completion_date.isoformat()])
+    Returns:
+        str: The query with named parameters.
+    """
+    return COUNT_HABIT_PAGE.format(filters=habit_filters(frequency, prefix))
+
+
+def migrate_db(connection):
+    """
+    Upgrades the schema of a database in place to SCHEMA_VERSION.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the database to upgrade.
+
+    Returns:
+        int: The schema version the database had before the upgrade.
+    """
+    connection.commit()
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
 
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        connection.execute("BEGIN")
+        try:
+            for statement in MIGRATIONS[target]:
+                if callable(statement):
+                    statement(connection)
+                else:
+                    connection.execute(statement)
+            connection.execute(f"PRAGMA user_version = {target}")
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        connection.commit()
 
-##########################################################################################################
-#end sample data construction
-##########################################################################################################
+    return version
 
 
-def create_and_populate_db():
+def create_schema(connection):
+    """
+    Creates the `habits` and `completions` tables if they do not exist and upgrades them to SCHEMA_VERSION.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the database.
+    """
+    connection.execute(CREATE_HABITS_TABLE)
+    connection.execute(CREATE_COMPLETIONS_TABLE)
+    connection.commit()
+    migrate_db(connection)
+
+
+def create_and_populate_db(sample_data=True):
     """
     Creates the habits database and populates it with sample data, if it already exits it just connects
      - creates `habits` and `completions`
+     - upgrades existing database files to the current schema version
+
+    Nothing is opened or generated before this is called, importing the modules does no I/O.
+
+    Args:
+        sample_data (bool): Populate an empty database with the sample habits.
     """
-    cursor = conn.cursor()
+    create_schema(get_connection())
+    if not sample_data:
+        return
 
-    # Create the `habits` table
-    cursor.execute('''CREATE TABLE IF NOT EXISTS habits (
-                        id INTEGER PRIMARY KEY,
-                        name TEXT UNIQUE,
-                        frequency TEXT,
-                        created_at TEXT NOT NULL)''')
+    with transaction() as conn:
+        # Check if the `habits` table is empty
+        if conn.execute("SELECT COUNT(*) FROM habits").fetchone()[0] == 0:
+            single_habits, completion_samples = build_sample_data()
 
-    # Create the `completions` table
-    cursor.execute('''CREATE TABLE IF NOT EXISTS completions (
-                        id INTEGER,
-                        completed_at TEXT NOT NULL,
+            # Populate `habits` table
+            conn.executemany(ADD_HABIT, single_habits)
 
-                        FOREIGN KEY (id) REFERENCES habits (id) ON DELETE CASCADE)''')
+            # Populate `completions` table
+            conn.executemany(ADD_COMPLETION, completion_samples)
 
-    conn.commit()
+            # Populate `streaks` table
+            rebuild_streaks(conn)
 
-    # Check if the `habits` table is empty
-    cursor.execute("SELECT COUNT(*) FROM habits")
-    if cursor.fetchone()[0] == 0:
-        # Populate `habits` table
-        cursor.executemany("INSERT INTO habits (name, frequency, created_at) VALUES (?, ?, ?)", single_habits)
 
-        # Populate `completions` table
-        cursor.executemany("""INSERT INTO completions (id, completed_at)
-                              VALUES ((SELECT id FROM habits WHERE name = ?), ?)""",
-                           completion_samples)
-        conn.commit()
+def iter_habits_with_completions(connection):
+    """
+    Streams all habits together with their ordered completion history from a single query.
+
+    Args:
+        connection (sqlite3.Connection): The connection to read from.
+
+    Yields:
+        tuple: (id, name, frequency, created_at, last_completed_at, completions) where completions is a
+               list of tuples containing a single completion date, ordered by date.
+    """
+    cursor = connection.cursor()
+    cursor.execute(GET_HABITS_WITH_COMPLETIONS)
+    for habit_id, rows in groupby(cursor, key=lambda row: row[0]):
+        rows = list(rows)
+        _, name, frequency, created_at, _ = rows[0]
+        completions = [(row[4],) for row in rows if row[4] is not None]
+        last_at = completions[-1][0] if completions else None
+        yield habit_id, name, frequency, created_at, last_at, completions
+    cursor.close()
+
+
+def rebuild_streaks(connection, check_only=False, habit_ids=None):
+    """
+    Recomputes the `streaks` table from the completion day ordinals with calculate_streak_ordinals.
+
+    Without habit_ids every habit is recomputed from one scan of all completions, with habit_ids only the
+    completions of these habits are read, e.g. after a few habits were backfilled.
+    The caller is responsible for committing the rebuild.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the database.
+        check_only (bool): Only report drifted habits without rewriting the stored streaks.
+        habit_ids (iterable): Only recompute these habits, all habits if None.
+
+    Returns:
+        list: Names of the habits whose stored streak state differed from the recomputed one.
+    """
+    if habit_ids is None:
+        stored = {row[0]: row[1:] for row in connection.execute(GET_STREAK_STATES)}
+        habits = groupby(connection.execute(GET_COMPLETION_DAY_ORDINALS), key=lambda row: row[0])
+    else:
+        habit_ids = sorted(set(habit_ids))
+        stored = {row[0]: row[1:] for habit_id in habit_ids
+                  for row in connection.execute(GET_STREAK_STATE, (habit_id,))}
+        habits = ((habit_id, connection.execute(GET_HABIT_COMPLETION_DAY_ORDINALS, (habit_id,)))
+                  for habit_id in habit_ids)
+    expected = []
+    drifted = []
+
+    for habit_id, rows in habits:
+        rows = list(rows)
+        if not rows:
+            continue
+        name, frequency = rows[0][1:3]
+        days = [row[3] for row in rows if row[3] is not None]
+        if days:
+            current_streak, longest_streak = calculate_streak_ordinals(days, 7 if frequency == 'weekly' else 1)
+            state = (current_streak, longest_streak, date.fromordinal(days[-1]).isoformat(),
+                     date.fromordinal(days[-current_streak]).isoformat())
+        else:
+            state = (0, 0, None, None)
+        expected.append((habit_id,) + state)
+
+        if stored.get(habit_id) != state:
+            drifted.append(name)
+
+    if not check_only:
+        if habit_ids is None:
+            connection.execute("DELETE FROM streaks")
+        connection.executemany(SET_STREAK_STATE, expected)
+
+    return drifted
+
+
+def rebuild_rollups(connection, habit_ids=None):
+    """
+    Recomputes the `completion_weeks` and `completion_months` rollups with one GROUP BY over the completions.
+
+    The triggers keep the rollups up to date on single writes, bulk writes turn them off with bulk_load and
+    rebuild the rollups of the written habits. The caller is responsible for committing the rebuild.
+
+    Args:
+        connection (sqlite3.Connection): The connection to the database.
+        habit_ids (iterable): Only recompute these habits, all habits if None.
+    """
+    if habit_ids is None:
+        connection.execute("DELETE FROM completion_weeks")
+        connection.execute("DELETE FROM completion_months")
+        connection.execute(REBUILD_WEEK_ROLLUPS.format(habits="true"))
+        connection.execute(REBUILD_MONTH_ROLLUPS.format(habits="true"))
+        return
+
+    params = (json.dumps(sorted(set(habit_ids))),)
+    connection.execute("DELETE FROM completion_weeks AS c WHERE " + ROLLUP_HABITS, params)
+    connection.execute("DELETE FROM completion_months AS c WHERE " + ROLLUP_HABITS, params)
+    connection.execute(REBUILD_WEEK_ROLLUPS.format(habits=ROLLUP_HABITS), params)
+    connection.execute(REBUILD_MONTH_ROLLUPS.format(habits=ROLLUP_HABITS), params)
+
+
+@contextmanager
+def bulk_load(connection):
+    """
+    Turns the rollup triggers off while completions are written in bulk, the writer rebuilds the rollups of
+    the written habits with rebuild_rollups before it commits.
+
+    The flag is a row of `bulk_load` that is removed again before the transaction ends, so it is never committed
+    and other connections keep their triggers: they cannot write while the transaction is open.
+
+    Args:
+        connection (sqlite3.Connection): The connection of the open write transaction.
+    """
+    connection.execute("INSERT OR IGNORE INTO bulk_load (id) VALUES (1)")
+    try:
+        yield connection
+    finally:
+        connection.execute("DELETE FROM bulk_load")
 
 
 def execute_query(query, params=(), fetch=False):
     """
     Executes a SQL query with optional parameters.
 
+    Writes are committed right away unless a transaction block is open, reads never commit.
+
     Args:
         query (str): The SQL query to execute.
         params (tuple): Parameters to bind to the query.
         fetch (bool): Whether to fetch results.
 
     Returns:
-        list or None: Query results if fetch=True, else None.
+        list: Query results if fetch=True, else an empty list.
     """
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(query, params)
-    conn.commit()
-    if fetch:
-        return cursor.fetchall()
-    else:
-        return []
-    cursor.close()
\ No newline at end of file
+    rows = cursor.fetchall() if fetch else []
+    cursor.close()
+
+    if conn.in_transaction and not in_transaction():
+        conn.commit()
+    return rows
+
+
+def execute_many(query, rows):
+    """
+    Executes a SQL statement once for every parameter tuple in a single transaction.
+
+    Args:
+        query (str): The SQL statement to execute.
+        rows (iterable): Parameter tuples to bind to the statement.
+
+    Returns:
+        int: Number of changed rows.
+    """
+    with transaction() as conn:
+        return conn.executemany(query, rows).rowcount
\ No newline at end of file
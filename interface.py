@@ -1,8 +1,26 @@
+import queue
 import tkinter as tk
-from datetime import timedelta, datetime
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox
-from streak_calculation import calculate_streak_days, calculate_streak_weeks
-from classes import Habit, Tracker
+from classes import Habit, HabitPager, Tracker
+from database_and_sql import transaction
+
+# Milliseconds between checks for finished background refreshes
+REFRESH_POLL_MS = 50
+
+# Virtual habit list: only the visible rows exist in the Treeview, pages of rows are read from the database
+PAGE_SIZE = 100
+ROW_HEIGHT = 20  # pixels per Treeview row
+HEADING_HEIGHT = 25  # pixels of the Treeview headings
+SCROLL_UNITS = 3  # rows per mouse wheel step
+
+# Treeview columns that can be sorted, mapped to the sort keys of HabitPager
+SORTABLE_COLUMNS = {
+    "tracked_since": "created_at",
+    "name": "name",
+    "longest_streak": "longest_streak",
+    "last_completion": "last_completion",
+}
 
 
 
@@ -22,6 +40,22 @@ class HabitTrackerApp:
         self.root.title("Habit Tracker")
         self.root.geometry("1200x600")  # Adjust window size for better layout
 
+        # Background refreshes: one worker thread with its own database connection
+        self.refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="habit-refresh")
+        self.refresh_results = queue.Queue()
+        self.refresh_generation = 0  # increased by every refresh request, older results are stale
+        self.refresh_running = False
+        self.pending_refresh = None  # latest request that arrived while a refresh was running
+
+        # Virtual habit list state
+        self.pager = None  # HabitPager of the shown habits, owned by the Tk event loop once loaded
+        self.total_rows = 0
+        self.first_row = 0  # position of the first visible row
+        self.visible_rows = 10
+        self.frequency = None
+        self.prefix = ""  # only habits whose name starts with the search text
+        self.sort_by = "name"
+        self.descending = False
 
         self.create_widgets()
 
@@ -41,10 +75,20 @@ class HabitTrackerApp:
         tk.Button(self.top_frame, text="Daily habits", width=15, command=self.show_daily_habits).pack(side=tk.LEFT,padx=5)
         tk.Button(self.top_frame, text="Weekly habits", width=15, command=self.show_weekly_habits).pack(side=tk.LEFT,padx=5)
 
+        # search by the start of the name
+        tk.Label(self.top_frame, text="Search:").pack(side=tk.LEFT, padx=(20, 5))
+        self.search_var = tk.StringVar(self.top_frame)
+        self.search_var.trace_add("write", lambda *_: self.search_habits(self.search_var.get()))
+        tk.Entry(self.top_frame, textvariable=self.search_var, width=20).pack(side=tk.LEFT, padx=5)
+
 
         # Quit
         tk.Button(self.top_frame, text="Quit Tracker", width=15, command=self.root.quit).pack(side=tk.RIGHT, padx=10)
 
+        # Loading indicator for background refreshes
+        self.status_label = tk.Label(self.top_frame, text="", width=15)
+        self.status_label.pack(side=tk.RIGHT, padx=10)
+
         # Center Frame for Treeview and Buttons
         self.center_frame = tk.Frame(self.root)
         self.center_frame.pack(fill=tk.BOTH, expand=True, pady=20, padx=20)
@@ -55,8 +99,18 @@ class HabitTrackerApp:
 
         columns = (
         "tracked_since", "name", "frequency", "current_streak", "longest_streak", "last_completion", "habit_state")
-        self.habit_tree = ttk.Treeview(self.table_frame, columns=columns, show="headings", height=10)
-        self.habit_tree.pack(fill=tk.BOTH, expand=True)
+        ttk.Style().configure("Treeview", rowheight=ROW_HEIGHT)
+        self.habit_tree = ttk.Treeview(self.table_frame, columns=columns, show="headings", height=self.visible_rows)
+
+        # The scrollbar moves the window of rows over the whole habit list, not the Treeview itself
+        self.scrollbar = ttk.Scrollbar(self.table_frame, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.habit_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.habit_tree.bind("<Configure>", self.on_resize)
+        self.habit_tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.habit_tree.bind("<Button-4>", self.on_mousewheel)
+        self.habit_tree.bind("<Button-5>", self.on_mousewheel)
 
         # Define headings for the table
         self.habit_tree.heading("tracked_since", text="Tracked Since")
@@ -67,6 +121,10 @@ class HabitTrackerApp:
         self.habit_tree.heading("last_completion", text="Last Completion")
         self.habit_tree.heading("habit_state", text="State of Habit")
 
+        # Sort by clicking a heading, the sorting is done by the database
+        for column, sort_by in SORTABLE_COLUMNS.items():
+            self.habit_tree.heading(column, command=lambda sort_by=sort_by: self.sort_habits(sort_by))
+
         # Define column widths
         self.habit_tree.column("tracked_since", width=100, anchor='center')
         self.habit_tree.column("name", width=150, anchor='center')
@@ -84,67 +142,250 @@ class HabitTrackerApp:
         tk.Button(self.button_frame, text="Add new habit", width=15, command=self.add_habit).pack(pady=10)
         tk.Button(self.button_frame, text="Delete habit", width=15, command=self.delete_habit).pack(pady=10)
 
-    def load_habits(self):
+    def load_habits(self, frequency=None):
+        """
+        Requests a refresh of the Treeview. The visible habits are loaded from the HabitTracker on a worker thread,
+        then the Treeview is populated with the habit details on the Tk event loop.
+
+        Requests that arrive while a refresh is running are coalesced, only the latest one is loaded and
+        results of superseded requests are discarded.
+
+        Args:
+            frequency (str): Only show habits of this frequency ("daily" or "weekly"), all habits if None.
+        """
+        if frequency != self.frequency:
+            self.first_row = 0
+        self.frequency = frequency
+        self.refresh_generation += 1
+        self.status_label.config(text="Loading...")
+
+        request = (self.refresh_generation, frequency, self.sort_by, self.descending, self.first_row, self.prefix)
+        if self.refresh_running:
+            self.pending_refresh = request
+        else:
+            self.start_refresh(*request)
+
+    def start_refresh(self, generation, frequency, sort_by, descending, first_row, prefix):
+        """
+        Submits a refresh to the worker thread and starts polling for its result.
+
+        Args:
+            generation (int): The refresh request the result belongs to.
+            frequency (str): The frequency filter of the request.
+            sort_by (str): The sort key of the request.
+            descending (bool): The sort direction of the request.
+            first_row (int): Position of the first visible row.
+            prefix (str): The name search of the request.
+        """
+        self.refresh_running = True
+        self.refresh_executor.submit(self.fetch_habit_rows, generation, frequency, sort_by, descending, first_row,
+                                     prefix)
+        self.root.after(REFRESH_POLL_MS, self.poll_refresh)
+
+    def fetch_habit_rows(self, generation, frequency, sort_by, descending, first_row, prefix):
+        """
+        Loads the visible habit rows on the worker thread and hands them to the Tk event loop.
+        Runs no Tk calls, the worker uses its own database connection.
+
+        Args:
+            generation (int): The refresh request the result belongs to.
+            frequency (str): Only load habits of this frequency, all habits if None.
+            sort_by (str): The sort key.
+            descending (bool): Sort in descending order.
+            first_row (int): Position of the first visible row.
+            prefix (str): Only load habits whose name starts with this text.
+        """
+        try:
+            if generation != self.refresh_generation:
+                result = None  # superseded before it started
+            else:
+                pager = HabitPager(frequency, sort_by, descending, page_size=PAGE_SIZE, prefix=prefix)
+                total_rows = pager.count()
+                first_row = max(min(first_row, total_rows - self.visible_rows), 0)
+                rows = pager.get_rows(first_row, first_row + self.visible_rows)
+                result = (pager, total_rows, first_row, rows)
+            self.refresh_results.put((generation, result, None))
+        except Exception as error:
+            self.refresh_results.put((generation, None, error))
+
+    def poll_refresh(self):
+        """
+        Shows the result of a finished refresh and starts the pending one, polls again while a refresh runs.
+        """
+        try:
+            generation, result, error = self.refresh_results.get_nowait()
+        except queue.Empty:
+            self.root.after(REFRESH_POLL_MS, self.poll_refresh)
+            return
+
+        self.refresh_running = False
+        if self.pending_refresh:
+            pending, self.pending_refresh = self.pending_refresh, None
+            self.start_refresh(*pending)
+
+        if generation != self.refresh_generation:
+            return
+        self.status_label.config(text="")
+        if error:
+            messagebox.showerror("Error", f"Could not load habits: {error}")
+        else:
+            self.pager, self.total_rows, self.first_row, rows = result
+            if len(rows) < min(self.visible_rows, self.total_rows):
+                # the Treeview grew while the rows were loaded, read the missing rows from the pager
+                self.scroll_to(self.first_row)
+            else:
+                self.show_habit_rows(rows)
+
+    def show_habit_rows(self, rows):
         """
-        Clears the existing entries in the Treeview and loads habits from the HabitTracker, then populates the Treeview with the habit details.
+        Clears the existing entries in the Treeview and populates it with the given habit rows.
+
+        Args:
+            rows (list): Tuples (id, values) with the habit id and the column values of each habit.
         """
         # clear all
         for row in self.habit_tree.get_children():
             self.habit_tree.delete(row)
 
-        # fetch all habits
-        habits = Tracker.get_all_habits()
+        #insert to tree, the item id is the habit id
+        for habit_id, values in rows:
+            self.habit_tree.insert("", tk.END, iid=str(habit_id), values=values)
 
-        for habit in habits:
-            habit_name, frequency, created_at, last_at = habit
+        self.update_scrollbar()
 
+    def update_habit_row(self, habit_name):
+        """
+        Updates the row of a changed habit in place, only this habit is read from the database.
 
-            completions_days = Tracker.get_completion_days(habit_name)
-            current_streak_days, longest_streak_days = calculate_streak_days(completions_days)
+        Args:
+            habit_name (str): The name of the changed habit.
+        """
+        row = Tracker.get_habit_row(habit_name)
+        if row is None:
+            return
 
-            # habit state computing daily
-            if frequency == 'daily':
-                yesterday = datetime.now().date() - timedelta(days=1)
-                last_compl = datetime.fromisoformat(last_at).date() if last_at else None
+        habit_id, values = row
+        if self.habit_tree.exists(str(habit_id)):
+            self.habit_tree.item(str(habit_id), values=values)
+        if self.pager is not None:
+            self.pager.replace_row(habit_id, values)
 
-                if last_compl < yesterday:
-                    habit_state = "Habit Broken"
-                    current_streak_days = 0
-                else:
-                    habit_state = "Streak - Keep on Going!"
+    def insert_habit_row(self, habit_name):
+        """
+        Inserts a new habit at the top of the visible rows, if it matches the frequency filter.
+        The habit moves to its sorted position with the next refresh.
 
-            else:
-                #habit state computing weekly
-                completions_weeks = Tracker.get_completion_days(habit_name)
-                current_streak_weeks, longest_streak_weeks = calculate_streak_weeks(completions_weeks)
-
-
-                last_completion_date = datetime.fromisoformat(last_at) if last_at else None
-                if last_completion_date:
-                    last_completion_week = last_completion_date.isocalendar()[1]
-                    last_week = datetime.now().isocalendar()[1] - 1
-
-
-                    if last_completion_week < last_week:
-                        habit_state = "Habit Broken"
-                        current_streak_weeks = 0
-                    else:
-                        habit_state = "Streak - Keep on Going!"
-                else:
-                    habit_state = "Habit Broken"
-            #insert to tree
-            self.habit_tree.insert(
-                "",
-                tk.END,
-                values=(
-                    created_at, habit_name, frequency,
-                    current_streak_days if frequency == 'daily'
-                    else current_streak_weeks,
-                    longest_streak_days if frequency == 'daily'
-                    else longest_streak_weeks,
-                    last_at, habit_state
-                )
-            )
+        Args:
+            habit_name (str): The name of the new habit.
+        """
+        row = Tracker.get_habit_row(habit_name)
+        if row is None or (self.frequency and row[1][2] != self.frequency) or not habit_name.startswith(self.prefix):
+            return
+
+        habit_id, values = row
+        self.habit_tree.insert("", 0, iid=str(habit_id), values=values)
+        children = self.habit_tree.get_children()
+        if len(children) > self.visible_rows:
+            self.habit_tree.delete(children[-1])
+
+        self.total_rows += 1
+        if self.pager is not None:
+            self.pager.invalidate()
+        self.update_scrollbar()
+
+    def remove_habit_row(self, item):
+        """
+        Removes the row of a deleted habit and refills the visible rows from the database.
+
+        Args:
+            item (str): The Treeview item of the deleted habit.
+        """
+        if self.habit_tree.exists(item):
+            self.habit_tree.delete(item)
+
+        self.total_rows = max(self.total_rows - 1, 0)
+        if self.pager is not None:
+            self.pager.invalidate()
+            self.scroll_to(self.first_row)
+
+    def scroll_to(self, first_row):
+        """
+        Shows the window of rows starting at the given position, rows are read from the pager.
+
+        Args:
+            first_row (int): Position of the first visible row.
+        """
+        if self.pager is None:
+            return
+
+        first_row = max(min(first_row, self.total_rows - self.visible_rows), 0)
+        self.first_row = first_row
+        self.show_habit_rows(self.pager.get_rows(first_row, first_row + self.visible_rows))
+
+    def update_scrollbar(self):
+        """
+        Sets the scrollbar to the position and size of the visible window within all habits.
+        """
+        if self.total_rows:
+            self.scrollbar.set(self.first_row / self.total_rows,
+                               min(self.first_row + self.visible_rows, self.total_rows) / self.total_rows)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def on_scroll(self, action, amount, unit=None):
+        """
+        Handles the scrollbar, which either moves to a fraction of the list or scrolls by rows or pages.
+
+        Args:
+            action (str): "moveto" or "scroll".
+            amount (str): The fraction for "moveto", the number of steps for "scroll".
+            unit (str): "units" (rows) or "pages" for "scroll".
+        """
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.total_rows))
+        else:
+            step = self.visible_rows if unit == "pages" else 1
+            self.scroll_to(self.first_row + int(amount) * step)
+
+    def on_mousewheel(self, event):
+        """
+        Scrolls the habit list with the mouse wheel.
+
+        Args:
+            event (tk.Event): The wheel event, with `delta` on Windows and macOS, button 4/5 on Linux.
+        """
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.first_row - SCROLL_UNITS)
+        elif event.num == 5 or event.delta < 0:
+            self.scroll_to(self.first_row + SCROLL_UNITS)
+        return "break"
+
+    def on_resize(self, event):
+        """
+        Adapts the number of rows in the Treeview to its height.
+
+        Args:
+            event (tk.Event): The configure event with the new height.
+        """
+        visible_rows = max((event.height - HEADING_HEIGHT) // ROW_HEIGHT, 1)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.scroll_to(self.first_row)
+
+    def sort_habits(self, sort_by):
+        """
+        Sorts the habit list by a column, clicking the same column again reverses the order.
+
+        Args:
+            sort_by (str): The sort key, see SORTABLE_COLUMNS.
+        """
+        if sort_by == self.sort_by:
+            self.descending = not self.descending
+        else:
+            self.sort_by = sort_by
+            self.descending = sort_by != "name"  # longest streaks, latest completions and newest habits first
+        self.first_row = 0
+        self.load_habits(self.frequency)
 
     def complete_habit(self):
         """
@@ -161,30 +402,14 @@ class HabitTrackerApp:
 
 
         habit = Habit(name=habit_name, frequency=habit_frequency)
-        # Get the list of completed days for the habit
-        last_completion = Tracker.last_completion_date(habit_name)
-
-        # Get current date and week number for completion check
-        current_date = datetime.now().date()
-        current_week = datetime.now().isocalendar()[1]
-
-        if habit.frequency == 'daily':
-            if last_completion:
-                completion_date = datetime.fromisoformat(last_completion).date()
-                if current_date == completion_date:
-                    messagebox.showinfo("Info", f"Habit '{habit_name}' already completed today!")
-                    return
-        elif habit.frequency == 'weekly':
-            if last_completion:
-                completion_week = datetime.fromisoformat(last_completion).isocalendar()[1]
-                if current_week == completion_week:
-                    messagebox.showinfo("Info", f"Habit '{habit_name}' already completed this week!")
-                    return
-
-        # Add completion if not already completed
-        habit.add_completion()
-        # reload
-        self.load_habits()
+        # a single write, the database skips a second completion of the same day or week
+        if not habit.add_completion():
+            period = "this week" if habit.frequency == 'weekly' else "today"
+            messagebox.showinfo("Info", f"Habit '{habit_name}' already completed {period}!")
+            return
+
+        # update only the completed habit
+        self.update_habit_row(habit_name)
         messagebox.showinfo("Success", f"Habit '{habit_name}' completed!")
 
 
@@ -218,15 +443,16 @@ class HabitTrackerApp:
             frequency = frequency_var.get()
             if habit_name and frequency:
 
-                # Create a new habit and add it to the database and adds first completion
+                # Create a new habit and add it to the database and adds first completion in one transaction
                 new_habit = Habit(name=habit_name, frequency=frequency)
-                new_habit.add_new()
-                new_habit.add_completion()
+                with transaction():
+                    new_habit.add_new()
+                    new_habit.add_completion()
 
                 messagebox.showinfo("Success",
                                     f"Habit '{habit_name}' added successfully with its first completion!")
                 new_window.destroy()
-                self.load_habits()
+                self.insert_habit_row(habit_name)
 
             else:
                 messagebox.showerror("Error", "Please enter all fields.")
@@ -250,7 +476,7 @@ class HabitTrackerApp:
         if confirm:
                 habit = Habit(name=habit_name, frequency=None)
                 habit.delete()
-                self.load_habits()
+                self.remove_habit_row(selected_item[0])
                 messagebox.showinfo("Success", f"Habit '{habit_name}' deleted successfully!")
 
 
@@ -272,65 +498,23 @@ class HabitTrackerApp:
         """
         self.filter_habits_by_frequency("weekly")
 
+    def search_habits(self, prefix):
+        """
+        Shows only the habits whose name starts with the search text, the search runs in the database.
+
+        Args:
+            prefix (str): The start of the habit names, all habits if empty.
+        """
+        self.prefix = prefix
+        self.first_row = 0
+        self.load_habits(self.frequency)
+
     def filter_habits_by_frequency(self, frequency):
         """
         Filters habits by frequency (daily or weekly) and displays them in the Treeview.
-        Determines habit state for displaying.
 
 
         Args:
             frequency (str): The frequency to filter by ("daily" or "weekly").
         """
-        # Clear the Treeview
-        for row in self.habit_tree.get_children():
-            self.habit_tree.delete(row)
-
-        # Fetch all habits from the Tracker
-        habits = Tracker.get_all_habits()
-
-        for habit in habits:
-            habit_name, habit_frequency, created_at, last_at = habit
-            if habit_frequency != frequency:
-                continue
-
-            # Fetch completions and calculate streaks
-            completions = Tracker.get_completion_days(habit_name)
-            if habit_frequency == 'daily':
-                current_streak, longest_streak = calculate_streak_days(completions)
-
-                # Determine the state of the habit
-                yesterday = datetime.now().date() - timedelta(days=1)
-                last_compl = datetime.fromisoformat(last_at).date() if last_at else None
-
-                if not last_compl or last_compl < yesterday:
-                    habit_state = "Habit Broken"
-                    current_streak = 0
-                else:
-                    habit_state = "Streak - Keep on Going!"
-
-            else:  # Weekly habits
-                current_streak, longest_streak = calculate_streak_weeks(completions)
-
-                # Determine the state of the habit
-                last_completion_date = datetime.fromisoformat(last_at) if last_at else None
-                if last_completion_date:
-                    last_completion_week = last_completion_date.isocalendar()[1]
-                    last_week = datetime.now().isocalendar()[1] - 1  # Last week's ISO week number
-
-                    if last_completion_week < last_week:
-                        habit_state = "Habit Broken"
-                        current_streak = 0
-                    else:
-                        habit_state = "Streak - Keep on Going!"
-                else:
-                    habit_state = "Habit Broken"
-
-            # Insert the habit into the Treeview
-            self.habit_tree.insert(
-                "",
-                tk.END,
-                values=(
-                    created_at, habit_name, habit_frequency,
-                    current_streak, longest_streak, last_at, habit_state
-                )
-            )
+        self.load_habits(frequency)
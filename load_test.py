@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+
+"""
+Load test of a running habit service (api.py), e.g.
+
+  python api.py --port 8080
+  python load_test.py --port 8080 --path /streaks --path /habits --connections 16 --requests 5000
+
+Every connection is kept alive and sends its next request once the previous answer arrived, the paths are
+requested in turn. The latency of a request is the time from sending it until its body was read.
+"""
+
+
+def percentile(values, fraction):
+    """
+    Returns a percentile of sorted values, the nearest rank.
+
+    Args:
+        values (list): The values, sorted.
+        fraction (float): e.g. 0.99 for the 99th percentile.
+
+    Returns:
+        float: The value, 0.0 without values.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values), max(math.ceil(fraction * len(values)), 1)) - 1]
+
+
+async def read_response(reader):
+    """
+    Reads one response of a kept-alive connection.
+
+    Returns:
+        tuple: (status, body bytes).
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed by the server")
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        if key.strip().lower() == 'content-length':
+            length = int(value)
+    return int(status_line.split()[1]), await reader.readexactly(length)
+
+
+async def run_load_test(host='127.0.0.1', port=8080, paths=('/streaks',), connections=16, requests=2000,
+                        method='GET', body=None):
+    """
+    Sends requests over several kept-alive connections and measures their latency.
+
+    Args:
+        host (str): Address of the service.
+        port (int): Port of the service.
+        paths (sequence): Request targets, used in turn.
+        connections (int): Number of concurrent connections.
+        requests (int): Total number of requests.
+        method (str): The HTTP method of all requests.
+        body (object): JSON body sent with every request, None for no body.
+
+    Returns:
+        dict: `requests`, `errors` (responses with status >= 400 or failed connections), `seconds`,
+              `requests_per_second` and the latencies `p50_ms`, `p99_ms` and `max_ms`.
+    """
+    data = json.dumps(body).encode() if body is not None else b''
+    messages = [(f"{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Length: {len(data)}\r\n"
+                 f"Content-Type: application/json\r\n\r\n").encode('latin-1') + data for path in paths]
+    latencies = []
+    errors = 0
+    next_request = 0
+
+    async def client():
+        nonlocal errors, next_request
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while next_request < requests:
+                message = messages[next_request % len(messages)]
+                next_request += 1
+                started = time.perf_counter()
+                writer.write(message)
+                await writer.drain()
+                status, _ = await read_response(reader)
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors += 1
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(client() for _ in range(max(1, connections))), return_exceptions=True)
+    seconds = time.perf_counter() - started
+    errors += sum(isinstance(result, Exception) for result in results)
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': seconds,
+        'requests_per_second': len(latencies) / seconds if seconds else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+def main(argv=None):
+    """
+    Runs a load test against a local service and prints the throughput and latencies.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv.
+
+    Returns:
+        int: Exit code, 1 if a request failed.
+    """
+    parser = argparse.ArgumentParser(description="Load test of the habit service")
+    parser.add_argument("--host", default="127.0.0.1", help="address of the service")
+    parser.add_argument("--port", type=int, default=8080, help="port of the service")
+    parser.add_argument("--path", action="append", help="request target, can be given several times")
+    parser.add_argument("--connections", type=int, default=16, help="concurrent kept-alive connections")
+    parser.add_argument("--requests", type=int, default=2000, help="total number of requests")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run_load_test(args.host, args.port, args.path or ['/streaks'], args.connections,
+                                       args.requests))
+    print(f"{result['requests']} requests in {result['seconds']:.2f}s over {args.connections} connections: "
+          f"{result['requests_per_second']:.0f} requests/s, p50 {result['p50_ms']:.2f} ms, "
+          f"p99 {result['p99_ms']:.2f} ms, max {result['max_ms']:.2f} ms, {result['errors']} errors")
+    return 1 if result['errors'] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,10 +4,11 @@ from database_and_sql import create_and_populate_db
 from interface import HabitTrackerApp
 import tkinter as tk
 
-# Initialize database and app
-create_and_populate_db()
+if __name__ == "__main__":
+    # Initialize database and app
+    create_and_populate_db()
 
-# Launch UI
-root = tk.Tk()
-app = HabitTrackerApp(root)
-root.mainloop()
\ No newline at end of file
+    # Launch UI
+    root = tk.Tk()
+    app = HabitTrackerApp(root)
+    root.mainloop()
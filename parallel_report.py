@@ -0,0 +1,138 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import groupby, islice
+
+from classes import habit_row_values
+from database_and_sql import COUNT_HABITS, DB_SETTINGS, GET_SHARD_COMPLETION_DAYS, GET_SHARD_HABITS, \
+    GET_SHARD_START_IDS, connect
+from streak_calculation import calculate_streak_ordinals
+
+"""
+Streak report computed from the completion history by several worker processes.
+
+- the habits are split into id ranges (shards) of about the same number of habits
+- every worker process opens its own read-only connection and computes the streaks and states of whole shards
+- shards are handed out a few at a time and their rows are yielded in id order as they finish
+- small databases are computed in the calling process, starting processes would take longer than the work
+"""
+
+# Largest habit id, the upper bound of the last shard
+MAX_ID = 2 ** 63 - 1
+
+# Databases with fewer habits are computed in the calling process
+SERIAL_HABIT_LIMIT = 2000
+
+# Shards per worker, more shards even out habits with long histories
+SHARDS_PER_WORKER = 4
+
+# Largest number of habits per shard, at most two shards per worker are held in memory
+MAX_SHARD_HABITS = 5000
+
+_worker_connection = None
+
+
+def compute_shard(connection, first_id, last_id, frequency=None):
+    """
+    Computes the streaks and states of the habits in one id range from their completion days.
+
+    Args:
+        connection (sqlite3.Connection): The connection to read from.
+        first_id (int): The first habit id of the shard.
+        last_id (int): The last habit id of the shard.
+        frequency (str): Only habits of this frequency ("daily" or "weekly"), all habits if None.
+
+    Returns:
+        list: Tuples (id, values) in id order, values are the column values of the habit table.
+    """
+    habits = {habit_id: (name, habit_frequency, created_at) for habit_id, name, habit_frequency, created_at
+              in connection.execute(GET_SHARD_HABITS, (first_id, last_id, frequency))}
+    streaks = {}
+
+    for habit_id, rows in groupby(connection.execute(GET_SHARD_COMPLETION_DAYS, (first_id, last_id, frequency)),
+                                  key=lambda row: row[0]):
+        habit = habits.get(habit_id)
+        if habit is None:
+            continue  # added after the habits of the shard were read
+        days = [row[1] for row in rows]
+        current_streak, longest_streak = calculate_streak_ordinals(days, 7 if habit[1] == 'weekly' else 1)
+        streaks[habit_id] = (days[-1], current_streak, longest_streak)
+
+    rows = []
+    for habit_id, (name, habit_frequency, created_at) in habits.items():
+        last_day, current_streak, longest_streak = streaks.get(habit_id, (None, 0, 0))
+        last_at = date.fromordinal(last_day).isoformat() if last_day is not None else None
+        rows.append((habit_id, habit_row_values(name, habit_frequency, created_at, last_at,
+                                                current_streak, longest_streak)))
+    return rows
+
+
+def shard_ranges(connection, shard_size, frequency=None):
+    """
+    Splits the habits into id ranges of shard_size habits, the last range holds the rest.
+
+    Args:
+        connection (sqlite3.Connection): The connection to read from.
+        shard_size (int): Number of habits per range.
+        frequency (str): Only count habits of this frequency, all habits if None.
+
+    Returns:
+        list: Tuples (first id, last id) covering all habit ids, in id order.
+    """
+    starts = [row[0] for row in connection.execute(GET_SHARD_START_IDS, (max(1, shard_size), frequency))]
+    return [(start, (starts[i + 1] - 1) if i + 1 < len(starts) else MAX_ID) for i, start in enumerate(starts)]
+
+
+def _open_worker(path):
+    """
+    Opens the read-only connection of a worker process.
+    """
+    global _worker_connection
+    _worker_connection = connect(path, read_only=True)
+
+
+def _compute_worker_shard(shard):
+    """
+    Computes one shard with the connection of the worker process.
+    """
+    return compute_shard(_worker_connection, *shard)
+
+
+def iter_streak_report(path=None, workers=None, frequency=None, serial_limit=SERIAL_HABIT_LIMIT):
+    """
+    Streams the habit table computed from the completion history, using several processes for large databases.
+
+    Args:
+        path (str): The database file, defaults to DB_SETTINGS['path'].
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        frequency (str): Only habits of this frequency ("daily" or "weekly"), all habits if None.
+        serial_limit (int): Databases with fewer habits are computed in the calling process.
+
+    Yields:
+        tuple: (id, values) in habit id order, values are the column values of the habit table.
+    """
+    path = path or DB_SETTINGS['path']
+    workers = workers or os.cpu_count() or 1
+    connection = connect(path, read_only=True)
+    try:
+        habit_count = connection.execute(COUNT_HABITS, (frequency,)).fetchone()[0]
+        if workers == 1 or habit_count < serial_limit:
+            for first_id, last_id in shard_ranges(connection, MAX_SHARD_HABITS, frequency):
+                yield from compute_shard(connection, first_id, last_id, frequency)
+            return
+        shard_size = min(MAX_SHARD_HABITS, -(-habit_count // (workers * SHARDS_PER_WORKER)))
+        shards = iter(shard_ranges(connection, shard_size, frequency))
+    finally:
+        connection.close()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker, initargs=(path,)) as executor:
+        # at most two shards per worker are in flight, the next one is submitted when the oldest is yielded
+        pending = deque(executor.submit(_compute_worker_shard, shard + (frequency,))
+                        for shard in islice(shards, 2 * workers))
+        while pending:
+            rows = pending.popleft().result()
+            shard = next(shards, None)
+            if shard is not None:
+                pending.append(executor.submit(_compute_worker_shard, shard + (frequency,)))
+            yield from rows
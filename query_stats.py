@@ -0,0 +1,304 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+"""
+Settings of the query instrumentation.
+
+enabled        : record every statement run on connections opened by database_and_sql.connect,
+                 can be switched on with the HABITS_QUERY_STATS environment variable
+slow_query_ms  : statements taking at least this many milliseconds are logged with their EXPLAIN QUERY PLAN
+"""
+SETTINGS = {
+    'enabled': bool(os.environ.get('HABITS_QUERY_STATS')),
+    'slow_query_ms': 100.0,
+}
+
+# Slowest statements of the last calls, newest last
+slow_queries = deque(maxlen=100)
+
+_lock = threading.Lock()
+_stats = {}  # normalized statement -> [calls, rows, seconds, max seconds]
+
+
+def configure(**settings):
+    """
+    Changes the instrumentation settings.
+
+    Args:
+        **settings: Values for the keys of SETTINGS.
+    """
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown instrumentation settings: {', '.join(sorted(unknown))}")
+    SETTINGS.update(settings)
+
+
+def collect(sql, seconds, rows):
+    """
+    Adds a finished statement to the statistics, the default hook.
+
+    Args:
+        sql (str): The normalized statement.
+        seconds (float): Time spent executing and fetching.
+        rows (int): Rows fetched or changed.
+    """
+    with _lock:
+        stat = _stats.get(sql)
+        if stat is None:
+            _stats[sql] = [1, rows, seconds, seconds]
+        else:
+            stat[0] += 1
+            stat[1] += rows
+            stat[2] += seconds
+            if seconds > stat[3]:
+                stat[3] = seconds
+
+
+# Functions called with (sql, seconds, rows) for every finished statement
+hooks = [collect]
+
+
+def add_hook(hook):
+    """
+    Registers a function that is called with (sql, seconds, rows) for every finished statement.
+
+    Args:
+        hook (callable): The function to register.
+    """
+    hooks.append(hook)
+
+
+def remove_hook(hook):
+    """
+    Unregisters a function added with add_hook.
+
+    Args:
+        hook (callable): The function to remove.
+    """
+    hooks.remove(hook)
+
+
+def reset():
+    """
+    Clears the statistics and the slow query log.
+    """
+    with _lock:
+        _stats.clear()
+        slow_queries.clear()
+
+
+def record(sql, seconds, rows, connection=None, params=None):
+    """
+    Passes a finished statement to the hooks and logs it if it was slow.
+
+    Args:
+        sql (str): The statement as executed.
+        seconds (float): Time spent executing and fetching.
+        rows (int): Rows fetched or changed.
+        connection (sqlite3.Connection): Connection used to capture the query plan of a slow statement.
+        params (tuple or dict): Parameters of the statement, None if no plan should be captured.
+    """
+    sql = ' '.join(sql.split())
+    for hook in hooks:
+        hook(sql, seconds, rows)
+
+    if seconds * 1000 >= SETTINGS['slow_query_ms']:
+        plan = explain(connection, sql, params) if connection is not None and params is not None else []
+        entry = {'query': query_name(sql), 'sql': sql, 'seconds': seconds, 'rows': rows, 'plan': plan}
+        slow_queries.append(entry)
+        logger.warning("slow query %s took %.1f ms: %s", entry['query'], seconds * 1000, ' | '.join(plan))
+
+
+def explain(connection, sql, params=()):
+    """
+    Returns the query plan of a statement.
+
+    Args:
+        connection (sqlite3.Connection): The connection the statement ran on.
+        sql (str): The statement.
+        params (tuple or dict): Parameters of the statement.
+
+    Returns:
+        list: The detail column of every plan step, empty if the plan cannot be read.
+    """
+    try:
+        # a plain cursor, the plan lookup itself is not recorded
+        cursor = sqlite3.Cursor(connection)
+        return [row[3] for row in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    except sqlite3.Error:
+        return []
+
+
+def query_name(sql):
+    """
+    Returns the name of the SQL constant that holds a statement, or the shortened statement.
+
+    Args:
+        sql (str): The normalized statement.
+
+    Returns:
+        str: e.g. 'GET_HABITS'.
+    """
+    for module_name in ('database_and_sql', 'streak_sql'):
+        module = sys.modules.get(module_name)
+        for name, value in vars(module or {}).items():
+            if name.isupper() and isinstance(value, str) and ' '.join(value.split()) == sql:
+                return name
+    return sql if len(sql) <= 60 else sql[:57] + '...'
+
+
+def snapshot():
+    """
+    Returns the statistics of every statement, slowest in total first.
+
+    Returns:
+        list: Dicts with query, sql, calls, rows, total_seconds, mean_seconds and max_seconds.
+    """
+    with _lock:
+        stats = [(sql, list(stat)) for sql, stat in _stats.items()]
+    stats.sort(key=lambda item: item[1][2], reverse=True)
+    return [{
+        'query': query_name(sql),
+        'sql': sql,
+        'calls': calls,
+        'rows': rows,
+        'total_seconds': seconds,
+        'mean_seconds': seconds / calls,
+        'max_seconds': max_seconds,
+    } for sql, (calls, rows, seconds, max_seconds) in stats]
+
+
+def to_prometheus():
+    """
+    Returns the statistics in the Prometheus text exposition format.
+
+    Returns:
+        str: One metric family per statistic, labelled by query name.
+    """
+    stats = snapshot()
+    families = (
+        ('habits_query_calls_total', 'counter', 'Statements executed.', 'calls'),
+        ('habits_query_rows_total', 'counter', 'Rows fetched or changed.', 'rows'),
+        ('habits_query_seconds_total', 'counter', 'Time spent executing and fetching.', 'total_seconds'),
+        ('habits_query_max_seconds', 'gauge', 'Slowest single call.', 'max_seconds'),
+    )
+    lines = []
+    for metric, kind, description, key in families:
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for stat in stats:
+            label = stat['query'].replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'{metric}{{query="{label}"}} {stat[key]}')
+    lines.append("# HELP habits_slow_queries Statements in the slow query log.")
+    lines.append("# TYPE habits_slow_queries gauge")
+    lines.append(f"habits_slow_queries {len(slow_queries)}")
+    return '\n'.join(lines) + '\n'
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor that times its statements while the instrumentation is enabled.
+
+    A statement is recorded once its rows are fetched, the cursor runs the next statement or is closed.
+    Time spent fetching is added to the statement.
+    """
+
+    _pending = None  # [sql, params, seconds, fetched rows] of the running statement
+
+    def execute(self, sql, parameters=()):
+        if not SETTINGS['enabled']:
+            return super().execute(sql, parameters)
+        self._flush()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._pending = [sql, parameters, time.perf_counter() - started, 0]
+
+    def executemany(self, sql, seq_of_parameters):
+        if not SETTINGS['enabled']:
+            return super().executemany(sql, seq_of_parameters)
+        self._flush()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record(sql, time.perf_counter() - started, max(self.rowcount, 0))
+
+    def fetchone(self):
+        if self._pending is None:
+            return super().fetchone()
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._pending[2] += time.perf_counter() - started
+        if row is None:
+            self._flush()
+        else:
+            self._pending[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        if self._pending is None:
+            return super().fetchmany(self.arraysize if size is None else size)
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._pending[2] += time.perf_counter() - started
+        self._pending[3] += len(rows)
+        if not rows:
+            self._flush()
+        return rows
+
+    def fetchall(self):
+        if self._pending is None:
+            return super().fetchall()
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._pending[2] += time.perf_counter() - started
+        self._pending[3] += len(rows)
+        self._flush()
+        return rows
+
+    def __iter__(self):
+        if self._pending is None:
+            return self
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._flush()
+        super().close()
+
+    def __del__(self):
+        self._flush()
+
+    def _flush(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            sql, params, seconds, rows = pending
+            try:
+                changed = max(self.rowcount, 0)
+                connection = self.connection
+            except sqlite3.Error:
+                changed, connection = 0, None
+            record(sql, seconds, rows + changed, connection, params)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors, including those of Connection.execute, are InstrumentedCursors.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,125 @@
+from array import array
+
+from database_and_sql import GET_COMPLETION_DAY_ORDINALS
+from streak_calculation import calculate_streak_ordinals
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the batch functions fall back to the scalar streak calculation
+    np = None
+
+
+# Largest gap between two completions that still continues a streak, in days
+UNIT_DAYS = {'daily': 1, 'weekly': 7}
+
+
+def calculate_streaks_batch(day_ordinals, offsets, frequencies):
+    """
+        Calculates the current and longest streak for many habits at once.
+
+        The completions of all habits are passed as one flat array, habit i owns the slice
+        day_ordinals[offsets[i]:offsets[i + 1]], ordered by date. The results match
+        calculate_streak_days / calculate_streak_weeks for every habit.
+
+        Args:
+            day_ordinals (array-like): Completion days as integer day ordinals (date.toordinal())
+                                       or as a NumPy datetime64 array.
+            offsets (array-like): Start of every habit in day_ordinals followed by the total length.
+            frequencies (list of str): Frequency of every habit ('daily' or 'weekly').
+
+        Returns:
+            tuple: A tuple containing:
+                - current_streaks (list of int): The current streak of every habit.
+                - longest_streaks (list of int): The longest streak of every habit.
+    """
+    if np is None:
+        return _calculate_streaks_scalar(day_ordinals, offsets, frequencies)
+
+    days = np.asarray(day_ordinals)
+    if np.issubdtype(days.dtype, np.datetime64):
+        days = days.astype('datetime64[D]')
+    days = days.astype(np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+
+    habit_count = len(offsets) - 1
+    current_streaks = np.zeros(habit_count, dtype=np.int64)
+    longest_streaks = np.zeros(habit_count, dtype=np.int64)
+    if len(days) == 0:
+        return current_streaks.tolist(), longest_streaks.tolist()
+
+    counts = np.diff(offsets)
+    habit_of = np.repeat(np.arange(habit_count), counts)
+    units = np.array([UNIT_DAYS[frequency] for frequency in frequencies], dtype=np.int64)[habit_of]
+
+    # A run starts at the first completion of a habit and wherever the gap exceeds one unit
+    run_start = np.zeros(len(days), dtype=bool)
+    run_start[1:] = np.diff(days) > units[1:]
+    run_start[offsets[:-1][counts > 0]] = True
+
+    run_starts = np.flatnonzero(run_start)
+    run_lengths = np.diff(np.append(run_starts, len(days)))
+    run_habits = habit_of[run_starts]
+
+    # Runs are ordered by habit, so every completed habit owns a contiguous block of runs
+    completed = np.flatnonzero(counts)
+    first_runs = np.searchsorted(run_habits, completed, side='left')
+    last_runs = np.searchsorted(run_habits, completed, side='right') - 1
+    longest_streaks[completed] = np.maximum.reduceat(run_lengths, first_runs)
+    current_streaks[completed] = run_lengths[last_runs]
+
+    return current_streaks.tolist(), longest_streaks.tolist()
+
+
+def _calculate_streaks_scalar(day_ordinals, offsets, frequencies):
+    """
+        Calculates the streaks habit by habit with the scalar streak function, used without NumPy.
+
+        Args:
+            day_ordinals (array-like): Completion days as integer day ordinals (date.toordinal()).
+            offsets (array-like): Start of every habit in day_ordinals followed by the total length.
+            frequencies (list of str): Frequency of every habit ('daily' or 'weekly').
+
+        Returns:
+            tuple: The current streaks and the longest streaks as lists of int.
+    """
+    current_streaks = []
+    longest_streaks = []
+
+    for i, frequency in enumerate(frequencies):
+        current_streak, longest_streak = calculate_streak_ordinals(day_ordinals[offsets[i]:offsets[i + 1]],
+                                                                   UNIT_DAYS[frequency])
+        current_streaks.append(current_streak)
+        longest_streaks.append(longest_streak)
+
+    return current_streaks, longest_streaks
+
+
+def load_completion_arrays(connection):
+    """
+        Reads the completion history of all habits into flat arrays for calculate_streaks_batch.
+
+        Args:
+            connection (sqlite3.Connection): The connection to read from.
+
+        Returns:
+            tuple: (names, frequencies, day_ordinals, offsets) with day_ordinals and offsets as int arrays.
+    """
+    names = []
+    frequencies = []
+    day_ordinals = array('q')
+    offsets = array('q')
+    last_id = None
+
+    for habit_id, name, frequency, day in connection.execute(GET_COMPLETION_DAY_ORDINALS):
+        if habit_id != last_id:
+            names.append(name)
+            frequencies.append(frequency)
+            offsets.append(len(day_ordinals))
+            last_id = habit_id
+        if day is not None:
+            day_ordinals.append(day)
+    offsets.append(len(day_ordinals))
+
+    if np is not None:
+        return names, frequencies, np.frombuffer(day_ordinals, dtype=np.int64), np.frombuffer(offsets, dtype=np.int64)
+    return names, frequencies, day_ordinals, offsets
@@ -68,3 +68,68 @@ def calculate_streak_weeks(completions):
             current_streak = 1
     return current_streak, longest_streak
 
+
+def calculate_streak_ordinals(days, unit_days):
+    """
+        Calculates the current and longest streak from completion days stored as day ordinals.
+
+        Gives the same result as calculate_streak_days (unit_days=1) and calculate_streak_weeks (unit_days=7)
+        without parsing dates.
+
+        Args:
+            days (list of int): Completion days as day ordinals (date.toordinal()), ordered.
+            unit_days (int): Largest gap in days between two completions that continues a streak.
+
+        Returns:
+            tuple: A tuple containing:
+                - current_streak (int): The number of completions in the run ending at the most recent one.
+                - longest_streak (int): The number of completions in the longest run.
+    """
+    if not days:
+        return 0, 0
+
+    longest_streak = 1
+    current_streak = 1
+
+    for i in range(1, len(days)):
+        if days[i] - days[i - 1] <= unit_days:
+            current_streak += 1
+            if current_streak > longest_streak:
+                longest_streak = current_streak
+        else:
+            current_streak = 1
+
+    return current_streak, longest_streak
+
+
+def determine_habit_state(frequency, last_completed_at, current_streak, today=None):
+    """
+        Determines whether a habit is still on track and the current streak to display for it.
+
+        A daily habit is broken if it was not completed today or yesterday, a weekly habit is broken if it
+        was not completed in the current or the previous ISO week.
+
+        Args:
+            frequency (str): Frequency of the habit ('daily' or 'weekly').
+            last_completed_at (str): The most recent completion date in ISO format, or None.
+            current_streak (int): The current streak up to the most recent completion.
+            today (date): The reference date, defaults to the current date.
+
+        Returns:
+            tuple: A tuple containing:
+                - habit_state (str): "Habit Broken" or "Streak - Keep on Going!".
+                - current_streak (int): The current streak, reset to 0 if the habit is broken.
+    """
+    today = today or datetime.now().date()
+    last_completion = datetime.fromisoformat(last_completed_at).date() if last_completed_at else None
+
+    if frequency == 'daily':
+        deadline = today - timedelta(days=1)
+    else:
+        # Monday of the previous ISO week
+        deadline = today - timedelta(days=today.weekday(), weeks=1)
+        last_completion = last_completion - timedelta(days=last_completion.weekday()) if last_completion else None
+
+    if not last_completion or last_completion < deadline:
+        return "Habit Broken", 0
+    return "Streak - Keep on Going!", current_streak
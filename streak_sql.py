@@ -0,0 +1,62 @@
+###################
+#streak SQL´s as var
+###################
+
+"""
+Computes the current and longest streak of every habit inside SQLite (gaps-and-islands).
+
+- LAG compares the day ordinal of every completion with the previous completion of the same habit
+- a gap of more than one day (daily) or seven days (weekly) starts a new island, a running SUM numbers the islands
+- the longest streak is the largest island, the current streak is the last island of the habit
+
+The rules are the same as in streak_calculation.calculate_streak_days / calculate_streak_weeks,
+which stay the reference implementation for cross checks.
+"""
+
+GET_STREAKS = """
+    WITH gaps AS (
+        SELECT
+            c.id,
+            c.day,
+            CASE
+                WHEN c.day - LAG(c.day) OVER habit_completions
+                     <= CASE h.frequency WHEN 'weekly' THEN 7 ELSE 1 END
+                THEN 0
+                ELSE 1
+            END AS new_island
+        FROM completions c
+        JOIN habits h ON h.id = c.id
+        WINDOW habit_completions AS (PARTITION BY c.id ORDER BY c.day)
+    ),
+    islands AS (
+        SELECT
+            id,
+            day,
+            SUM(new_island) OVER (PARTITION BY id ORDER BY day ROWS UNBOUNDED PRECEDING) AS island
+        FROM gaps
+    ),
+    runs AS (
+        SELECT id, island, COUNT(*) AS run_length, MAX(day) AS run_end
+        FROM islands
+        GROUP BY id, island
+    ),
+    last_runs AS (
+        SELECT
+            id,
+            run_length,
+            run_end,
+            MAX(run_length) OVER (PARTITION BY id) AS longest_streak,
+            ROW_NUMBER() OVER (PARTITION BY id ORDER BY island DESC) AS run_rank
+        FROM runs
+    )
+    SELECT
+        h.name,
+        h.frequency,
+        h.created_at,
+        date(r.run_end + 1721424.5) AS last_completed_at,
+        COALESCE(r.run_length, 0) AS current_streak,
+        COALESCE(r.longest_streak, 0) AS longest_streak
+    FROM habits h
+    LEFT JOIN last_runs r ON r.id = h.id AND r.run_rank = 1
+    ORDER BY h.name
+"""
@@ -0,0 +1,107 @@
+import asyncio
+import http.client
+import json
+import threading
+import unittest
+
+from api import HabitServer
+from load_test import percentile, run_load_test
+from test_support import TemporaryDatabaseTestCase
+
+
+class TestHabitServer(TemporaryDatabaseTestCase):
+
+    def setUp(self):
+        """Start a server on a free port with a temporary database, its event loop runs on a thread."""
+        super().setUp()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.server = HabitServer(port=0, workers=2, max_pending=4)
+        self.wait(self.server.start())
+        self.client = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=5)
+
+    def tearDown(self):
+        """Stop the server and restore the connection settings."""
+        self.client.close()
+        self.wait(self.server.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        super().tearDown()
+
+    def wait(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout=30)
+
+    def request(self, method, path, body=None):
+        self.client.request(method, path, json.dumps(body) if body is not None else None,
+                            {'Content-Type': 'application/json'})
+        response = self.client.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_habit_lifecycle(self):
+        """Test adding, completing, reading and deleting a habit over one kept-alive connection."""
+        self.assertEqual(self.request('POST', '/habits', {'name': 'Read books', 'frequency': 'weekly'})[0], 201)
+        socket = self.client.sock
+        self.assertEqual(self.request('POST', '/habits', {'name': 'Read books', 'frequency': 'weekly'})[0], 409)
+        self.assertEqual(self.request('POST', '/habits', {'name': 'Run', 'frequency': 'hourly'})[0], 400)
+
+        self.assertEqual(self.request('POST', '/habits/Read%20books/completions'),
+                         (201, {'name': 'Read books', 'added': True}))
+        self.assertEqual(self.request('POST', '/habits/Read%20books/completions'),
+                         (200, {'name': 'Read books', 'added': False}))
+
+        status, habit = self.request('GET', '/habits/Read%20books')
+        self.assertEqual((status, habit['current_streak'], habit['habit_state']),
+                         (200, 1, "Streak - Keep on Going!"))
+        status, completions = self.request('GET', '/habits/Read%20books/completions')
+        self.assertEqual(len(completions['completions']), 1)
+        self.assertEqual([row['name'] for row in self.request('GET', '/streaks?frequency=weekly')[1]['habits']],
+                         ['Read books'])
+        self.assertEqual(self.request('GET', '/streaks?frequency=daily')[1], {'habits': []})
+        self.assertEqual(self.request('GET', '/habits')[1]['habits'][0]['last_completed_at'],
+                         completions['completions'][0])
+
+        self.assertEqual(self.request('DELETE', '/habits/Read%20books')[0], 200)
+        for method, path in (('DELETE', '/habits/Read%20books'), ('GET', '/habits/Read%20books'),
+                             ('GET', '/habits/Read%20books/completions'), ('POST', '/habits/x/completions'),
+                             ('GET', '/nothing')):
+            self.assertEqual(self.request(method, path)[0], 404)
+        self.assertEqual(self.request('PUT', '/habits')[0], 405)
+        self.assertIs(self.client.sock, socket)
+
+    def test_batch(self):
+        """Test that a batch answers every request in order and commits its writes together."""
+        status, result = self.request('POST', '/batch', {'requests': [
+            {'method': 'POST', 'path': '/habits', 'body': {'name': 'Run', 'frequency': 'daily'}},
+            {'method': 'POST', 'path': '/habits/Run/completions'},
+            {'method': 'POST', 'path': '/habits', 'body': {'name': 'Run', 'frequency': 'daily'}},
+            {'method': 'GET', 'path': '/habits/Run'},
+        ]})
+        self.assertEqual(status, 200)
+        self.assertEqual([response['status'] for response in result['responses']], [201, 201, 409, 200])
+        self.assertEqual(result['responses'][3]['body']['current_streak'], 1)
+        self.assertEqual(self.request('POST', '/batch', {'requests': 'no list'})[0], 400)
+
+        self.client.request('POST', '/habits', 'not json')
+        response = self.client.getresponse()
+        self.assertEqual((response.status, response.getheader('Connection')), (400, 'keep-alive'))
+        response.read()
+
+    def test_load_test(self):
+        """Test that the load test client keeps its connections busy and reports the latencies."""
+        self.request('POST', '/habits', {'name': 'Run', 'frequency': 'daily'})
+        result = asyncio.run(run_load_test('127.0.0.1', self.server.port, ['/habits/Run', '/streaks'],
+                                           connections=8, requests=200))
+        self.assertEqual((result['requests'], result['errors']), (200, 0))
+        self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertLessEqual(result['p99_ms'], result['max_ms'])
+
+        result = asyncio.run(run_load_test('127.0.0.1', self.server.port, ['/habits/missing'], 2, 10))
+        self.assertEqual(result['errors'], 10)
+        self.assertEqual(percentile([1, 2, 3, 4], 0.99), 4)
+        self.assertEqual(percentile([1, 2, 3, 4], 0.5), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
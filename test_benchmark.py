@@ -0,0 +1,31 @@
+import os
+import tempfile
+import unittest
+
+import database_and_sql
+from benchmark import find_regressions, run
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_find_regressions(self):
+        """Test that only benchmarks slower than the threshold are reported."""
+        baseline = {'habits=100': {'fast': 1.0, 'slow': 1.0}}
+        current = {'habits=100': {'fast': 1.2, 'slow': 1.3, 'new': 5.0}, 'habits=1000': {'fast': 9.0}}
+        self.assertEqual(find_regressions(baseline, current, 0.25), [('habits=100', 'slow', 1.0, 1.3)])
+
+    def test_run(self):
+        """Test that a small run times every benchmark and restores the database settings."""
+        settings = dict(database_and_sql.DB_SETTINGS)
+        with tempfile.TemporaryDirectory() as directory:
+            results = run([5], 20, 1, directory)
+            database_and_sql.close_connection()
+            self.assertTrue(os.path.exists(os.path.join(directory, 'benchmark_5.db')))
+        self.assertEqual(database_and_sql.DB_SETTINGS, settings)
+        self.assertIn('load_habits', results['habits=5'])
+        self.assertIn('query.GET_STREAKS', results['habits=5'])
+        self.assertTrue(all(seconds >= 0 for seconds in results['habits=5'].values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
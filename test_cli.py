@@ -0,0 +1,45 @@
+import csv
+import json
+import unittest
+from datetime import date, timedelta
+
+import cli
+from classes import Tracker
+from database_and_sql import ADD_HABIT, execute_many
+from test_support import TemporaryDatabaseTestCase
+
+
+class TestReport(TemporaryDatabaseTestCase):
+
+    def setUp(self):
+        """Point the connection provider to a temporary database with a daily and a weekly habit."""
+        super().setUp()
+        today = date.today()
+        execute_many(ADD_HABIT, [("Read", "weekly", "2024-01-01"), ("Walk", "daily", "2024-01-01")])
+        Tracker.add_completions([("Walk", today - timedelta(days=1)), ("Walk", today), ("Read", "2024-01-01")])
+        self.output = self.path('report')
+
+    def test_jsonl(self):
+        """Test that the JSON Lines report holds the habit table rows, filtered by frequency."""
+        self.assertEqual(cli.main(["report", "--output", self.output]), 0)
+        with open(self.output, encoding="utf-8") as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual(rows, [dict(zip(cli.REPORT_FIELDS, values)) for values in Tracker.get_habit_rows()])
+        self.assertEqual([row['habit_state'] for row in rows], ["Habit Broken", "Streak - Keep on Going!"])
+
+        cli.main(["report", "--frequency", "daily", "--output", self.output])
+        with open(self.output, encoding="utf-8") as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual([(row['name'], row['current_streak']) for row in rows], [("Walk", 2)])
+
+    def test_csv(self):
+        """Test the CSV report with its header."""
+        cli.main(["report", "--format", "csv", "--frequency", "weekly", "--output", self.output])
+        with open(self.output, newline="", encoding="utf-8") as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(rows[0], list(cli.REPORT_FIELDS))
+        self.assertEqual(rows[1:], [["2024-01-01", "Read", "weekly", "0", "1", "2024-01-01", "Habit Broken"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+
+from data_generator import generate_completions, generate_database, generate_habits
+from database_and_sql import rebuild_streaks
+
+
+class TestDataGenerator(unittest.TestCase):
+
+    def test_patterns(self):
+        """Test the completion days of every pattern."""
+        start = date(2024, 1, 1)  # Monday
+        habits = list(generate_habits(4, start))
+        self.assertEqual([habit[4] for habit in habits], ['always', 'random', 'weekly', 'decaying'])
+        self.assertEqual([habit[2] for habit in habits], ['daily', 'daily', 'weekly', 'daily'])
+
+        completions = list(generate_completions(habits, 28, start, probability=1.0, half_life=1e9))
+        days = {habit[0]: [row[1] for row in completions if row[0] == habit[0]] for habit in habits}
+        self.assertEqual(len(days[1]), 28)
+        self.assertEqual(len(days[2]), 28)
+        self.assertEqual(days[3], ["2024-01-01", "2024-01-08", "2024-01-15", "2024-01-22"])
+        self.assertEqual(len(days[4]), 28)
+
+    def test_seeded(self):
+        """Test that the same seed gives the same dataset."""
+        start = date(2024, 1, 1)
+        first = list(generate_completions(generate_habits(10, start), 60, start, seed=3))
+        second = list(generate_completions(generate_habits(10, start), 60, start, seed=3))
+        third = list(generate_completions(generate_habits(10, start), 60, start, seed=4))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+
+    def test_generate_database(self):
+        """Test writing a dataset into a fresh database with consistent streaks."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'generated.db')
+            result = generate_database(path, 20, 90, chunk_size=100)
+
+            with self.assertRaises(FileExistsError):
+                generate_database(path, 20, 90)
+
+            connection = sqlite3.connect(path)
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM habits").fetchone()[0], 20)
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM completions").fetchone()[0],
+                             result['completions'])
+            self.assertEqual(rebuild_streaks(connection, check_only=True), [])
+            connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
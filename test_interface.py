@@ -0,0 +1,121 @@
+import time
+import unittest
+from unittest import mock
+
+import interface
+from classes import HabitPager
+from database_and_sql import ADD_HABIT, execute_many
+from interface import HabitTrackerApp
+from test_support import TemporaryDatabaseTestCase
+
+
+class StubTreeview:
+    """The part of ttk.Treeview the habit list uses, without a display."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def get_children(self):
+        return tuple(self.rows)
+
+    def delete(self, item):
+        del self.rows[item]
+
+    def insert(self, parent, index, iid, values):
+        rows = list(self.rows.items())
+        rows.insert(len(rows) if index == 'end' else index, (iid, values))
+        self.rows = dict(rows)
+
+    def exists(self, item):
+        return item in self.rows
+
+    def item(self, item, option=None, values=None):
+        if values is None:
+            return self.rows[item]
+        self.rows[item] = values
+
+
+class TestHabitTrackerApp(TemporaryDatabaseTestCase):
+
+    def setUp(self):
+        """Create the app with mocked Tk widgets, the refreshes run on the real worker thread."""
+        super().setUp()
+        execute_many(ADD_HABIT, [(f"daily_{i:02}", 'daily', "2024-01-01") for i in range(3)]
+                     + [(f"weekly_{i:02}", 'weekly', "2024-01-01") for i in range(2)])
+
+        self.pager = mock.patch.object(interface, 'HabitPager', wraps=HabitPager).start()
+        self.messagebox = mock.patch.object(interface, 'messagebox').start()
+        self.addCleanup(mock.patch.stopall)
+        self.app = self.create_app()
+
+    def tearDown(self):
+        self.app.refresh_executor.shutdown(wait=True)
+        super().tearDown()
+
+    def create_app(self):
+        with mock.patch.object(interface, 'tk'), mock.patch.object(interface, 'ttk'):
+            app = HabitTrackerApp(mock.MagicMock())
+        app.habit_tree = StubTreeview()
+        return app
+
+    def wait_for_result(self):
+        """Wait for the worker thread to hand over a result."""
+        deadline = time.monotonic() + 5
+        while self.app.refresh_results.empty():
+            self.assertLess(time.monotonic(), deadline, "refresh did not finish")
+            time.sleep(0.005)
+
+    def finish_refresh(self):
+        """Wait for the worker thread to hand over a result and let the Tk side poll it."""
+        self.wait_for_result()
+        self.app.poll_refresh()
+
+    def shown_names(self):
+        return [values[1] for values in self.app.habit_tree.rows.values()]
+
+    def test_refresh(self):
+        """Test that the first refresh shows all habits on the Tk side."""
+        self.finish_refresh()
+        self.assertFalse(self.app.refresh_running)
+        self.assertEqual(self.app.total_rows, 5)
+        self.assertEqual(self.shown_names(), ["daily_00", "daily_01", "daily_02", "weekly_00", "weekly_01"])
+        self.messagebox.showerror.assert_not_called()
+
+    def test_coalesced_refreshes(self):
+        """Test that quick filter changes only load the latest request and stale results are dropped."""
+        self.app.load_habits('daily')
+        self.app.load_habits('weekly')
+
+        # the first refresh was superseded, its rows are not shown
+        self.finish_refresh()
+        self.assertTrue(self.app.refresh_running)
+        self.assertIsNone(self.app.pager)
+        self.assertEqual(self.shown_names(), [])
+
+        self.finish_refresh()
+        self.assertFalse(self.app.refresh_running)
+        self.assertEqual(self.shown_names(), ["weekly_00", "weekly_01"])
+        self.assertEqual([call.args[0] for call in self.pager.call_args_list], [None, 'weekly'])
+
+    def test_resize_during_first_refresh(self):
+        """Test that a Treeview that grew before the first refresh finished is filled completely."""
+        self.finish_refresh()
+        self.app.refresh_executor.shutdown(wait=True)
+        execute_many(ADD_HABIT, [(f"habit_{i:02}", 'daily', "2024-01-01") for i in range(55)])
+        self.app = self.create_app()
+
+        # the first <Configure> event arrives after the worker read the rows for the initial height
+        self.wait_for_result()
+        self.app.on_resize(mock.Mock(height=interface.HEADING_HEIGHT + 23 * interface.ROW_HEIGHT))
+        self.assertEqual(self.app.visible_rows, 23)
+
+        self.app.poll_refresh()
+        self.assertEqual(self.app.total_rows, 60)
+        self.assertEqual(len(self.shown_names()), 23)
+
+        self.app.on_resize(mock.Mock(height=interface.HEADING_HEIGHT + 5 * interface.ROW_HEIGHT))
+        self.assertEqual(len(self.shown_names()), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
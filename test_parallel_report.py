@@ -0,0 +1,50 @@
+import unittest
+from datetime import date, timedelta
+
+from classes import Tracker
+from database_and_sql import ADD_HABIT, connect, execute_many
+from parallel_report import iter_streak_report, shard_ranges
+from test_support import TemporaryDatabaseTestCase
+
+
+class TestParallelReport(TemporaryDatabaseTestCase):
+
+    def setUp(self):
+        """Create habits with different histories, some without completions, in a temporary database."""
+        super().setUp()
+        execute_many(ADD_HABIT, [(f"habit_{i:02}", 'weekly' if i % 3 == 0 else 'daily', "2024-01-01")
+                                 for i in range(40)])
+        today = date.today()
+        Tracker.add_completions((f"habit_{i:02}", today - timedelta(days=day))
+                                for i in range(40) if i % 7 for day in range(0, 60, i % 5 + 1))
+        self.expected = {values[1]: values for values in Tracker.get_habit_rows()}
+
+    def assert_report(self, rows, frequency=None):
+        ids = [habit_id for habit_id, _ in rows]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual({values[1]: values for _, values in rows},
+                         {name: values for name, values in self.expected.items() if frequency in (None, values[2])})
+
+    def test_serial(self):
+        """Test that the report computed in the calling process matches the stored streaks."""
+        self.assert_report(list(iter_streak_report(self.db_path, workers=1)))
+        self.assert_report(list(iter_streak_report(self.db_path, workers=4)))
+
+    def test_workers(self):
+        """Test that worker processes return the same rows in id order, also filtered by frequency."""
+        self.assert_report(list(iter_streak_report(self.db_path, workers=2, serial_limit=0)))
+        self.assert_report(list(iter_streak_report(self.db_path, workers=3, frequency='weekly', serial_limit=0)),
+                           'weekly')
+
+    def test_shard_ranges(self):
+        """Test that the id ranges cover every habit once."""
+        connection = connect(self.db_path, read_only=True)
+        shards = shard_ranges(connection, 7)
+        ids = [row[0] for row in connection.execute("SELECT id FROM habits ORDER BY id")]
+        connection.close()
+        self.assertEqual(len(shards), 6)
+        self.assertEqual(sorted(i for i in ids for first, last in shards if first <= i <= last), ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
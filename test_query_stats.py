@@ -0,0 +1,82 @@
+import sqlite3
+import unittest
+
+import query_stats
+from database_and_sql import ADD_HABIT, GET_HABITS, create_schema
+from query_stats import InstrumentedConnection
+
+
+class TestQueryStats(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = dict(query_stats.SETTINGS)
+        query_stats.configure(enabled=True, slow_query_ms=10000)
+        query_stats.reset()
+        self.connection = sqlite3.connect(':memory:', factory=InstrumentedConnection)
+        create_schema(self.connection)
+
+    def tearDown(self):
+        self.connection.close()
+        query_stats.configure(**self.settings)
+        query_stats.reset()
+
+    def stats(self):
+        return {stat['query']: stat for stat in query_stats.snapshot()}
+
+    def test_records_calls_and_rows(self):
+        """Test that writes count changed rows and reads count fetched rows, including iterated cursors."""
+        query_stats.reset()
+        self.connection.executemany(ADD_HABIT, [('a', 'daily', '2024-01-01'), ('b', 'weekly', '2024-01-01')])
+        self.connection.execute(ADD_HABIT, ('c', 'daily', '2024-01-01'))
+        self.connection.execute(GET_HABITS).fetchall()
+        for _ in self.connection.execute(GET_HABITS):
+            pass
+
+        stats = self.stats()
+        self.assertEqual((stats['ADD_HABIT']['calls'], stats['ADD_HABIT']['rows']), (2, 3))
+        self.assertEqual((stats['GET_HABITS']['calls'], stats['GET_HABITS']['rows']), (2, 6))
+        self.assertGreaterEqual(stats['GET_HABITS']['max_seconds'], 0)
+
+    def test_disabled(self):
+        """Test that nothing is recorded while the instrumentation is disabled."""
+        query_stats.configure(enabled=False)
+        query_stats.reset()
+        self.connection.execute(GET_HABITS).fetchall()
+        self.assertEqual(query_stats.snapshot(), [])
+
+    def test_hooks(self):
+        """Test that added hooks receive every finished statement."""
+        calls = []
+        hook = lambda sql, seconds, rows: calls.append((sql, rows))
+        query_stats.add_hook(hook)
+        try:
+            self.connection.execute("SELECT 1 UNION ALL SELECT 2").fetchall()
+        finally:
+            query_stats.remove_hook(hook)
+        self.assertEqual(calls, [("SELECT 1 UNION ALL SELECT 2", 2)])
+
+    def test_slow_query_plan(self):
+        """Test that slow statements are logged with their query plan."""
+        query_stats.configure(slow_query_ms=0)
+        with self.assertLogs('query_stats', level='WARNING'):
+            self.connection.execute(GET_HABITS).fetchall()
+        entry = query_stats.slow_queries[-1]
+        self.assertEqual(entry['query'], 'GET_HABITS')
+        self.assertTrue(any('habits' in step or ' h' in step for step in entry['plan']))
+
+    def test_prometheus(self):
+        """Test the Prometheus text export."""
+        self.connection.execute(GET_HABITS).fetchall()
+        text = query_stats.to_prometheus()
+        self.assertIn('# TYPE habits_query_calls_total counter', text)
+        self.assertIn('habits_query_calls_total{query="GET_HABITS"} 1', text)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_unknown_setting(self):
+        """Test that unknown settings are rejected."""
+        with self.assertRaises(ValueError):
+            query_stats.configure(slow_ms=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,17 @@
 import unittest
 import sqlite3
-from datetime import datetime
-from database_and_sql import ADD_HABIT, DELETE_HABIT, ADD_COMPLETION, GET_HABITS, GET_COMPLETIONS, GET_MAX_COMPLETION_DATE
+import random
+import threading
+from datetime import datetime, date, timedelta
+from database_and_sql import ADD_HABIT, DELETE_HABIT, ADD_COMPLETION, GET_HABITS, GET_COMPLETIONS, GET_MAX_COMPLETION_DATE, \
+    GET_HABITS_WITH_COMPLETIONS, CREATE_HABITS_TABLE, CREATE_COMPLETIONS_TABLE, SCHEMA_VERSION, create_schema, migrate_db, \
+    UPSERT_STREAK, GET_HABIT_STREAKS, GET_STREAK_STATES, GET_HABIT_IDS, rebuild_streaks
+from database_and_sql import DB_SETTINGS, configure_db, get_connection, close_connection, transaction, \
+    execute_query, execute_many, habit_page_query, ADD_COMPLETION_BY_ID
+from streak_sql import GET_STREAKS
+from classes import Habit, Tracker, HabitPager
+from test_support import TemporaryDatabaseTestCase
+from streak_calculation import calculate_streak_days, calculate_streak_weeks
 
 class TestHabitDatabase(unittest.TestCase):
 
@@ -12,19 +22,8 @@ class TestHabitDatabase(unittest.TestCase):
         self.connection.execute("PRAGMA foreign_keys = ON;")
         self.cursor = self.connection.cursor()
 
-        # Create tables
-        self.cursor.execute('''CREATE TABLE habits (
-                                id INTEGER PRIMARY KEY,
-                                name TEXT UNIQUE,
-                                frequency TEXT,
-                                created_at TEXT NOT NULL)''')
-
-        self.cursor.execute('''CREATE TABLE completions (
-                                id INTEGER,
-                                completed_at TEXT NOT NULL,
-                                FOREIGN KEY (id) REFERENCES habits (id) ON DELETE CASCADE)''')
-
-        self.connection.commit()
+        # Create tables with the current schema version
+        create_schema(self.connection)
 
     def tearDown(self):
         """Close the database connection after each test."""
@@ -66,11 +65,11 @@ class TestHabitDatabase(unittest.TestCase):
         self.cursor.execute(ADD_COMPLETION, ("Exercise", completed_at))
         self.connection.commit()
 
-        # Verify the completion was added
-        self.cursor.execute("""SELECT completed_at FROM completions
+        # Verify the completion was added, completions are stored per day
+        self.cursor.execute("""SELECT day FROM completions
                                WHERE id = (SELECT id FROM habits WHERE name = ?)""", ("Exercise",))
         completion = self.cursor.fetchone()
-        self.assertEqual(completion[0], completed_at)
+        self.assertEqual(completion[0], datetime.fromisoformat(completed_at).toordinal())
 
     def test_get_habits(self):
         """Test retrieving all habits."""
@@ -96,9 +95,9 @@ class TestHabitDatabase(unittest.TestCase):
         self.cursor.execute(GET_COMPLETIONS, ("Exercise",))
         completions = self.cursor.fetchall()
 
-        # Verify the correct completion is retrieved
+        # Verify the correct completion is retrieved as an ISO date
         self.assertEqual(len(completions), 1)
-        self.assertEqual(completions[0][0], completed_at)
+        self.assertEqual(completions[0][0], completed_at[:10])
 
     def test_get_max_completion_date(self):
         """Test retrieving the latest completion date for a specific habit."""
@@ -113,7 +112,513 @@ class TestHabitDatabase(unittest.TestCase):
         max_date = self.cursor.fetchone()
 
         # Verify the latest completion date
-        self.assertEqual(max_date[0], completed_at_2)
+        self.assertEqual(max_date[0], completed_at_2[:10])
+
+    def test_get_habits_with_completions(self):
+        """Test retrieving all habits with their ordered completions in one query."""
+        self.cursor.execute(ADD_HABIT, ("Exercise", "daily", "2024-12-01"))
+        self.cursor.execute(ADD_HABIT, ("Read", "weekly", "2024-12-01"))
+        self.cursor.execute(ADD_COMPLETION, ("Exercise", "2024-12-30"))
+        self.cursor.execute(ADD_COMPLETION, ("Exercise", "2024-12-29"))
+        self.connection.commit()
+
+        self.cursor.execute(GET_HABITS_WITH_COMPLETIONS)
+        rows = [row[1:] for row in self.cursor.fetchall()]
+
+        # Verify completions are ordered by date and habits without completions are kept
+        self.assertEqual(rows, [
+            ("Exercise", "daily", "2024-12-01", "2024-12-29"),
+            ("Exercise", "daily", "2024-12-01", "2024-12-30"),
+            ("Read", "weekly", "2024-12-01", None),
+        ])
+
+
+    def test_completion_unique_per_period(self):
+        """Test that a habit can only be completed once per day, or once per ISO week for weekly habits."""
+        self.cursor.execute(ADD_HABIT, ("Exercise", "daily", "2024-12-01"))
+        self.cursor.execute(ADD_HABIT, ("Read", "weekly", "2024-12-01"))
+        self.cursor.execute(ADD_COMPLETION, ("Exercise", "2024-12-30T08:00:00"))
+        self.cursor.execute(ADD_COMPLETION, ("Read", "2024-12-30"))  # Monday, week 1 of 2025
+        self.connection.commit()
+
+        # A second completion of the period changes no row
+        self.assertEqual(self.cursor.execute(ADD_COMPLETION, ("Exercise", "2024-12-30T18:00:00")).rowcount, 0)
+        self.assertEqual(self.cursor.execute(ADD_COMPLETION, ("Read", "2025-01-05")).rowcount, 0)  # Sunday, same week
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.cursor.execute("INSERT INTO completions (id, day, period) SELECT id, day + 1, period FROM completions")
+
+        # The next week is a new period
+        self.cursor.execute(ADD_COMPLETION, ("Read", "2025-01-06"))
+        self.cursor.execute("SELECT COUNT(*) FROM completions")
+        self.assertEqual(self.cursor.fetchone()[0], 3)
+
+    def test_migrate_unversioned_db(self):
+        """Test upgrading a database file created before schema versioning."""
+        connection = sqlite3.connect(':memory:')
+        connection.execute(CREATE_HABITS_TABLE)
+        connection.execute(CREATE_COMPLETIONS_TABLE)
+        connection.execute(ADD_HABIT, ("Exercise", "daily", "2024-12-01"))
+        connection.execute(ADD_HABIT, ("Read", "weekly", "2024-12-01"))
+        connection.executemany("INSERT INTO completions (id, completed_at) VALUES (?, ?)", [
+            (1, "2024-12-29"), (1, "2024-12-29"), (1, "2024-12-30"),
+            (2, "2024-12-30"), (2, "2025-01-02"),
+        ])
+        connection.commit()
+
+        self.assertEqual(migrate_db(connection), 0)
+
+        # Verify the version, the periods and that duplicates per period were removed
+        self.assertEqual(connection.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+        rows = connection.execute("SELECT id, day, period FROM completions ORDER BY id, day")
+        day_1, day_2 = date(2024, 12, 29).toordinal(), date(2024, 12, 30).toordinal()
+        self.assertEqual(rows.fetchall(), [
+            (1, day_1, day_1),
+            (1, day_2, day_2),
+            (2, day_2, (day_2 - 1) // 7),
+        ])
+        self.assertEqual(connection.execute(GET_COMPLETIONS, ("Exercise",)).fetchall(),
+                         [("2024-12-29",), ("2024-12-30",)])
+
+        # Verify the completions lookup is answered from the composite index
+        plan = connection.execute("EXPLAIN QUERY PLAN " + GET_COMPLETIONS, ("Exercise",)).fetchall()
+        self.assertTrue(any("COVERING INDEX idx_completions_habit_day" in row[-1] for row in plan))
+
+        # Verify the streaks were rebuilt from the converted completions
+        self.assertEqual(connection.execute(GET_STREAK_STATES).fetchall(), [
+            (1, 2, 2, "2024-12-30", "2024-12-29"),
+            (2, 1, 1, "2024-12-30", "2024-12-30"),
+        ])
+
+        # Running the upgrade again is a no-op
+        self.assertEqual(migrate_db(connection), SCHEMA_VERSION)
+        connection.close()
+
+    def test_upsert_streak(self):
+        """Test that the stored streak is advanced per completion like the reference calculation."""
+        self.cursor.execute(ADD_HABIT, ("Exercise", "daily", "2024-12-01"))
+        self.cursor.execute(ADD_HABIT, ("Read", "weekly", "2024-12-01"))
+        for habit_name, completed_at in [("Exercise", "2024-12-10"), ("Exercise", "2024-12-11"),
+                                         ("Exercise", "2024-12-12"), ("Exercise", "2024-12-15"),
+                                         ("Exercise", "2024-12-16"), ("Read", "2024-12-10"),
+                                         ("Read", "2024-12-17")]:
+            self.cursor.execute(ADD_COMPLETION, (habit_name, completed_at))
+            self.cursor.execute(UPSERT_STREAK, (habit_name, completed_at))
+        self.connection.commit()
+
+        self.cursor.execute(GET_HABIT_STREAKS)
+        self.assertEqual(self.cursor.fetchall(), [
+            ("Exercise", "daily", "2024-12-01", "2024-12-16", 2, 3),
+            ("Read", "weekly", "2024-12-01", "2024-12-17", 2, 2),
+        ])
+
+        # Verify the incremental state matches a full rebuild, including the run start
+        self.assertEqual(rebuild_streaks(self.connection, check_only=True), [])
+        self.cursor.execute(GET_STREAK_STATES)
+        self.assertEqual(self.cursor.fetchall()[0], (1, 2, 3, "2024-12-16", "2024-12-15"))
+
+    def test_rebuild_streaks_drift(self):
+        """Test that a rebuild reports and corrects drifted streaks."""
+        self.cursor.execute(ADD_HABIT, ("Exercise", "daily", "2024-12-01"))
+        self.cursor.execute(ADD_COMPLETION, ("Exercise", "2024-12-10"))
+        self.cursor.execute(ADD_COMPLETION, ("Exercise", "2024-12-11"))
+        self.connection.commit()
+
+        # Completions were added without maintaining the streak
+        self.assertEqual(rebuild_streaks(self.connection, check_only=True), ["Exercise"])
+        self.assertEqual(rebuild_streaks(self.connection), ["Exercise"])
+        self.assertEqual(rebuild_streaks(self.connection, check_only=True), [])
+
+        # Deleting the habit removes its stored streak
+        self.cursor.execute(DELETE_HABIT, ("Exercise",))
+        self.cursor.execute(GET_STREAK_STATES)
+        self.assertEqual(self.cursor.fetchall(), [])
+
+    def test_get_streaks(self):
+        """Test that the streaks computed in SQL match the reference streak calculation."""
+        rng = random.Random(7)
+        expected = []
+        for i in range(30):
+            habit_name = f"habit_{i:02}"
+            frequency = 'weekly' if i % 3 == 0 else 'daily'
+            step = 7 if frequency == 'weekly' else 1
+            self.cursor.execute(ADD_HABIT, (habit_name, frequency, "2024-01-01"))
+
+            completions = [((date(2024, 1, 1) + timedelta(days=day)).isoformat(),)
+                           for day in range(0, 90, step) if rng.random() < 0.7]
+            self.cursor.executemany(ADD_COMPLETION, [(habit_name, row[0]) for row in completions])
+
+            calculate = calculate_streak_weeks if frequency == 'weekly' else calculate_streak_days
+            last_at = completions[-1][0] if completions else None
+            expected.append((habit_name, frequency, "2024-01-01", last_at) + calculate(completions))
+        self.connection.commit()
+
+        self.cursor.execute(GET_STREAKS)
+        self.assertEqual(self.cursor.fetchall(), expected)
+
+
+class TestConnectionProvider(TemporaryDatabaseTestCase):
+
+    def test_connection_settings(self):
+        """Test that connections use WAL journaling and the configured pragmas."""
+        connection = get_connection()
+        self.assertIs(connection, get_connection())
+        self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(connection.execute("PRAGMA busy_timeout").fetchone()[0], DB_SETTINGS['busy_timeout'])
+        self.assertEqual(connection.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+
+        with self.assertRaises(ValueError):
+            configure_db(page_size=4096)
+
+    def test_connection_per_thread(self):
+        """Test that every thread writes through its own connection without lock errors."""
+        main_connection = get_connection()
+        main_connection.execute(ADD_HABIT, ("Exercise", "daily", "2024-12-01"))
+        main_connection.commit()
+        errors = []
+        connections = []
+
+        def complete(day):
+            try:
+                connection = get_connection()
+                connections.append(connection)
+                connection.execute(ADD_COMPLETION, ("Exercise", f"2024-12-{day:02}"))
+                connection.commit()
+            except sqlite3.Error as error:
+                errors.append(error)
+            finally:
+                close_connection()
+
+        threads = [threading.Thread(target=complete, args=(day,)) for day in range(1, 21)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertNotIn(main_connection, connections)
+        self.assertEqual(main_connection.execute("SELECT COUNT(*) FROM completions").fetchone()[0], 20)
+
+    def test_concurrent_completion(self):
+        """Test that a habit completed by several clients at once is recorded and counted once."""
+        for name, frequency in (("Read", "daily"), ("Run", "weekly")):
+            Habit(name, frequency).add_new()
+        results = {"Read": [], "Run": []}
+        start = threading.Barrier(16)
+
+        def complete(name, frequency):
+            try:
+                start.wait()
+                results[name].append(Habit(name, frequency).add_completion())
+            finally:
+                close_connection()
+
+        threads = [threading.Thread(target=complete, args=habit) for habit in (("Read", "daily"), ("Run", "weekly")) * 8]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for name in results:
+            self.assertEqual(sorted(results[name]), [False] * 7 + [True])
+            self.assertEqual(len(Tracker.get_completion_days(name)), 1)
+        self.assertEqual({habit[0]: habit[4:] for habit in Tracker.get_all_habit_streaks()},
+                         {"Read": (1, 1), "Run": (1, 1)})
+        self.assertFalse(Habit("Read", "daily").add_completion())
+
+    def test_transaction(self):
+        """Test that a transaction block commits once and rolls back all its writes on error."""
+        with transaction() as connection:
+            execute_query(ADD_HABIT, ("Exercise", "daily", "2024-12-01"))
+            with transaction():
+                execute_query(ADD_COMPLETION, ("Exercise", "2024-12-01"))
+            # Nested blocks and reads do not commit
+            self.assertEqual(execute_query(GET_COMPLETIONS, ("Exercise",), fetch=True), [("2024-12-01",)])
+            self.assertTrue(connection.in_transaction)
+        self.assertFalse(get_connection().in_transaction)
+
+        with self.assertRaises(RuntimeError):
+            with transaction():
+                execute_many(ADD_COMPLETION, [("Exercise", "2024-12-02"), ("Exercise", "2024-12-03")])
+                raise RuntimeError("abort")
+        self.assertEqual(execute_query(GET_COMPLETIONS, ("Exercise",), fetch=True), [("2024-12-01",)])
+
+
+class TestBulkCompletions(TemporaryDatabaseTestCase):
+
+    def test_add_completions(self):
+        """Test backfilling completions for many habits with deduplication per period."""
+        execute_many(ADD_HABIT, [("Exercise", "daily", "2024-12-01"), ("Read", "weekly", "2024-12-01")])
+        rows = [("Exercise", date(2024, 12, day)) for day in range(1, 11)]
+        rows += [("Exercise", "2024-12-05T20:00:00"),  # same day as an earlier row
+                 ("Read", "2024-12-02"), ("Read", datetime(2024, 12, 8, 9)),  # same ISO week
+                 ("Read", "2024-12-09"), ("Walk", "2024-12-01"), ("Read", "not a date")]
+
+        result = Tracker.add_completions(iter(rows), chunk_size=4)
+
+        self.assertEqual(result['inserted'], 12)
+        self.assertEqual(result['rejected'], {'unknown_habit': 1, 'invalid_date': 1, 'duplicate': 2})
+        self.assertGreater(result['rows_per_second'], 0)
+
+        # Verify the stored streaks were brought up to date
+        self.assertEqual(Tracker.get_all_habit_streaks(), [
+            ("Exercise", "daily", "2024-12-01", "2024-12-10", 10, 10),
+            ("Read", "weekly", "2024-12-01", "2024-12-09", 2, 2),
+        ])
+
+    def test_completion_period_from_stored_frequency(self):
+        """Test that completions by habit id take the period from the frequency stored with the habit."""
+        execute_many(ADD_HABIT, [("Read", "weekly", "2024-12-01")])
+        habit_id = execute_query(GET_HABIT_IDS, fetch=True)[0][1]
+        with transaction() as connection:
+            inserted = connection.executemany(ADD_COMPLETION_BY_ID, [(habit_id, "2024-12-02"), (habit_id, "2024-12-08"),
+                                                                     (habit_id, "2024-12-09"), (habit_id + 1, "2024-12-09")])
+        self.assertEqual(inserted.rowcount, 2)
+        self.assertEqual(Tracker.get_completion_days("Read"), [("2024-12-02",), ("2024-12-09",)])
+
+    def test_add_completions_rebuilds_changed_habits(self):
+        """Test that a backfill only recomputes the streaks of the habits that got new completions."""
+        execute_many(ADD_HABIT, [("Exercise", "daily", "2024-12-01"), ("Read", "weekly", "2024-12-01")])
+        Tracker.add_completions([("Exercise", "2024-12-01"), ("Read", "2024-12-02")])
+        execute_query("UPDATE streaks SET longest_streak = 5 WHERE id = (SELECT id FROM habits WHERE name = 'Read')")
+
+        result = Tracker.add_completions([("Exercise", "2024-12-02"), ("Read", "2024-12-03")], chunk_size=1)
+
+        self.assertEqual(result['rejected']['duplicate'], 1)
+        self.assertEqual([row[4:] for row in Tracker.get_all_habit_streaks()], [(2, 2), (1, 5)])
+        self.assertEqual(Tracker.rebuild_streaks(check_only=True), ["Read"])
+
+
+class TestHabitPager(TemporaryDatabaseTestCase):
+
+    def setUp(self):
+        """Create habits with different streaks and last completions."""
+        super().setUp()
+        execute_many(ADD_HABIT, [(f"habit_{i:03}", 'weekly' if i % 4 == 0 else 'daily', "2024-01-01")
+                                 for i in range(250)])
+        Tracker.add_completions((f"habit_{i:03}", date(2024, 1, 1) + timedelta(days=day))
+                                for i in range(250) if i % 10 for day in range(i % 7, i % 13 + 5))
+        self.habits = Tracker.get_all_habit_streaks()
+
+    def test_pages_sorted_in_database(self):
+        """Test that sequential and random page reads return the same rows as sorting in Python."""
+        sort_values = {
+            'name': lambda habit: habit[0],
+            'longest_streak': lambda habit: habit[5],
+            'last_completion': lambda habit: habit[3] or '',
+        }
+        ids = {habit_name: habit_id for habit_name, habit_id, _ in execute_query(GET_HABIT_IDS, fetch=True)}
+
+        for sort_by, sort_value in sort_values.items():
+            for descending in (False, True):
+                for frequency in (None, 'weekly'):
+                    habits = [habit for habit in self.habits if frequency in (None, habit[1])]
+                    expected = sorted(habits, key=lambda habit: (sort_value(habit), ids[habit[0]]), reverse=descending)
+                    expected = [habit[0] for habit in expected]
+
+                    # sequential reads continue with keyset pagination
+                    pager = HabitPager(frequency, sort_by, descending, page_size=30, cache_pages=2)
+                    self.assertEqual(pager.count(), len(expected))
+                    rows = [values[1] for _, values in pager.get_rows(0, len(expected) + 10)]
+                    self.assertEqual(rows, expected)
+
+                    # jumps into the middle use an offset
+                    pager = HabitPager(frequency, sort_by, descending, page_size=30, cache_pages=2)
+                    rows = [values[1] for _, values in pager.get_rows(45, 75)]
+                    self.assertEqual(rows, expected[45:75])
+                    self.assertLessEqual(len(pager.pages), 2)
+
+    def test_prefix_search_and_created_sort(self):
+        """Test that the name search and the creation date order run in the database, filters use indexes."""
+        execute_query(ADD_HABIT, ("habit_x", "weekly", "2023-06-01"))
+        pager = HabitPager('weekly', 'created_at', prefix="habit_1", page_size=7)
+        expected = sorted(name for name, frequency, *_ in self.habits
+                          if frequency == 'weekly' and name.startswith("habit_1"))
+        self.assertEqual(pager.count(), len(expected))
+        self.assertEqual([values[1] for _, values in pager.get_rows(0, 100)], expected)
+
+        pager = HabitPager(sort_by='created_at', page_size=7)
+        self.assertEqual(pager.get_rows(0, 1)[0][1][:2], ("2023-06-01", "habit_x"))
+        self.assertEqual(HabitPager(prefix="habit_x").count(), 1)
+        self.assertEqual(HabitPager(prefix="missing").get_rows(0, 10), [])
+
+        params = {'frequency': 'daily', 'prefix': 'a', 'prefix_end': 'b', 'limit': 10, 'offset': 0}
+        for query, index in ((habit_page_query('name', frequency=True), "idx_habits_frequency_name"),
+                             (habit_page_query('created_at', frequency=True), "idx_habits_frequency_created"),
+                             (habit_page_query('longest_streak', frequency=True), "idx_streaks_longest")):
+            plan = " ".join(row[3] for row in get_connection().execute(f"EXPLAIN QUERY PLAN {query}", params))
+            self.assertIn(index, plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_habit_row_update(self):
+        """Test that a single changed habit is read and replaced in the cached pages."""
+        pager = HabitPager(page_size=30)
+        habit_id, values = pager.get_rows(0, 1)[0]
+        self.assertEqual(values[1], "habit_000")
+
+        with transaction() as connection:
+            connection.execute(UPSERT_STREAK, ("habit_000", "2024-02-01"))
+        row = Tracker.get_habit_row("habit_000")
+        self.assertEqual(row[0], habit_id)
+        self.assertEqual(row[1][4], 1)
+
+        pager.replace_row(*row)
+        self.assertEqual(pager.get_rows(0, 1), [row])
+        self.assertIsNone(Tracker.get_habit_row("missing"))
+
+    def test_pages_expire_with_the_day(self):
+        """Test that cached pages are read again once the day changed, the habit states depend on it."""
+        pager = HabitPager(page_size=30)
+        page = pager.get_page(0)
+        self.assertIs(pager.get_page(0), page)
+
+        pager.day = date.today() - timedelta(days=1)
+        self.assertIsNot(pager.get_page(0), page)
+        self.assertEqual(pager.day, date.today())
+
+
+class TestHabitSet(TemporaryDatabaseTestCase):
+
+    def setUp(self):
+        """Create habits with and without completions."""
+        super().setUp()
+        execute_many(ADD_HABIT, [(f"habit_{i:02}", 'weekly' if i % 3 == 0 else 'daily', "2024-01-01")
+                                 for i in range(30)])
+        Tracker.add_completions((f"habit_{i:02}", date(2024, 1, 1) + timedelta(days=day))
+                                for i in range(30) if i % 5 for day in range(0, 40, i % 4 + 1))
+
+    def test_matches_tracker(self):
+        """Test that the columnar set holds the same habits, completions and streaks as the database."""
+        habit_set = Tracker.get_habit_set()
+        habits = list(Tracker.get_all_habits_with_completions())
+        streaks = {habit[0]: habit for habit in Tracker.get_all_habit_streaks()}
+
+        self.assertEqual(len(habit_set), len(habits))
+        current_streaks, longest_streaks = habit_set.streaks()
+        for index, (name, frequency, created_at, last_at, completions) in enumerate(habits):
+            self.assertEqual(habit_set.names[index], name)
+            self.assertEqual(habit_set.frequency(index), frequency)
+            self.assertEqual([date.fromordinal(day).isoformat() for day in habit_set.completion_days(index)],
+                             [row[0] for row in completions])
+            self.assertEqual((current_streaks[index], longest_streaks[index]), streaks[name][4:6])
+            self.assertEqual(habit_set.row_values(index)[:6], (created_at, name, frequency) +
+                             habit_set.row_values(index)[3:5] + (last_at,))
+
+        habit = habit_set.habit(1)
+        self.assertEqual((habit.name, habit.frequency, habit.completed_at), (habits[1][0], habits[1][1], habits[1][3]))
+
+    def test_compact(self):
+        """Test that habits keep no per instance dict and completions share one buffer."""
+        self.assertFalse(hasattr(Habit("Read", "daily"), '__dict__'))
+        habit_set = Tracker.get_habit_set()
+        self.assertEqual(habit_set.days.typecode, 'q')
+        self.assertEqual(len(habit_set.offsets), len(habit_set) + 1)
+        self.assertEqual(habit_set.offsets[-1], len(habit_set.days))
+
+
+class TestRollups(TemporaryDatabaseTestCase):
+
+    def setUp(self):
+        """Create a daily habit created on a Monday and a weekly habit created on the Wednesday after."""
+        super().setUp()
+        execute_many(ADD_HABIT, [("Read", "daily", "2024-01-01"), ("Run", "weekly", "2024-01-03")])
+        Tracker.add_completions([("Read", "2024-01-01"), ("Read", "2024-01-02"), ("Read", "2024-01-03"),
+                                 ("Read", "2024-01-31"), ("Read", "2024-02-01"), ("Run", "2024-01-05"),
+                                 ("Run", "2024-01-08")])
+
+    def rollups(self):
+        connection = get_connection()
+        return (connection.execute("SELECT * FROM completion_weeks ORDER BY id, week").fetchall(),
+                connection.execute("SELECT * FROM completion_months ORDER BY id, month").fetchall())
+
+    def test_maintained_on_write(self):
+        """Test that the triggers keep the rollups equal to a rebuild from the completions."""
+        Habit("Read", "daily").add_completion()
+        Habit("Gym", "daily").add_new()
+        Habit("Gym", "daily").add_completion()
+        maintained = self.rollups()
+        self.assertEqual(sum(row[2] for row in maintained[0]), 9)
+        self.assertEqual(sum(row[2] for row in maintained[1]), 9)
+
+        Tracker.rebuild_rollups()
+        self.assertEqual(self.rollups(), maintained)
+
+        with transaction() as connection:
+            connection.execute("DELETE FROM completions WHERE day = ?", (date(2024, 1, 8).toordinal(),))
+        Habit("Gym", "daily").delete()
+        weeks, months = self.rollups()
+        Tracker.rebuild_rollups()
+        self.assertEqual(self.rollups(), (weeks, months))
+        self.assertEqual(len(weeks), 4)
+
+    def test_completion_rates(self):
+        """Test the completions, possible completions and rates per week and month."""
+        self.assertEqual(Tracker.get_completion_rates("2024-01-03", "2024-01-14"), [
+            ("2024-01-01", 4, 8, 4 / 8),
+            ("2024-01-08", 1, 8, 1 / 8),
+        ])
+        self.assertEqual(Tracker.get_completion_rates(date(2024, 1, 1), date(2024, 2, 29), 'week', "Read")[0],
+                         ("2024-01-01", 3, 7, 3 / 7))
+        months = Tracker.get_completion_rates("2024-01-15", "2024-02-15", period='month', habit_name="Read")
+        self.assertEqual(months, [("2024-01-01", 4, 31, 4 / 31), ("2024-02-01", 1, 29, 1 / 29)])
+        months = Tracker.get_completion_rates("2024-01-15", "2024-02-15", period='month', habit_name="Run")
+        self.assertEqual(months, [("2024-01-01", 2, 4, 2 / 4), ("2024-02-01", 0, 5, 0.0)])
+
+        future = date.today() + timedelta(days=400)
+        self.assertEqual(Tracker.get_completion_rates(future, future, 'month')[0][1:], (0, 0, 0.0))
+        self.assertEqual(Tracker.get_completion_rates("2024-01-01", "2024-01-31", habit_name="missing"), [])
+        with self.assertRaises(ValueError):
+            Tracker.get_completion_rates("2024-01-01", "2024-01-31", period='day')
+
+    def test_weekly_rates_in_partial_weeks(self):
+        """Test that a weekly habit can be completed once in its creation week and in the current week."""
+        today = date.today()
+        monday = (today - timedelta(days=today.weekday())).isoformat()
+        thursday = date.fromisoformat(monday) + timedelta(days=3)
+        habit = Habit("Swim", "weekly")
+        habit.add_new()
+        habit.add_completion()
+        self.assertEqual(Tracker.get_completion_rates(today, today, 'week', "Swim"), [(monday, 1, 1, 1.0)])
+        self.assertEqual(Tracker.get_completion_rates(thursday, thursday, 'month', "Swim"),
+                         [(thursday.replace(day=1).isoformat(), 1, 1, 1.0)])
+
+        self.assertEqual(Tracker.get_completion_rates(today, today, 'week', "Run"), [(monday, 0, 1, 0.0)])
+        Habit("Run", "weekly").add_completion()
+        self.assertEqual(Tracker.get_completion_rates(today, today, 'week', "Run"), [(monday, 1, 1, 1.0)])
+        self.assertEqual(Tracker.get_completion_rates(today, today, 'week'),
+                         [(monday, 2, today.weekday() + 3, 2 / (today.weekday() + 3))])
+
+    def test_weekly_habit_kept_across_months(self):
+        """Test that a weekly habit completed in every week has a rate of 1.0 in every month and week."""
+        execute_many(ADD_HABIT, [("Swim", "weekly", "2024-01-01"), ("Climb", "weekly", "2024-01-01")])
+        mondays = [date(2024, 1, 1) + timedelta(weeks=week) for week in range(26)]
+        # Swim is written one completion at a time by the triggers, Climb in bulk with the triggers turned off
+        execute_many(ADD_COMPLETION, [("Swim", (monday + timedelta(days=6)).isoformat()) for monday in mondays])
+        Tracker.add_completions(("Climb", monday) for monday in mondays)
+        self.assertEqual(get_connection().execute("SELECT COUNT(*) FROM bulk_load").fetchone()[0], 0)
+
+        for name in ("Swim", "Climb"):
+            months = Tracker.get_completion_rates("2024-01-01", "2024-06-30", 'month', name)
+            self.assertEqual([month for month, _, _, _ in months],
+                             [date(2024, month, 1).isoformat() for month in range(1, 7)])
+            self.assertEqual([rate for _, _, _, rate in months], [1.0] * 6)
+            # February 2024 has five Thursdays, the week of Monday February 26th ends in March
+            self.assertEqual(months[1][1:3], (5, 5))
+            weeks = Tracker.get_completion_rates("2024-01-01", "2024-06-23", 'week', name)
+            self.assertEqual([rate for _, _, _, rate in weeks], [1.0] * 25)
+
+        maintained = self.rollups()
+        Tracker.rebuild_rollups()
+        self.assertEqual(self.rollups(), maintained)
+
+    def test_weekday_heatmap(self):
+        """Test the completions per week and weekday."""
+        self.assertEqual(Tracker.get_weekday_heatmap("2024-01-01", "2024-01-08"), [
+            ("2024-01-01", (1, 1, 1, 0, 1, 0, 0)),
+            ("2024-01-08", (1, 0, 0, 0, 0, 0, 0)),
+        ])
+        self.assertEqual(Tracker.get_weekday_heatmap("2024-01-29", "2024-01-29", "Read"),
+                         [("2024-01-29", (0, 0, 1, 1, 0, 0, 0))])
+
 
 
 if __name__ == '__main__':
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+# Import time allowed for the modules used by headless tools and tests
+STARTUP_BUDGET_SECONDS = 0.5
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_CHECK = """
+import time
+started = time.perf_counter()
+import streak_calculation
+import classes
+elapsed = time.perf_counter() - started
+
+import database_and_sql
+print(elapsed)
+print(getattr(database_and_sql._local, 'connection', None) is None)
+"""
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_imports_without_io(self):
+        """Test that importing classes and streak_calculation opens no database and stays in the startup budget."""
+        with tempfile.TemporaryDirectory() as directory:
+            environment = dict(os.environ, PYTHONPATH=PROJECT_DIR, HABITS_DB=os.path.join(directory, 'habits.db'))
+            result = subprocess.run([sys.executable, "-c", IMPORT_CHECK], cwd=directory, env=environment,
+                                    capture_output=True, text=True, check=True)
+            files = os.listdir(directory)
+
+        elapsed, no_connection = result.stdout.split()
+        self.assertEqual(files, [])
+        self.assertEqual(no_connection, "True")
+        self.assertLess(float(elapsed), STARTUP_BUDGET_SECONDS)
+
+
+if __name__ == '__main__':
+    unittest.main()
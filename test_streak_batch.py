@@ -0,0 +1,90 @@
+import random
+import sqlite3
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+
+import streak_batch
+from database_and_sql import ADD_HABIT, ADD_COMPLETION, create_schema
+from streak_batch import calculate_streaks_batch, load_completion_arrays
+from streak_calculation import calculate_streak_days, calculate_streak_weeks
+
+
+class TestStreakBatch(unittest.TestCase):
+
+    def setUp(self):
+        """Create random completion histories for daily and weekly habits."""
+        rng = random.Random(42)
+        start = date(2024, 1, 1)
+        self.frequencies = []
+        self.histories = []
+
+        for i in range(60):
+            frequency = 'weekly' if i % 3 == 0 else 'daily'
+            step = 7 if frequency == 'weekly' else 1
+            days = [start + timedelta(days=day) for day in range(0, 120, step) if rng.random() < 0.7]
+            self.frequencies.append(frequency)
+            self.histories.append(days)
+
+        self.day_ordinals = [day.toordinal() for days in self.histories for day in days]
+        self.offsets = [0]
+        for days in self.histories:
+            self.offsets.append(self.offsets[-1] + len(days))
+
+    def expected_streaks(self):
+        """Calculate the streaks of every habit with the scalar streak functions."""
+        current_streaks, longest_streaks = [], []
+        for frequency, days in zip(self.frequencies, self.histories):
+            completions = [(day.isoformat(),) for day in days]
+            calculate = calculate_streak_weeks if frequency == 'weekly' else calculate_streak_days
+            current_streak, longest_streak = calculate(completions)
+            current_streaks.append(current_streak)
+            longest_streaks.append(longest_streak)
+        return current_streaks, longest_streaks
+
+    @unittest.skipIf(streak_batch.np is None, "NumPy is not installed")
+    def test_batch_matches_scalar(self):
+        """Test that the vectorized streaks match the scalar streak functions."""
+        result = calculate_streaks_batch(self.day_ordinals, self.offsets, self.frequencies)
+        self.assertEqual(result, self.expected_streaks())
+
+    @unittest.skipIf(streak_batch.np is None, "NumPy is not installed")
+    def test_batch_datetime64(self):
+        """Test that datetime64 completion days give the same streaks as day ordinals."""
+        days = streak_batch.np.array([day.isoformat() for days in self.histories for day in days],
+                                     dtype='datetime64[D]')
+        result = calculate_streaks_batch(days, self.offsets, self.frequencies)
+        self.assertEqual(result, self.expected_streaks())
+
+    def test_fallback_matches_scalar(self):
+        """Test that the streaks are calculated without NumPy."""
+        with mock.patch.object(streak_batch, 'np', None):
+            result = calculate_streaks_batch(self.day_ordinals, self.offsets, self.frequencies)
+        self.assertEqual(result, self.expected_streaks())
+
+    def test_batch_empty(self):
+        """Test habits without completions and an empty portfolio."""
+        self.assertEqual(calculate_streaks_batch([], [0, 0, 0], ['daily', 'weekly']), ([0, 0], [0, 0]))
+        self.assertEqual(calculate_streaks_batch([], [0], []), ([], []))
+
+    def test_load_completion_arrays(self):
+        """Test reading the completion history of all habits into flat arrays."""
+        connection = sqlite3.connect(':memory:')
+        create_schema(connection)
+        connection.execute(ADD_HABIT, ("Exercise", "daily", "2024-12-01"))
+        connection.execute(ADD_HABIT, ("Read", "weekly", "2024-12-01"))
+        connection.execute(ADD_COMPLETION, ("Exercise", "2024-12-11"))
+        connection.execute(ADD_COMPLETION, ("Exercise", "2024-12-10"))
+
+        names, frequencies, day_ordinals, offsets = load_completion_arrays(connection)
+        connection.close()
+
+        self.assertEqual(names, ["Exercise", "Read"])
+        self.assertEqual(frequencies, ["daily", "weekly"])
+        self.assertEqual(list(day_ordinals), [date(2024, 12, 10).toordinal(), date(2024, 12, 11).toordinal()])
+        self.assertEqual(list(offsets), [0, 2, 2])
+        self.assertEqual(calculate_streaks_batch(day_ordinals, offsets, frequencies), ([2, 0], [2, 0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
 import unittest
-from streak_calculation import calculate_streak_days, calculate_streak_weeks
+from datetime import date
+from streak_calculation import calculate_streak_days, calculate_streak_weeks, calculate_streak_ordinals, \
+    determine_habit_state
 
 
 class TestStreakCalculations(unittest.TestCase):
@@ -83,6 +85,30 @@ class TestStreakCalculations(unittest.TestCase):
         ]
         self.assertEqual(calculate_streak_weeks(completions), (2, 3))
 
+    def test_calculate_streak_ordinals(self):
+        """Test that calculate_streak_ordinals matches the streak calculation on ISO dates."""
+        days = ["2024-12-10", "2024-12-11", "2024-12-17", "2024-12-24", "2024-12-25", "2025-01-14", "2025-01-21"]
+        ordinals = [date.fromisoformat(day).toordinal() for day in days]
+        completions = [(day,) for day in days]
+        self.assertEqual(calculate_streak_ordinals([], 1), (0, 0))
+        self.assertEqual(calculate_streak_ordinals(ordinals, 1), calculate_streak_days(completions))
+        self.assertEqual(calculate_streak_ordinals(ordinals, 7), calculate_streak_weeks(completions))
+
+    def test_determine_habit_state_daily(self):
+        """Test determine_habit_state for daily habits completed today, yesterday and before."""
+        today = date(2025, 1, 8)
+        self.assertEqual(determine_habit_state('daily', "2025-01-08", 3, today), ("Streak - Keep on Going!", 3))
+        self.assertEqual(determine_habit_state('daily', "2025-01-07", 3, today), ("Streak - Keep on Going!", 3))
+        self.assertEqual(determine_habit_state('daily', "2025-01-06", 3, today), ("Habit Broken", 0))
+        self.assertEqual(determine_habit_state('daily', None, 0, today), ("Habit Broken", 0))
+
+    def test_determine_habit_state_weekly(self):
+        """Test determine_habit_state for weekly habits, including the turn of the year."""
+        today = date(2025, 1, 8)  # Week 2
+        self.assertEqual(determine_habit_state('weekly', "2024-12-30", 2, today), ("Streak - Keep on Going!", 2))
+        self.assertEqual(determine_habit_state('weekly', "2024-12-29", 2, today), ("Habit Broken", 0))
+        self.assertEqual(determine_habit_state('weekly', None, 0, today), ("Habit Broken", 0))
+
 
 if __name__ == '__main__':
     unittest.main()
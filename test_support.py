@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+
+from database_and_sql import DB_SETTINGS, configure_db, create_schema, get_connection
+
+
+class TemporaryDatabaseTestCase(unittest.TestCase):
+    """
+    Runs every test against new database files in a temporary directory, the connection settings are restored
+    afterwards.
+
+    Attributes:
+        db_name (str): File name of the database the connection provider points to at the start of a test.
+    """
+
+    db_name = 'habits.db'
+
+    def setUp(self):
+        """Point the connection provider to a temporary database file."""
+        self.settings = dict(DB_SETTINGS)
+        self.directory = tempfile.TemporaryDirectory()
+        self.use_db(self.db_name)
+
+    def tearDown(self):
+        """Restore the connection settings and remove the temporary database."""
+        configure_db(**self.settings)
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def use_db(self, name):
+        """Point the connection provider to a database file of the temporary directory with the current schema."""
+        self.db_path = self.path(name)
+        configure_db(path=self.db_path)
+        create_schema(get_connection())
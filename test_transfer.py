@@ -0,0 +1,69 @@
+import unittest
+from datetime import date, timedelta
+
+from classes import Tracker
+from database_and_sql import ADD_HABIT, GET_HABIT_STREAKS, execute_many, execute_query
+from test_support import TemporaryDatabaseTestCase
+from transfer import export_history, import_history
+
+
+class TestTransfer(TemporaryDatabaseTestCase):
+
+    db_name = 'source.db'
+
+    def setUp(self):
+        """Create a source database with habits and completions in a temporary directory."""
+        super().setUp()
+        execute_many(ADD_HABIT, [(f"habit_{i}", 'weekly' if i % 2 else 'daily', "2024-01-01") for i in range(6)])
+        Tracker.add_completions((f"habit_{i}", date(2024, 1, 1) + timedelta(days=day))
+                                for i in range(5) for day in range(0, 50, i + 1))
+        self.expected = execute_query(GET_HABIT_STREAKS, fetch=True)
+
+    def test_round_trip(self):
+        """Test that plain and compressed exports import into the same habits, completions and streaks."""
+        for name in ('history.jsonl', 'history.jsonl.gz'):
+            self.use_db('source.db')
+            exported = export_history(self.path(name), chunk_size=7)
+            self.assertEqual(exported['habits'], 6)
+
+            self.use_db(f'target_{name}.db')
+            result = import_history(self.path(name), chunk_size=16)
+            self.assertEqual((result['habits'], result['completions'], result['skipped']),
+                             (6, exported['completions'], 0))
+            self.assertEqual(execute_query(GET_HABIT_STREAKS, fetch=True), self.expected)
+
+            # importing again only skips
+            result = import_history(self.path(name))
+            self.assertEqual((result['habits'], result['completions'], result['skipped']),
+                             (0, 0, exported['completions']))
+
+    def test_resume(self):
+        """Test that an interrupted import continues after the last committed chunk."""
+        export_history(self.path('history.jsonl'))
+        self.use_db('target.db')
+
+        def interrupt(lines):
+            if lines > 40:
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            import_history(self.path('history.jsonl'), chunk_size=20, progress=interrupt)
+        result = import_history(self.path('history.jsonl'), chunk_size=20)
+        self.assertEqual(result['resumed_from'], 41)
+        self.assertEqual(result['skipped'], 0)
+        self.assertEqual(execute_query(GET_HABIT_STREAKS, fetch=True), self.expected)
+
+    def test_invalid_file(self):
+        """Test that files without the history header and existing export targets are rejected."""
+        with open(self.path('other.txt'), 'w') as file:
+            file.write("name,date\n")
+        with self.assertRaises(ValueError):
+            import_history(self.path('other.txt'))
+
+        export_history(self.path('history.jsonl'))
+        with self.assertRaises(FileExistsError):
+            export_history(self.path('history.jsonl'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import gzip
+import json
+import os
+import time
+
+from database_and_sql import ADD_COMPLETION_BY_ID, ADD_HABIT_IF_MISSING, DELETE_IMPORT_CHECKPOINT, EXPORT_COMPLETIONS, \
+    EXPORT_HABITS, GET_HABIT_ID, GET_HABIT_IDS, GET_IMPORT_CHECKPOINT, SET_IMPORT_CHECKPOINT, bulk_load, \
+    get_connection, rebuild_rollups, rebuild_streaks, transaction
+
+"""
+Line format of exported histories, one JSON object per line in UTF-8, gzip compressed if the file name ends in .gz
+
+{"format": "habit-history", "version": 1}                              first line
+{"habit": "Read", "frequency": "weekly", "created_at": "2024-01-01"}   one line per habit
+{"completion": "Read", "date": "2024-01-06"}                           one line per completion
+
+Exports list all habits first, then the completions ordered by habit and date. Imports accept the records in any
+order as long as a habit comes before its completions.
+"""
+FORMAT = 'habit-history'
+FORMAT_VERSION = 1
+
+
+def open_history(path, mode):
+    """
+    Opens a history file for reading ('r') or writing ('w') as text, gzip compressed if the name ends in .gz.
+
+    Args:
+        path (str): The history file.
+        mode (str): 'r' or 'w'.
+
+    Returns:
+        file: The opened text file.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', compresslevel=6, encoding='utf-8', newline='\n')
+    return open(path, mode, encoding='utf-8', newline='\n')
+
+
+def export_history(path, chunk_size=10000, progress=None, overwrite=False):
+    """
+    Writes all habits and completions of the database to a history file.
+
+    Rows are read with fetchmany in chunks from one read transaction, so the file is a consistent snapshot
+    and memory use does not depend on the size of the history.
+
+    Args:
+        path (str): The file to write, compressed if the name ends in .gz.
+        chunk_size (int): Number of rows fetched per chunk.
+        progress (callable): Called with the number of written lines after every chunk.
+        overwrite (bool): Replace an existing file.
+
+    Returns:
+        dict: Number of exported `habits` and `completions` and the elapsed `seconds`.
+    """
+    if os.path.exists(path) and not overwrite:
+        raise FileExistsError(f"{path} already exists")
+
+    started = time.perf_counter()
+    connection = get_connection()
+    counts = {'habits': 0, 'completions': 0}
+    own_snapshot = not connection.in_transaction
+    if own_snapshot:
+        connection.execute("BEGIN")
+
+    try:
+        with open_history(path, 'w') as file:
+            file.write(json.dumps({'format': FORMAT, 'version': FORMAT_VERSION}) + '\n')
+
+            cursor = connection.execute(EXPORT_HABITS)
+            while rows := cursor.fetchmany(chunk_size):
+                file.writelines(json.dumps({'habit': name, 'frequency': frequency, 'created_at': created_at}) + '\n'
+                                for name, frequency, created_at in rows)
+                counts['habits'] += len(rows)
+                if progress:
+                    progress(1 + counts['habits'])
+
+            # the quoted name is built once per habit, dates need no escaping
+            quoted = {}
+            cursor = connection.execute(EXPORT_COMPLETIONS)
+            while rows := cursor.fetchmany(chunk_size):
+                lines = []
+                for name, day in rows:
+                    name_json = quoted.get(name)
+                    if name_json is None:
+                        name_json = quoted[name] = json.dumps(name)
+                    lines.append(f'{{"completion": {name_json}, "date": "{day}"}}\n')
+                file.writelines(lines)
+                counts['completions'] += len(rows)
+                if progress:
+                    progress(1 + counts['habits'] + counts['completions'])
+    finally:
+        if own_snapshot:
+            connection.rollback()
+
+    counts['seconds'] = time.perf_counter() - started
+    return counts
+
+
+def import_history(path, chunk_size=10000, resume=True, progress=None):
+    """
+    Adds the habits and completions of a history file to the database.
+
+    Lines are inserted in batches, every chunk is committed together with the number of lines read so far.
+    An interrupted import continues after the last committed chunk when it is started again with the same
+    unchanged file. Existing habits are kept, completions for an already completed period are skipped, the
+    rollups of the habits in a chunk are rebuilt before it is committed and the stored streaks at the end.
+
+    Args:
+        path (str): The history file, compressed if the name ends in .gz.
+        chunk_size (int): Number of records per committed batch.
+        resume (bool): Continue an interrupted import of the same file instead of reading it from the start.
+        progress (callable): Called with the number of processed lines after every chunk.
+
+    Returns:
+        dict: Number of new `habits` and `completions`, `skipped` records (duplicates, unknown habits or
+              invalid dates), the line the import `resumed_from` and the elapsed `seconds`.
+    """
+    started = time.perf_counter()
+    source = os.path.abspath(path)
+    size = os.path.getsize(path)
+    connection = get_connection()
+    row = connection.execute(GET_IMPORT_CHECKPOINT, (source, size)).fetchone() if resume else None
+    done = row[0] if row else 0
+
+    result = {'habits': 0, 'completions': 0, 'skipped': 0, 'resumed_from': done}
+    habit_ids = {name: habit_id for name, habit_id, _ in connection.execute(GET_HABIT_IDS)}
+    habits = []
+    completions = []
+
+    def flush(line_number):
+        with transaction() as conn:
+            if habits:
+                result['habits'] += conn.executemany(ADD_HABIT_IF_MISSING, habits).rowcount
+                for name, _, _ in habits:
+                    if name not in habit_ids:
+                        habit_ids[name] = conn.execute(GET_HABIT_ID, (name,)).fetchone()[0]
+            batch = [(habit_ids[name], day) for name, day in completions if name in habit_ids]
+            with bulk_load(conn):
+                inserted = conn.executemany(ADD_COMPLETION_BY_ID, batch).rowcount if batch else 0
+                if inserted:
+                    rebuild_rollups(conn, habit_ids={habit_id for habit_id, _ in batch})
+            result['completions'] += inserted
+            result['skipped'] += len(completions) - inserted
+            conn.execute(SET_IMPORT_CHECKPOINT, (source, size, line_number))
+        habits.clear()
+        completions.clear()
+        if progress:
+            progress(line_number)
+
+    with open_history(path, 'r') as file:
+        try:
+            header = json.loads(file.readline() or '{}')
+        except ValueError:
+            header = {}
+        if header.get('format') != FORMAT or header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a {FORMAT} file of version {FORMAT_VERSION}")
+
+        line_number = 1
+        for line in file:
+            line_number += 1
+            if line_number <= done:
+                continue
+            try:
+                record = json.loads(line)
+                if 'completion' in record:
+                    completions.append((record['completion'], record['date']))
+                elif 'habit' in record:
+                    habits.append((record['habit'], record['frequency'], record['created_at']))
+                else:
+                    raise KeyError('habit or completion')
+            except (ValueError, KeyError, TypeError) as error:
+                raise ValueError(f"{path}, line {line_number}: invalid record ({error})") from error
+
+            if len(habits) + len(completions) >= chunk_size:
+                flush(line_number)
+        flush(line_number)
+
+    with transaction() as conn:
+        rebuild_streaks(conn)
+        conn.execute(DELETE_IMPORT_CHECKPOINT, (source,))
+
+    result['seconds'] = time.perf_counter() - started
+    return result